@@ -0,0 +1,229 @@
+# api/prefork.py
+
+import os
+import signal
+import socket
+import time
+
+from config import TMP_DIR
+from utils import create_folder, get_logger
+
+logger = get_logger("prefork")
+
+# Seconds old workers get to finish in-flight requests on reload/shutdown
+GRACEFUL_TIMEOUT = 30
+
+
+# -----------------------------
+# WARMUP
+# -----------------------------
+
+def warmup():
+    """
+    Do every expensive one-time step before accepting traffic:
+    import the DSP stack (librosa, scipy), push a short synthetic clip through
+    the whole pipeline, pre-touch the index and import the app.
+    Anything loaded here in the parent is shared copy-on-write by forked workers.
+    """
+    import numpy as np
+    import soundfile as sf
+
+    import db
+    from fingerprint import compute_hashes
+    from fingerprint.profile import resolve_profile
+
+    start = time.perf_counter()
+
+    db.init_db()
+    profile = resolve_profile()
+
+    create_folder(TMP_DIR)
+    clip_path = TMP_DIR / f"warmup_{os.getpid()}.wav"
+    noise = np.random.default_rng(0).standard_normal(profile.sample_rate) * 0.1
+    sf.write(clip_path, noise.astype(np.float32), profile.sample_rate)
+    try:
+        compute_hashes(str(clip_path), profile)
+    finally:
+        clip_path.unlink(missing_ok=True)
+
+    db.warm_cache()
+
+    import api.server  # noqa: F401  (FastAPI app + routes)
+
+    logger.info(f"[prefork] Warmup done in {time.perf_counter() - start:.2f}s")
+
+
+# -----------------------------
+# PRE-FORK SUPERVISOR
+# -----------------------------
+
+def _bind(host: str, port: int) -> socket.socket:
+    sock = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+    sock.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+    sock.bind((host, port))
+    sock.listen(2048)
+    sock.set_inheritable(True)
+    return sock
+
+
+class PreforkServer:
+    """
+    Warm up once, bind the listening socket, then fork `workers` uvicorn
+    processes that all accept on it.
+
+    - A worker that dies is replaced.
+    - SIGHUP triggers a graceful reload: the parent re-warms, forks a new
+      generation, then sends SIGTERM to the old one, which finishes its
+      in-flight requests.
+    - SIGINT/SIGTERM stop everything.
+
+    Saving or deleting songs needs no reload: workers read the catalog
+    through the DB, song ids are never reused, and the stop-list and hash
+    filter notice changes made by other processes.
+    """
+
+    def __init__(self, host: str, port: int, workers: int):
+        self.host = host
+        self.port = port
+        self.workers = workers
+
+        self.sock = None
+        self.pids = set()
+        self._reload_requested = False
+        self._stopping = False
+
+    # ---------- workers ----------
+
+    def _spawn(self) -> int:
+        pid = os.fork()
+        if pid:
+            return pid
+
+        # Child
+        code = 0
+        try:
+            for sig in (signal.SIGHUP, signal.SIGINT, signal.SIGTERM):
+                signal.signal(sig, signal.SIG_DFL)
+
+            import db
+            import uvicorn
+            from api.server import app
+
+            db.after_fork()
+
+            config = uvicorn.Config(app, host=self.host, port=self.port)
+            uvicorn.Server(config).run(sockets=[self.sock])
+        except BaseException:
+            logger.exception(f"[prefork] Worker {os.getpid()} crashed")
+            code = 1
+        finally:
+            os._exit(code)
+
+    def _spawn_generation(self) -> set:
+        pids = {self._spawn() for _ in range(self.workers)}
+        logger.info(f"[prefork] Started workers: {sorted(pids)}")
+        return pids
+
+    def _terminate(self, pids: set):
+        for pid in pids:
+            try:
+                os.kill(pid, signal.SIGTERM)
+            except ProcessLookupError:
+                pass
+
+        deadline = time.monotonic() + GRACEFUL_TIMEOUT
+        remaining = set(pids)
+        while remaining and time.monotonic() < deadline:
+            for pid in list(remaining):
+                try:
+                    done, _status = os.waitpid(pid, os.WNOHANG)
+                except ChildProcessError:
+                    done = pid
+                if done:
+                    remaining.discard(pid)
+            time.sleep(0.1)
+
+        for pid in remaining:
+            logger.warning(f"[prefork] Worker {pid} did not stop in time, killing it")
+            os.kill(pid, signal.SIGKILL)
+            os.waitpid(pid, 0)
+
+    def _reap(self):
+        """Collect exited workers; replace ones from the current generation."""
+        while True:
+            try:
+                pid, status = os.waitpid(-1, os.WNOHANG)
+            except ChildProcessError:
+                return
+            if pid == 0:
+                return
+            if pid in self.pids:
+                self.pids.discard(pid)
+                if not self._stopping:
+                    logger.warning(f"[prefork] Worker {pid} exited (status={status}), restarting")
+                    self.pids.add(self._spawn())
+
+    def _reload(self):
+        import db
+
+        logger.info("[prefork] Reloading workers...")
+        db.warm_cache()
+
+        old = self.pids
+        self.pids = self._spawn_generation()
+        self._terminate(old)
+        logger.info("[prefork] Reload complete.")
+
+    # ---------- signals ----------
+
+    def _on_hup(self, _signum, _frame):
+        self._reload_requested = True
+
+    def _on_stop(self, _signum, _frame):
+        self._stopping = True
+
+    # ---------- main loop ----------
+
+    def run(self):
+        warmup()
+        self.sock = _bind(self.host, self.port)
+        logger.info(
+            f"[prefork] Listening on {self.host}:{self.port} with {self.workers} workers "
+            f"(parent pid={os.getpid()}, SIGHUP to reload)"
+        )
+
+        signal.signal(signal.SIGHUP, self._on_hup)
+        signal.signal(signal.SIGINT, self._on_stop)
+        signal.signal(signal.SIGTERM, self._on_stop)
+
+        self.pids = self._spawn_generation()
+
+        try:
+            while not self._stopping:
+                time.sleep(0.2)
+                self._reap()
+
+                if self._reload_requested and not self._stopping:
+                    self._reload_requested = False
+                    self._reload()
+        finally:
+            logger.info("[prefork] Shutting down workers...")
+            self._terminate(self.pids)
+            self.sock.close()
+
+
+def serve(host: str, port: int, workers: int = 1):
+    """Run the API: pre-forked when workers > 1 and the OS supports fork."""
+    if workers > 1 and hasattr(os, "fork"):
+        PreforkServer(host, port, workers).run()
+        return
+
+    if workers > 1:
+        logger.warning("[prefork] os.fork is not available; serving with a single worker.")
+
+    import uvicorn
+
+    warmup()
+    from api.server import app
+
+    uvicorn.run(app, host=host, port=port)
@@ -1,21 +1,35 @@
 # api/server.py
 
-from fastapi import FastAPI, UploadFile, File
+from fastapi import FastAPI, Query, Request, WebSocket, WebSocketDisconnect
 from fastapi.responses import JSONResponse
+from starlette.concurrency import run_in_threadpool
 from pathlib import Path
-import shutil
+import json
 
-from config import SONGS_DIR, RECORDINGS_DIR
-from utils import create_folder, get_logger
+import numpy as np
+from audioread.exceptions import DecodeError
+from soundfile import SoundFileError
+
+from config import SONGS_DIR, RECORDINGS_DIR, PROFILES_DIR, API_PROFILING, MAX_FIND_HASHES
+from utils import get_logger
 from fingerprint import generate_fingerprint
-from matcher import match_song
+from fingerprint.profile import resolve_profile
+from fingerprint.wire import decode_hashes, MAX_HASH_ROW_BYTES, WIRE_HEADER_BYTES
+from matcher import match_song, match_hashes
+from matcher.streaming import StreamingMatcher
 from fastapi.middleware.cors import CORSMiddleware
-from downloader.service import download_and_fingerprint_from_spotify
-from db.sqlite import get_song_by_id
+from downloader.aio import ProcessError
+from downloader.service import download_and_fingerprint_from_spotify_async
+from db import init_db, get_song_by_id
+from api.uploads import stream_upload, read_body
+from utils.profiling import profile_run
 from fastapi import Body
 
 logger = get_logger("api")
 
+# Raised by librosa.load for uploads that aren't audio it can decode
+_UNDECODABLE = (DecodeError, SoundFileError)
+
 app = FastAPI(title="SeekTune Python API")
 
 app.add_middleware(
@@ -26,42 +40,120 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
+@app.on_event("startup")
+def startup():
+    # Create tables once per process instead of on every request
+    init_db()
+
+
+def _wants_profile(request: Request) -> bool:
+    """X-Debug-Profile: 1 or ?debug_profile=1, honoured only with API_PROFILING=1."""
+    asked = (
+        request.headers.get("x-debug-profile") == "1"
+        or request.query_params.get("debug_profile") == "1"
+    )
+    if asked and not API_PROFILING:
+        logger.warning("[API] Profiling requested but API_PROFILING is off; ignoring.")
+    return asked and API_PROFILING
+
+
+def _run_profiled(label: str, fn, *args, **kwargs):
+    """
+    Run fn under cProfile + tracemalloc; the .prof/.json go to PROFILES_DIR.
+    Returns (result, summary).
+    """
+    with profile_run(label) as session:
+        result = fn(*args, **kwargs)
+    summary = session.summary()
+    summary["file"] = session.dump(PROFILES_DIR).name
+    return result, summary
+
+
+def _find_response(result: dict) -> dict:
+    """match_song()/match_hashes() result -> /api/find response body (with song links)."""
+    matches = []
+    for m in result["matches"]:
+        song_obj = get_song_by_id(m["song_id"])
+        matches.append({
+            "song_id": m["song_id"],
+            "title": m["title"],
+            "artist": m["artist"],
+            "score": m["score"],
+            "confidence": m["confidence"],
+            "offset_seconds": m["offset_seconds"],
+            "speed": m["speed"],
+            "spotify_url": getattr(song_obj, "spotify_url", None),
+            "youtube_url": getattr(song_obj, "youtube_url", None),
+        })
+
+    prediction = matches[0] if matches else {
+        "song_id": result["song_id"],
+        "title": result["title"],
+        "artist": result["artist"],
+        "score": result["score"],
+        "confidence": result["confidence"],
+        "offset_seconds": result["offset_seconds"],
+        "speed": result["speed"],
+        "spotify_url": None,
+        "youtube_url": None,
+    }
+
+    logger.info(f"[API/find] Returning prediction for song_id={prediction['song_id']} spotify={prediction['spotify_url']} youtube={prediction['youtube_url']}")
+
+    return {
+        "status": "ok",
+        "prediction": prediction,
+        "matches": matches,
+    }
+
+
 @app.get("/health")
 def health():
     return {"status": "ok"}
 
 
 @app.post("/api/save")
-async def save_song_api(file: UploadFile = File(...)):
+async def save_song_api(request: Request):
     """
-    Save a full song via HTTP upload.
+    Save a full song via HTTP upload (multipart 'file' field, or a raw
+    audio body with ?filename=).
     Equivalent to: python main.py save <file>
-    """
-    create_folder(SONGS_DIR)
 
-    target_path = SONGS_DIR / file.filename
-
-    # Save uploaded file to disk
-    with open(target_path, "wb") as buffer:
-        shutil.copyfileobj(file.file, buffer)
+    The body is written to SONGS_DIR as it arrives (size-limited, hashed
+    per chunk, never overwriting an existing file); fingerprinting then
+    runs in the threadpool so other requests keep being served.
+    """
+    upload = await stream_upload(request, SONGS_DIR)
+    target_path = upload.path
 
     logger.info(f"[API/save] Saved uploaded file to: {target_path}")
 
     try:
         # generate_fingerprint accepts optional spotify_url / youtube_url (None here)
-        song_id, num_hashes = generate_fingerprint(str(target_path))
+        profile = None
+        if _wants_profile(request):
+            (song_id, num_hashes), profile = await run_in_threadpool(
+                _run_profiled, f"save {target_path.name}", generate_fingerprint, str(target_path)
+            )
+        else:
+            song_id, num_hashes = await run_in_threadpool(generate_fingerprint, str(target_path))
 
         # fetch song row to return any stored links (if available)
         song = get_song_by_id(song_id)
 
-        return {
+        response = {
             "status": "ok",
             "song_id": song_id,
             "hashes": num_hashes,
-            "filename": file.filename,
+            "filename": target_path.name,
+            "bytes": upload.size,
+            "sha256": upload.sha256,
             "spotify_url": getattr(song, "spotify_url", None),
             "youtube_url": getattr(song, "youtube_url", None),
         }
+        if profile is not None:
+            response["profile"] = profile
+        return response
     except Exception as e:
         logger.error(f"[API/save] Error: {e}")
         return JSONResponse(
@@ -71,51 +163,183 @@ async def save_song_api(file: UploadFile = File(...)):
     
 
 @app.post("/api/find")
-async def find_song_api(file: UploadFile = File(...)):
-    """
-    Match a short clip via HTTP upload.
-    Equivalent to: python main.py find <clip.wav>
+async def find_song_api(
+    request: Request,
+    top_k: int = Query(1, ge=1, le=50),
+    robust: bool = False,
+):
     """
-    create_folder(RECORDINGS_DIR)
+    Match a short clip via HTTP upload (multipart 'file' field, or a raw
+    audio body with ?filename=).
+    Equivalent to: python main.py find <clip.wav> --top-k <n> [--robust]
 
-    target_path = RECORDINGS_DIR / file.filename
-
-    # Save uploaded clip
-    with open(target_path, "wb") as buffer:
-        shutil.copyfileobj(file.file, buffer)
+    Matching runs in the threadpool so other requests keep being served.
+    """
+    # Save uploaded clip as it streams in (size-limited, unique name, so
+    # concurrent clips never clobber each other)
+    target_path = (await stream_upload(request, RECORDINGS_DIR)).path
 
     logger.info(f"[API/find] Saved uploaded clip to: {target_path}")
 
     try:
-        result = match_song(str(target_path))
+        profile = None
+        if _wants_profile(request):
+            result, profile = await run_in_threadpool(
+                _run_profiled, f"find {target_path.name}",
+                match_song, str(target_path), top_k=top_k, robust=robust,
+            )
+        else:
+            result = await run_in_threadpool(match_song, str(target_path), top_k=top_k, robust=robust)
 
-        # result should contain 'song_id', 'title', 'artist', 'score'
-        song_obj = get_song_by_id(result["song_id"])
+        response = _find_response(result)
+        if profile is not None:
+            response["profile"] = profile
+        return response
+    except _UNDECODABLE as e:
+        logger.warning(f"[API/find] Cannot decode {target_path.name}: {e!r}")
+        return JSONResponse(
+            status_code=400,
+            content={"status": "error", "detail": f"Could not decode {target_path.name} as audio"},
+        )
+    except Exception as e:
+        logger.error(f"[API/find] Error: {e}")
+        return JSONResponse(
+            status_code=500,
+            content={"status": "error", "detail": str(e)},
+        )
 
-        logger.info(f"[API/find] Returning prediction for song_id={result['song_id']} spotify={getattr(song_obj,'spotify_url',None)} youtube={getattr(song_obj,'youtube_url',None)}")
+@app.get("/api/profile")
+def profile_api():
+    """
+    Fingerprint profile of the catalog: clients computing hashes for
+    /api/find/hashes must use exactly these parameters.
+    """
+    profile = resolve_profile()
+    return {
+        "status": "ok",
+        "profile_id": profile.version_id(),
+        "profile": json.loads(profile.to_json()),
+    }
 
-        return {
-            "status": "ok",
-            "prediction": {
-                "song_id": result["song_id"],
-                "title": result["title"],
-                "artist": result["artist"],
-                "score": result.get("score"),
-                "spotify_url": getattr(song_obj, "spotify_url", None),
-                "youtube_url": getattr(song_obj, "youtube_url", None),
+
+@app.post("/api/find/hashes")
+async def find_hashes_api(request: Request, top_k: int = Query(1, ge=1, le=50)):
+    """
+    Match precomputed clip hashes instead of audio: the body is a binary
+    payload from fingerprint.wire.encode_hashes() (see hash_client.py).
+    The client did the decoding, STFT and peak picking, so only lookups
+    and voting run here.
+
+    409 when the payload's profile_id isn't the catalog's (GET /api/profile).
+    """
+    payload = await read_body(request, MAX_FIND_HASHES * MAX_HASH_ROW_BYTES + WIRE_HEADER_BYTES)
+
+    try:
+        profile_id, hashes = decode_hashes(payload)
+    except ValueError as e:
+        return JSONResponse(status_code=400, content={"status": "error", "detail": str(e)})
+
+    profile = resolve_profile()
+    if profile_id != profile.version_id():
+        return JSONResponse(
+            status_code=409,
+            content={
+                "status": "error",
+                "detail": f"Hashes were computed with profile {profile_id}, catalog uses {profile.version_id()}",
+                "profile_id": profile.version_id(),
             },
-        }
+        )
+
+    logger.info(f"[API/find/hashes] {len(hashes)} precomputed hashes ({len(payload)} bytes)")
+
+    try:
+        result = await run_in_threadpool(match_hashes, hashes, profile, top_k=top_k)
+        return _find_response(result)
     except Exception as e:
-        logger.error(f"[API/find] Error: {e}")
+        logger.error(f"[API/find/hashes] Error: {e}")
         return JSONResponse(
             status_code=500,
             content={"status": "error", "detail": str(e)},
         )
 
+
+@app.websocket("/ws/find")
+async def find_stream_ws(
+    ws: WebSocket,
+    sample_rate: int = Query(44100, ge=4000, le=192000),
+    format: str = Query("f32"),
+    top_k: int = Query(1, ge=1, le=50),
+):
+    """
+    Progressive identification while recording.
+
+    The client streams mono PCM as binary messages (?format=f32 float32 or
+    s16 int16, little-endian, at ?sample_rate=) and sends the text message
+    "end" when it stops. The server answers with JSON messages:
+
+        {"type": "progress", "seconds", "hashes", "candidates", "best_score"}
+        {"type": "result", ...same body as /api/find..., "seconds_heard",
+         "time_to_answer", "early"}
+
+    and closes the socket after the result, which is pushed as soon as the
+    best song is decisive (see StreamingMatcher), usually long before the
+    user would have finished a fixed-length recording.
+    """
+    await ws.accept()
+
+    dtypes = {"f32": ("<f4", 1.0), "s16": ("<i2", 1 / 32768)}
+    if format not in dtypes:
+        await ws.send_json({"type": "error", "detail": f"Unsupported format '{format}' (f32, s16)"})
+        await ws.close(code=1003)
+        return
+    dtype, scale = dtypes[format]
+
+    matcher = StreamingMatcher(resolve_profile(), input_rate=sample_rate, top_k=top_k)
+    last_hashes = 0
+
+    try:
+        while True:
+            message = await ws.receive()
+            if message["type"] == "websocket.disconnect":
+                return
+
+            if message.get("bytes") is not None:
+                data = message["bytes"]
+                samples = np.frombuffer(data[:len(data) - len(data) % np.dtype(dtype).itemsize], dtype=dtype)
+                status = await run_in_threadpool(matcher.feed, samples.astype(np.float32) * scale)
+            elif message.get("text") == "end":
+                status = await run_in_threadpool(matcher.finish)
+            else:
+                continue
+
+            if status["done"]:
+                response = _find_response(status["result"])
+                for key in ("seconds_heard", "time_to_answer", "early"):
+                    response[key] = status["result"][key]
+                await ws.send_json({"type": "result", **response})
+                await ws.close()
+                return
+
+            if status["hashes"] != last_hashes:
+                last_hashes = status["hashes"]
+                await ws.send_json({"type": "progress", **status})
+
+    except WebSocketDisconnect:
+        logger.info("[API/ws/find] Client disconnected before an answer")
+    except Exception as e:
+        logger.error(f"[API/ws/find] Error: {e}")
+        await ws.send_json({"type": "error", "detail": str(e)})
+        await ws.close(code=1011)
+
+
 @app.post("/api/download")
 async def download_from_spotify_api(payload: dict = Body(...)):
     """
     Download + fingerprint a song from a Spotify track URL.
+
+    yt-dlp and ffmpeg run as asyncio subprocesses and the blocking steps in
+    the bounded download pool, so concurrent downloads overlap without
+    stalling /api/find.
     """
     try:
         spotify_url = payload.get("spotify_url")
@@ -125,7 +349,7 @@ async def download_from_spotify_api(payload: dict = Body(...)):
                 content={"status": "error", "detail": "spotify_url is required"},
             )
 
-        result = download_and_fingerprint_from_spotify(spotify_url)
+        result = await download_and_fingerprint_from_spotify_async(spotify_url)
 
         return {
             "status": "ok",
@@ -136,9 +360,15 @@ async def download_from_spotify_api(payload: dict = Body(...)):
             "wav_path": result["wav_path"],
             "spotify_url": result.get("spotify_url"),
             "youtube_url": result.get("youtube_url"),
+            "existing": result["existing"],
         }
 
-
+    except ProcessError as e:
+        logger.error(f"[API/download] {e}")
+        return JSONResponse(
+            status_code=504 if e.returncode is None else 502,
+            content={"status": "error", "detail": str(e)},
+        )
     except Exception as e:
         return JSONResponse(
             status_code=500,
@@ -0,0 +1,203 @@
+# api/uploads.py
+
+import hashlib
+import os
+from pathlib import Path
+
+from fastapi import HTTPException, Request
+from python_multipart.multipart import MultipartParser, parse_options_header
+
+from config import MAX_UPLOAD_BYTES
+from utils import create_folder, get_logger
+
+logger = get_logger("uploads")
+
+
+class StreamedUpload:
+    """A request body written straight to disk while it was received."""
+
+    def __init__(self, path: Path, filename: str, size: int, sha256: str):
+        self.path = path
+        self.filename = filename
+        self.size = size
+        self.sha256 = sha256
+
+
+# -----------------------------
+# FILE NAMES
+# -----------------------------
+
+def reserve_path(directory: Path, filename: str):
+    """
+    Create and open a new file in `directory` named after `filename`.
+    Only the base name is kept; on a collision '-1', '-2', ... is appended
+    to the stem, so concurrent uploads never overwrite each other.
+
+    Returns:
+        (path, binary file object opened for writing)
+    """
+    create_folder(directory)
+
+    name = Path(filename or "upload").name or "upload"
+    stem, suffix = Path(name).stem, Path(name).suffix
+
+    n = 0
+    while True:
+        candidate = directory / (name if n == 0 else f"{stem}-{n}{suffix}")
+        try:
+            fd = os.open(candidate, os.O_WRONLY | os.O_CREAT | os.O_EXCL, 0o644)
+        except FileExistsError:
+            n += 1
+            continue
+        return candidate, os.fdopen(fd, "wb")
+
+
+# -----------------------------
+# STREAMING
+# -----------------------------
+
+class _FileSink:
+    """Write + hash + size-check each chunk of one file as it arrives."""
+
+    def __init__(self, directory: Path, filename: str, max_bytes: int):
+        self.path, self.fh = reserve_path(directory, filename)
+        self.filename = filename
+        self.max_bytes = max_bytes
+        self.size = 0
+        self.digest = hashlib.sha256()
+
+    def write(self, data: bytes):
+        self.size += len(data)
+        if self.size > self.max_bytes:
+            raise HTTPException(
+                status_code=413,
+                detail=f"Upload exceeds {self.max_bytes} bytes",
+            )
+        self.digest.update(data)
+        self.fh.write(data)
+
+    def close(self) -> StreamedUpload:
+        self.fh.close()
+        return StreamedUpload(self.path, self.filename, self.size, self.digest.hexdigest())
+
+    def discard(self):
+        self.fh.close()
+        self.path.unlink(missing_ok=True)
+
+
+async def stream_upload(
+    request: Request,
+    directory: Path,
+    field: str = "file",
+    max_bytes: int = MAX_UPLOAD_BYTES,
+) -> StreamedUpload:
+    """
+    Write an uploaded file into `directory` as the body streams in,
+    without spooling it to a temporary file first.
+
+    Accepts either multipart/form-data (the `field` part) or a raw body
+    (audio/*, application/octet-stream) named by ?filename=.
+    Raises HTTPException 413 past `max_bytes` (partial file removed) and
+    400 for a missing or malformed file part.
+    """
+    length = request.headers.get("content-length")
+    if length and length.isdigit() and int(length) > max_bytes:
+        raise HTTPException(status_code=413, detail=f"Upload exceeds {max_bytes} bytes")
+
+    content_type, options = parse_options_header(request.headers.get("content-type", ""))
+
+    if content_type != b"multipart/form-data":
+        sink = _FileSink(directory, request.query_params.get("filename", "upload"), max_bytes)
+        try:
+            async for chunk in request.stream():
+                sink.write(chunk)
+        except BaseException:
+            sink.discard()
+            raise
+        return _received(sink.close())
+
+    boundary = options.get(b"boundary")
+    if not boundary:
+        raise HTTPException(status_code=400, detail="Missing multipart boundary")
+
+    state = {"header_field": b"", "header_value": b"", "headers": {}, "sink": None, "done": None}
+
+    def on_part_begin():
+        state["headers"] = {}
+
+    def on_header_field(data, start, end):
+        state["header_field"] += data[start:end]
+
+    def on_header_value(data, start, end):
+        state["header_value"] += data[start:end]
+
+    def on_header_end():
+        state["headers"][state["header_field"].lower()] = state["header_value"]
+        state["header_field"] = state["header_value"] = b""
+
+    def on_headers_finished():
+        _disposition, params = parse_options_header(state["headers"].get(b"content-disposition", b""))
+        if params.get(b"name", b"").decode("latin-1") == field and state["done"] is None:
+            filename = params.get(b"filename", b"upload").decode("utf-8", "replace")
+            state["sink"] = _FileSink(directory, filename, max_bytes)
+
+    def on_part_data(data, start, end):
+        if state["sink"] is not None:
+            state["sink"].write(data[start:end])
+
+    def on_part_end():
+        if state["sink"] is not None:
+            state["done"] = state["sink"].close()
+            state["sink"] = None
+
+    parser = MultipartParser(boundary, {
+        "on_part_begin": on_part_begin,
+        "on_header_field": on_header_field,
+        "on_header_value": on_header_value,
+        "on_header_end": on_header_end,
+        "on_headers_finished": on_headers_finished,
+        "on_part_data": on_part_data,
+        "on_part_end": on_part_end,
+    })
+
+    try:
+        async for chunk in request.stream():
+            parser.write(chunk)
+        parser.finalize()
+    except BaseException as e:
+        if state["sink"] is not None:
+            state["sink"].discard()
+        if state["done"] is not None:
+            state["done"].path.unlink(missing_ok=True)
+        if isinstance(e, HTTPException) or not isinstance(e, Exception):
+            raise
+        raise HTTPException(status_code=400, detail=f"Malformed multipart body: {e}") from e
+
+    if state["sink"] is not None:
+        # Body ended inside the file part
+        state["sink"].discard()
+        raise HTTPException(status_code=400, detail="Truncated multipart body")
+
+    if state["done"] is None:
+        raise HTTPException(status_code=400, detail=f"Missing '{field}' file field")
+
+    return _received(state["done"])
+
+
+async def read_body(request: Request, max_bytes: int) -> bytes:
+    """Whole (small) request body in memory; HTTPException 413 past `max_bytes`."""
+    length = request.headers.get("content-length")
+    if length and length.isdigit() and int(length) > max_bytes:
+        raise HTTPException(status_code=413, detail=f"Body exceeds {max_bytes} bytes")
+
+    body = bytearray()
+    async for chunk in request.stream():
+        body += chunk
+        if len(body) > max_bytes:
+            raise HTTPException(status_code=413, detail=f"Body exceeds {max_bytes} bytes")
+    return bytes(body)
+
+
+def _received(upload: StreamedUpload) -> StreamedUpload:
+    logger.info(f"[upload] Received {upload.size} bytes -> {upload.path} (sha256={upload.sha256[:12]})")
+    return upload
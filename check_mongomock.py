@@ -0,0 +1,74 @@
+# check_mongomock.py
+#
+# MongoDB backend smoke test against the in-memory mongomock server:
+#     python check_mongomock.py [--songs 3]
+#
+# Saves generated songs with DB_TYPE=mongo DB_URI=mongomock:// into a
+# throwaway data dir, identifies a clip of each, deletes one song and
+# checks its clip no longer matches it. Exits with status 1 on any failure.
+# Needs mongomock (see requirements.txt); no MongoDB server is used.
+
+import argparse
+import os
+import sys
+import tempfile
+from pathlib import Path
+
+CLIP_SECONDS = 6
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description="Save and find through the mongomock backend")
+    parser.add_argument("--songs", type=int, default=3)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory(prefix="seektune_mongomock_") as tmp:
+        # Read by config at import time: set before anything imports it
+        os.environ.update({"DATA_DIR": tmp, "DB_TYPE": "mongo", "DB_URI": "mongomock://localhost"})
+        return run(Path(tmp), args.songs)
+
+
+def run(data_dir: Path, num_songs: int) -> int:
+    sys.path.insert(0, str(Path(__file__).resolve().parent))
+
+    import soundfile as sf
+
+    import db
+    from fingerprint import generate_fingerprint
+    from load_test import SAMPLE_RATE, synth_song
+    from matcher import match_song
+
+    db.init_db()
+
+    songs = {}
+    for seed in range(num_songs):
+        audio = synth_song(seed, 20)
+        path = data_dir / f"song{seed}.wav"
+        sf.write(path, audio, SAMPLE_RATE)
+        song_id, num_hashes = generate_fingerprint(str(path), title=f"song{seed}", artist="check")
+        clip = data_dir / f"clip{seed}.wav"
+        start = (seed * 3 + 2) * SAMPLE_RATE
+        sf.write(clip, audio[start:start + CLIP_SECONDS * SAMPLE_RATE], SAMPLE_RATE)
+        songs[song_id] = clip
+        print(f"saved song{seed}: song_id={song_id}, {num_hashes} hashes")
+
+    failures = 0
+    for song_id, clip in songs.items():
+        found = match_song(str(clip))["song_id"]
+        ok = found == song_id
+        failures += not ok
+        print(f"[{'ok' if ok else 'FAIL'}] {clip.name}: expected {song_id}, found {found}")
+
+    deleted, clip = next(iter(songs.items()))
+    db.delete_songs([deleted])
+    found = match_song(str(clip))["song_id"]
+    ok = found != deleted and db.get_song_by_id(deleted) is None
+    failures += not ok
+    print(f"[{'ok' if ok else 'FAIL'}] {clip.name} after deleting {deleted}: found {found}")
+
+    print("PASSED" if not failures else f"FAILED: {failures} check(s)")
+    return 1 if failures else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
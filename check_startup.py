@@ -0,0 +1,90 @@
+# check_startup.py
+#
+# CLI startup budget check:
+#     python check_startup.py [--scale 1.0]
+#
+# Runs short, side-effect free main.py invocations (usage errors, --help)
+# in fresh interpreters and fails (exit 1) if one imports a module it should
+# not need or exceeds its wall-time budget.
+
+import argparse
+import subprocess
+import sys
+import time
+from pathlib import Path
+
+MAIN = Path(__file__).resolve().parent / "main.py"
+
+# Modules that must never be imported by these invocations
+HEAVY = {"librosa", "scipy", "yt_dlp", "fastapi", "uvicorn", "pymongo"}
+
+# (argv, forbidden top-level modules, wall-time budget in seconds)
+CASES = [
+    ([], HEAVY | {"sqlalchemy", "numpy"}, 0.35),
+    (["bogus"], HEAVY | {"sqlalchemy", "numpy"}, 0.35),
+    (["find"], HEAVY | {"sqlalchemy", "numpy"}, 0.35),
+    (["maintain", "bogus"], HEAVY | {"sqlalchemy", "numpy"}, 0.35),
+    (["delete"], HEAVY | {"sqlalchemy", "numpy"}, 0.35),
+    (["stats", "--help"], HEAVY | {"sqlalchemy", "numpy"}, 0.35),
+    (["save", "--help"], HEAVY | {"sqlalchemy", "numpy"}, 0.35),
+    (["save"], HEAVY | {"sqlalchemy", "numpy"}, 0.35),
+]
+
+
+def imported_modules(stderr: str) -> set[str]:
+    """Top-level package names from `python -X importtime` output."""
+    names = set()
+    for line in stderr.splitlines():
+        if not line.startswith("import time:") or "|" not in line:
+            continue
+        name = line.rsplit("|", 1)[1].strip()
+        if name and name != "imported package":
+            names.add(name.split(".")[0])
+    return names
+
+
+def run_case(argv: list[str], forbidden: set[str], budget: float) -> list[str]:
+    # Best of three, so a cold disk cache doesn't fail the check
+    elapsed = float("inf")
+    for _ in range(3):
+        start = time.perf_counter()
+        proc = subprocess.run(
+            [sys.executable, "-X", "importtime", str(MAIN), *argv],
+            capture_output=True,
+            text=True,
+        )
+        elapsed = min(elapsed, time.perf_counter() - start)
+
+    errors = []
+    leaked = sorted(imported_modules(proc.stderr) & forbidden)
+    if leaked:
+        errors.append(f"imports {', '.join(leaked)}")
+    if elapsed > budget:
+        errors.append(f"took {elapsed:.3f}s (budget {budget:.2f}s)")
+
+    label = " ".join(argv) or "<no args>"
+    status = "FAIL" if errors else "ok"
+    print(f"[{status}] main.py {label}: {elapsed:.3f}s {'; '.join(errors)}")
+    return errors
+
+
+def main():
+    parser = argparse.ArgumentParser(prog="python check_startup.py")
+    parser.add_argument(
+        "--scale",
+        default=1.0,
+        type=float,
+        help="Multiply every time budget (slow CI machines)"
+    )
+    args = parser.parse_args()
+
+    failures = 0
+    for argv, forbidden, budget in CASES:
+        if run_case(argv, forbidden, budget * args.scale):
+            failures += 1
+
+    sys.exit(1 if failures else 0)
+
+
+if __name__ == "__main__":
+    main()
@@ -1,6 +1,8 @@
 # config.py
 from pathlib import Path
 import os
+import shlex
+import sys
 
 # -----------------------------
 # BASE DIRECTORIES
@@ -8,10 +10,15 @@ import os
 
 BASE_DIR = Path(__file__).resolve().parent
 
-SONGS_DIR = BASE_DIR / "songs"
-RECORDINGS_DIR = BASE_DIR / "recordings"
-TMP_DIR = BASE_DIR / "tmp"
-DB_DIR = BASE_DIR / "db"
+# Root for songs, recordings, tmp and the SQLite files (default: the repo).
+# Point it elsewhere to run against a separate, throwaway catalog.
+DATA_DIR = Path(os.getenv("DATA_DIR", str(BASE_DIR)))
+
+SONGS_DIR = DATA_DIR / "songs"
+RECORDINGS_DIR = DATA_DIR / "recordings"
+TMP_DIR = DATA_DIR / "tmp"
+DB_DIR = DATA_DIR / "db"
+PROFILES_DIR = DATA_DIR / "profiles"
 
 # -----------------------------
 # DATABASE CONFIG
@@ -23,12 +30,45 @@ DB_TYPE = os.getenv("DB_TYPE", "sqlite")
 
 SQLITE_DB_PATH = DB_DIR / "seek_tune.db"
 
+# Number of SQLite fingerprint shards (partitioned by hash prefix).
+# 1 = fingerprints live in SQLITE_DB_PATH next to the songs table.
+# Changing this on an existing catalog requires re-ingesting it.
+DB_SHARDS = int(os.getenv("DB_SHARDS", "1"))
+
+# Bytes of each SQLite file accessed through mmap. Mapped pages live in the
+# OS page cache, so forked server workers share them instead of each
+# copying the index into its own SQLite page cache.
+SQLITE_MMAP_SIZE = int(os.getenv("SQLITE_MMAP_SIZE", str(1 << 30)))
+
+# Hash stop-list: hashes stored more than this many times are skipped at
+# query time (0 = disabled). With HASH_STOPLIST_AT_INGEST=1 they are also
+# no longer stored once they reach the cap.
+HASH_MAX_POSTINGS = int(os.getenv("HASH_MAX_POSTINGS", "0"))
+HASH_STOPLIST_AT_INGEST = os.getenv("HASH_STOPLIST_AT_INGEST", "0") == "1"
+
+# Bloom filter of all stored hash values, kept next to the catalog and
+# checked before lookups so hashes the catalog doesn't contain are never
+# probed. FPR is the target false positive rate; the filter is rebuilt
+# larger once it degrades past twice that. SQLite catalogs only (the file
+# is per host, a MongoDB catalog is shared between hosts).
+HASH_FILTER = os.getenv("HASH_FILTER", "1") == "1"
+HASH_FILTER_FPR = float(os.getenv("HASH_FILTER_FPR", "0.01"))
+HASH_FILTER_MIN_CAPACITY = int(os.getenv("HASH_FILTER_MIN_CAPACITY", "1000000"))
+
 MONGO_USER = os.getenv("DB_USER", "root")
 MONGO_PASSWORD = os.getenv("DB_PASSWORD", "password")
 MONGO_NAME = os.getenv("DB_NAME", "seek_tune_db")
 MONGO_HOST = os.getenv("DB_HOST", "localhost")
 MONGO_PORT = os.getenv("DB_PORT", "27017")
 
+# Full URI overrides the parts above.
+# "mongomock://localhost" uses an in-memory mongomock server (local testing).
+MONGO_URI = os.getenv(
+    "DB_URI",
+    f"mongodb://{MONGO_USER}:{MONGO_PASSWORD}@{MONGO_HOST}:{MONGO_PORT}/?authSource=admin",
+)
+MONGO_POOL_SIZE = int(os.getenv("DB_POOL_SIZE", "50"))
+
 # -----------------------------
 # SPOTIFY CONFIG
 # -----------------------------
@@ -36,9 +76,104 @@ MONGO_PORT = os.getenv("DB_PORT", "27017")
 SPOTIFY_CLIENT_ID = os.getenv("SPOTIFY_CLIENT_ID", "")
 SPOTIFY_CLIENT_SECRET = os.getenv("SPOTIFY_CLIENT_SECRET", "")
 
+# Seconds before a Spotify API request is abandoned
+SPOTIFY_TIMEOUT = float(os.getenv("SPOTIFY_TIMEOUT", "15"))
+
+# -----------------------------
+# DOWNLOADER CONFIG
+# -----------------------------
+
+# External commands; point them at fakes to test the pipeline offline.
+# Default yt-dlp is the package installed with requirements.txt.
+YTDLP_CMD = shlex.split(os.getenv("YTDLP_CMD", f'"{sys.executable}" -m yt_dlp'))
+FFMPEG_BIN = os.getenv("FFMPEG_BIN", "ffmpeg")
+
+# Downloads in flight per process, and per remote host (youtube, spotify)
+DOWNLOAD_CONCURRENCY = int(os.getenv("DOWNLOAD_CONCURRENCY", "8"))
+DOWNLOAD_PER_HOST = int(os.getenv("DOWNLOAD_PER_HOST", "4"))
+
+# Threads for the blocking steps of a download (Spotify API, fingerprinting)
+DOWNLOAD_WORKERS = int(os.getenv("DOWNLOAD_WORKERS", "4"))
+
+# Seconds before a yt-dlp / ffmpeg process is killed
+DOWNLOAD_TIMEOUT = float(os.getenv("DOWNLOAD_TIMEOUT", "300"))
+FFMPEG_TIMEOUT = float(os.getenv("FFMPEG_TIMEOUT", "300"))
+
+# Size bound of TMP_DIR, which keeps downloaded audio keyed by YouTube
+# video id (and Spotify track -> video mappings) for re-syncs; least
+# recently used files are removed beyond it. 0 disables the audio cache.
+DOWNLOAD_CACHE_BYTES = int(float(os.getenv("DOWNLOAD_CACHE_MB", "4096")) * 1024 * 1024)
+
 # -----------------------------
 # SERVER CONFIG
 # -----------------------------
 
 DEFAULT_PROTO = "http"
 DEFAULT_PORT = 5000
+
+# Largest accepted upload body (/api/save, /api/find), in MB
+MAX_UPLOAD_BYTES = int(float(os.getenv("MAX_UPLOAD_MB", "512")) * 1024 * 1024)
+
+# Most precomputed hashes accepted by one /api/find/hashes request
+MAX_FIND_HASHES = int(os.getenv("MAX_FIND_HASHES", "50000"))
+
+# Allow per-request profiling (X-Debug-Profile: 1 or ?debug_profile=1 on
+# /api/find and /api/save). Off by default: it serializes profiled requests.
+API_PROFILING = os.getenv("API_PROFILING", "0") == "1"
+
+# -----------------------------
+# CACHE CONFIG
+# -----------------------------
+
+# Number of song metadata rows kept in memory (keyed by song_id)
+SONG_CACHE_SIZE = int(os.getenv("SONG_CACHE_SIZE", "1024"))
+
+# -----------------------------
+# FINGERPRINT CONFIG
+# -----------------------------
+
+# Named DSP/hash profile (see fingerprint/profile.py) used for a new catalog.
+# Once a catalog has songs, its recorded profile always wins.
+FINGERPRINT_PROFILE = os.getenv("FINGERPRINT_PROFILE", "default")
+
+# Recordings at least this long (seconds) are fingerprinted by
+# FINGERPRINT_WORKERS processes in time chunks of FINGERPRINT_CHUNK_SECONDS
+# (same hashes as one core; see fingerprint/parallel.py). 1 worker = off.
+FINGERPRINT_WORKERS = int(os.getenv("FINGERPRINT_WORKERS", str(os.cpu_count() or 1)))
+FINGERPRINT_PARALLEL_MIN_SECONDS = float(os.getenv("FINGERPRINT_PARALLEL_MIN_SECONDS", "600"))
+FINGERPRINT_CHUNK_SECONDS = float(os.getenv("FINGERPRINT_CHUNK_SECONDS", "60"))
+
+# -----------------------------
+# MATCHER CONFIG
+# -----------------------------
+
+# Minimum normalized confidence (0..1) for a candidate to be reported;
+# below it /api/find and `find` answer "No match"
+MATCH_MIN_CONFIDENCE = float(os.getenv("MATCH_MIN_CONFIDENCE", "0.02"))
+
+# Query hash budget (see matcher/planner.py): distinct clip hashes looked up
+# in the first round, strongest / rarest first. Rounds double in size until
+# the best song is decisive or MATCH_HASH_BUDGET_MAX hashes were tried.
+# MATCH_HASH_BUDGET=0 looks up every clip hash at once; MAX=0 = no cap.
+MATCH_HASH_BUDGET = int(os.getenv("MATCH_HASH_BUDGET", "250"))
+MATCH_HASH_BUDGET_MAX = int(os.getenv("MATCH_HASH_BUDGET_MAX", "2000"))
+
+# Decisive = the best song has at least MATCH_DECISIVE_VOTES aligned votes
+# and MATCH_DECISIVE_RATIO times as many as the runner-up
+MATCH_DECISIVE_VOTES = int(os.getenv("MATCH_DECISIVE_VOTES", "8"))
+MATCH_DECISIVE_RATIO = float(os.getenv("MATCH_DECISIVE_RATIO", "2.0"))
+
+# Progressive identification (/ws/find): received audio is analysed every
+# STREAM_STEP_SECONDS; the answer is pushed as soon as the best song has
+# STREAM_DECISIVE_VOTES aligned votes and STREAM_DECISIVE_RATIO times the
+# runner-up's, or after STREAM_MAX_SECONDS of audio at the latest
+STREAM_STEP_SECONDS = float(os.getenv("STREAM_STEP_SECONDS", "0.5"))
+STREAM_DECISIVE_VOTES = int(os.getenv("STREAM_DECISIVE_VOTES", "15"))
+STREAM_DECISIVE_RATIO = float(os.getenv("STREAM_DECISIVE_RATIO", "3.0"))
+STREAM_MAX_SECONDS = float(os.getenv("STREAM_MAX_SECONDS", "20"))
+
+# Playback speeds tried by robust matching (`find --robust`, /api/find?robust=true)
+# for sped-up / slowed-down clips: 1.02 = clip plays 2% fast (and 2% sharp)
+MATCH_ROBUST_SPEEDS = [
+    float(s) for s in os.getenv("MATCH_ROBUST_SPEEDS", "0.97,0.98,0.99,1.0,1.01,1.02,1.03").split(",")
+]
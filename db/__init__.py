@@ -2,28 +2,85 @@
 
 from config import DB_TYPE
 from utils import get_logger
+from db.base import DBBackend
 
 logger = get_logger("db")
 
 # Import the correct DB backend based on config
 if DB_TYPE == "mongo":
+    import db.mongo as backend
     from db.mongo import (
         init_db,
         insert_song,
         insert_fingerprints,
         get_fingerprints_by_hash,
+        get_fingerprints_by_hashes,
+        get_hash_counts,
+        filter_hashes,
+        rebuild_hash_filter,
+        get_song_by_id,
+        get_song_ids,
+        get_fingerprints_by_song,
+        get_song_fingerprint_counts,
+        delete_songs,
+        get_setting,
+        set_setting,
+        get_stoplist,
+        get_hash_stats,
+        rebuild_hash_counts,
         delete_db,
+        warm_cache,
+        get_catalog_version,
+        after_fork,
+        vacuum_db,
+        analyze_db,
+        reindex_db,
+        migrate_db,
+        get_all_songs,
+        get_all_settings,
+        iter_fingerprints,
+        bulk_load,
+        connection_scope,
     )
     logger.info("Using MongoDB backend")
 else:
     # Default = SQLite
+    import db.sqlite as backend
     from db.sqlite import (
     init_db,
     insert_song,
     insert_fingerprints,
     get_fingerprints_by_hash,
+    get_fingerprints_by_hashes,
+    get_hash_counts,
+    filter_hashes,
+    rebuild_hash_filter,
     get_song_by_id,
+    get_song_ids,
+    get_fingerprints_by_song,
+    get_song_fingerprint_counts,
+    delete_songs,
+    get_setting,
+    set_setting,
+    get_stoplist,
+    get_hash_stats,
+    rebuild_hash_counts,
     delete_db,
+    warm_cache,
+    get_catalog_version,
+    after_fork,
+    vacuum_db,
+    analyze_db,
+    reindex_db,
+    migrate_db,
+    get_all_songs,
+    get_all_settings,
+    iter_fingerprints,
+    bulk_load,
+    connection_scope,
     )
 
     logger.info("Using SQLite backend")
+
+# Both backend modules satisfy the same interface
+backend: DBBackend
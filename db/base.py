@@ -0,0 +1,128 @@
+# db/base.py
+
+from collections import namedtuple
+from contextlib import AbstractContextManager
+from typing import Iterable, Protocol
+
+# -----------------------------
+# ROW TYPES (shared by all backends)
+# -----------------------------
+
+SongRow = namedtuple(
+    "SongRow", ["id", "title", "artist", "path", "spotify_url", "youtube_url"]
+)
+
+FingerprintRow = namedtuple("FingerprintRow", ["song_id", "offset"])
+
+# Max number of hashes sent in a single batched lookup
+# (stays well below SQLite's bound-parameter limit)
+LOOKUP_BATCH_SIZE = 500
+
+# Settings key under which the catalog's fingerprint profile is recorded
+PROFILE_SETTING_KEY = "fingerprint_profile"
+
+# Profile of catalogs fingerprinted before profiles were recorded: the
+# original parameters (see fingerprint.profile.PROFILES)
+LEGACY_PROFILE = "legacy"
+LEGACY_PROFILE_RECORD = '{"name": "legacy"}'
+
+
+def is_legacy_profile_record(data: dict) -> bool:
+    """
+    Old records of the original parameters, stamped as "default" before
+    the legacy name (and the gating fields of today's default) existed.
+    """
+    return data.get("name") == "default" and "silence_db" not in data
+
+
+def batched(items: list, size: int = LOOKUP_BATCH_SIZE):
+    """Yield consecutive slices of at most `size` items."""
+    for i in range(0, len(items), size):
+        yield items[i:i + size]
+
+
+# -----------------------------
+# BACKEND INTERFACE
+# -----------------------------
+
+class DBBackend(Protocol):
+    """
+    Interface every storage backend module (db.sqlite, db.mongo) provides.
+    Modules satisfy it structurally; db/__init__.py re-exports one of them.
+    """
+
+    def init_db(self) -> None: ...
+
+    def insert_song(
+        self,
+        title: str,
+        artist: str,
+        path: str,
+        spotify_url: str | None = None,
+        youtube_url: str | None = None,
+    ) -> int: ...
+
+    def insert_fingerprints(self, song_id: int, hashes: list) -> None: ...
+
+    def get_fingerprints_by_hash(self, hash_value: str) -> list: ...
+
+    def get_fingerprints_by_hashes(
+        self, hash_values: Iterable[str]
+    ) -> dict[str, list]: ...
+
+    def get_hash_counts(self, hash_values: Iterable[str]) -> dict[str, int] | None: ...
+
+    def filter_hashes(self, hash_values: Iterable[str]) -> list[str]: ...
+
+    def rebuild_hash_filter(self) -> int: ...
+
+    def get_song_by_id(self, song_id: int) -> SongRow | None: ...
+
+    def get_song_ids(
+        self,
+        path: str | None = None,
+        artist: str | None = None,
+        spotify_url: str | None = None,
+    ) -> list[int]: ...
+
+    def get_fingerprints_by_song(self, song_id: int) -> list: ...
+
+    def get_song_fingerprint_counts(self, song_ids: list[int] | None = None) -> dict[int, int]: ...
+
+    def delete_songs(self, song_ids: list[int]) -> int: ...
+
+    def get_setting(self, key: str) -> str | None: ...
+
+    def set_setting(self, key: str, value: str) -> None: ...
+
+    def get_stoplist(self, refresh: bool = False) -> frozenset: ...
+
+    def get_hash_stats(self, top_n: int = 20) -> dict: ...
+
+    def rebuild_hash_counts(self) -> None: ...
+
+    def delete_db(self) -> None: ...
+
+    def warm_cache(self) -> None: ...
+
+    def get_catalog_version(self) -> tuple: ...
+
+    def after_fork(self) -> None: ...
+
+    def vacuum_db(self) -> None: ...
+
+    def analyze_db(self) -> None: ...
+
+    def reindex_db(self) -> None: ...
+
+    def migrate_db(self) -> int: ...
+
+    def get_all_songs(self) -> list[SongRow]: ...
+
+    def get_all_settings(self) -> dict: ...
+
+    def iter_fingerprints(self, batch_size: int = 100_000) -> Iterable[list]: ...
+
+    def bulk_load(self, songs: list, settings: dict, fingerprint_batches: Iterable[list]) -> int: ...
+
+    def connection_scope(self) -> AbstractContextManager: ...
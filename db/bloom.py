@@ -0,0 +1,343 @@
+# db/bloom.py
+
+import hashlib
+import math
+import os
+import struct
+import threading
+import time
+from contextlib import contextmanager
+from pathlib import Path
+
+import numpy as np
+
+from config import HASH_FILTER_FPR, HASH_FILTER_MIN_CAPACITY
+from utils import get_logger
+
+try:
+    import fcntl
+except ImportError:  # Windows: single-writer setups only
+    fcntl = None
+
+logger = get_logger("bloom")
+
+# Set bits per byte value
+_POPCOUNT = np.array([bin(i).count("1") for i in range(256)], dtype=np.uint8)
+
+
+# -----------------------------
+# BLOOM FILTER
+# -----------------------------
+
+class BloomFilter:
+    """
+    Bit array with k probes per value (double hashing: h1 + i*h2). Hash
+    values are SHA-1 hex digests, so their first 128 bits are used directly
+    as h1/h2; other strings go through blake2b. No false negatives.
+    """
+
+    def __init__(self, num_bits: int, num_probes: int, bits: np.ndarray | None = None):
+        self.num_bits = max(int(num_bits), 64)
+        self.num_probes = num_probes
+        self.bits = bits if bits is not None else np.zeros((self.num_bits + 7) // 8, dtype=np.uint8)
+
+    @classmethod
+    def for_capacity(cls, capacity: int, fpr: float = HASH_FILTER_FPR) -> "BloomFilter":
+        """Sized for `capacity` distinct values at false positive rate `fpr`."""
+        capacity = max(capacity, 1)
+        num_bits = math.ceil(-capacity * math.log(fpr) / math.log(2) ** 2)
+        num_probes = max(1, round(-math.log2(fpr)))
+        return cls(num_bits, num_probes)
+
+    def _positions(self, values: list) -> tuple[np.ndarray, np.ndarray]:
+        """(byte index, bit mask) arrays of shape (len(values), num_probes)."""
+        try:
+            raw = bytes.fromhex("".join(v[:32] for v in values))
+        except ValueError:
+            raw = b""
+        if len(raw) != 16 * len(values):
+            raw = b"".join(hashlib.blake2b(v.encode("utf-8"), digest_size=16).digest() for v in values)
+
+        halves = np.frombuffer(raw, dtype="<u8").reshape(-1, 2)
+        h1 = halves[:, :1]
+        h2 = halves[:, 1:] | np.uint64(1)
+        probes = np.arange(self.num_probes, dtype=np.uint64)
+        positions = (h1 + probes * h2) % np.uint64(self.num_bits)   # wraps mod 2**64
+
+        return (positions >> np.uint64(3)).astype(np.intp), (1 << (positions & np.uint64(7))).astype(np.uint8)
+
+    def add(self, values: list):
+        if values:
+            index, mask = self._positions(values)
+            np.bitwise_or.at(self.bits, index.ravel(), mask.ravel())
+
+    def contains(self, values: list) -> np.ndarray:
+        """Boolean mask: False means the value was certainly never added."""
+        if not values:
+            return np.zeros(0, dtype=bool)
+        index, mask = self._positions(values)
+        return ((self.bits[index] & mask) != 0).all(axis=1)
+
+    def fill_ratio(self) -> float:
+        return int(_POPCOUNT[self.bits].sum(dtype=np.int64)) / (len(self.bits) * 8)
+
+    def false_positive_rate(self) -> float:
+        """Current false positive rate, from the share of bits set."""
+        return self.fill_ratio() ** self.num_probes
+
+    def estimated_count(self) -> int:
+        """Distinct values added, estimated from the share of bits set."""
+        fill = min(self.fill_ratio(), 1 - 1e-9)
+        return round(-self.num_bits / self.num_probes * math.log(1 - fill))
+
+    def merge(self, other: "BloomFilter"):
+        """Union with a filter of the same shape (bitwise OR)."""
+        np.bitwise_or(self.bits, other.bits, out=self.bits)
+
+
+# -----------------------------
+# PERSISTED CATALOG FILTER
+# -----------------------------
+# File layout (little-endian): magic "STBF", format version u8, probes u8,
+# bits u64, catalog generation i64, then the bit array. The generation is
+# a counter the backend bumps after every write that stores hashes; the
+# file carries the one its bits cover. A filter whose generation differs
+# from the catalog's may be missing hashes stored since, and is not used
+# until it is updated. Deleting songs leaves the generation alone: the
+# deleted hashes stay in the filter as false positives.
+
+_MAGIC = b"STBF"
+_FORMAT = 2
+_HEADER = struct.Struct("<4sBBQq")
+
+# Seconds between checks that the catalog hasn't moved past the filter
+VERSION_CHECK_SECONDS = 1.0
+
+
+class HashFilter:
+    """
+    Bloom filter of every hash value stored in a catalog, kept in memory
+    and persisted at `path`. Backends store fingerprints inside adding();
+    lookups go through keep_present().
+
+    get_version: returns the catalog generation (int)
+    bump_version: increments the catalog generation and returns it
+    iter_hashes: yields lists of all distinct stored hash values (rebuild)
+
+    Concurrent writers (API workers, CLI runs) merge their bits into the
+    file under an exclusive lock, so none of them loses another's hashes.
+    All writers must share the file: it only covers writes made on this
+    host.
+    Readers reload the file whenever it is replaced; until the file covers
+    the current generation the filter passes everything through.
+    """
+
+    def __init__(self, path: Path, get_version, bump_version, iter_hashes, enabled: bool = True):
+        self.path = Path(path)
+        self.get_version = get_version
+        self.bump_version = bump_version
+        self.iter_hashes = iter_hashes
+        self.enabled = enabled
+
+        self._filter = None
+        self._version = None          # generation the in-memory filter covers
+        self._file_stat = None        # (inode, mtime_ns, size) of the file when loaded
+        self._checked_at = None
+        self._current = None          # catalog generation at the last check
+        self._lock = threading.Lock()
+
+    # ----- file I/O -----
+
+    def _stat(self):
+        try:
+            st = os.stat(self.path)
+        except FileNotFoundError:
+            return None
+        return st.st_ino, st.st_mtime_ns, st.st_size
+
+    def _read(self):
+        """(BloomFilter, generation) from the file, or (None, None)."""
+        try:
+            with open(self.path, "rb") as f:
+                data = f.read()
+        except FileNotFoundError:
+            return None, None
+
+        if len(data) < _HEADER.size:
+            return None, None
+        magic, fmt, probes, num_bits, version = _HEADER.unpack_from(data)
+        bits = np.frombuffer(data, dtype=np.uint8, offset=_HEADER.size).copy()
+        if magic != _MAGIC or fmt != _FORMAT or len(bits) != (num_bits + 7) // 8:
+            logger.warning(f"[bloom] Ignoring unreadable filter file {self.path}")
+            return None, None
+        return BloomFilter(num_bits, probes, bits), version
+
+    def _readable(self) -> bool:
+        """The file exists and has the current format (header check only)."""
+        try:
+            with open(self.path, "rb") as f:
+                header = f.read(_HEADER.size)
+        except FileNotFoundError:
+            return False
+        if len(header) < _HEADER.size:
+            return False
+        magic, fmt, *_rest = _HEADER.unpack(header)
+        return magic == _MAGIC and fmt == _FORMAT
+
+    def _write(self, bloom: BloomFilter, version: int):
+        tmp = self.path.with_name(f"{self.path.name}.{os.getpid()}.tmp")
+        with open(tmp, "wb") as f:
+            f.write(_HEADER.pack(_MAGIC, _FORMAT, bloom.num_probes, bloom.num_bits, version))
+            f.write(bloom.bits.tobytes())
+        os.replace(tmp, self.path)
+
+    @contextmanager
+    def _file_lock(self):
+        """Exclusive lock on <path>.lock for read-merge-write (no-op without fcntl)."""
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        fd = os.open(f"{self.path}.lock", os.O_RDWR | os.O_CREAT, 0o644)
+        try:
+            if fcntl is not None:
+                fcntl.flock(fd, fcntl.LOCK_EX)
+            yield
+        finally:
+            os.close(fd)
+
+    # ----- writers -----
+
+    def _add(self, hash_values: list, version: int) -> bool:
+        """
+        With the file lock held by the caller: load the file (every write
+        goes through it, so it holds all writers' bits), add hash_values
+        and write it back stamped with `version`. Without a file there is
+        no filter to update (it was never built, or was dropped for a bulk
+        load): returns False.
+        """
+        with self._lock:
+            bloom, _version = self._read()
+            if bloom is None:
+                return False
+
+            bloom.add(hash_values)
+            self._write(bloom, version)
+
+            self._filter, self._version = bloom, version
+            self._file_stat = self._stat()
+            return True
+
+    @contextmanager
+    def adding(self, hash_values: list):
+        """
+        Wrap the write that stores hash_values:
+
+            with hash_filter.adding(values):
+                ...commit the fingerprints...
+
+        The values reach the file before the commit, stamped with the
+        generation the write will bump the catalog to, and the file lock is
+        held until the bump. A process dying in between leaves only extra
+        bits (false positives), never a stored hash the filter lacks, and
+        rebuild() cannot read the catalog halfway through the write.
+        """
+        if not hash_values:
+            yield
+            return
+        if not self.enabled:
+            # Processes that do use the filter must still see the write
+            try:
+                yield
+            finally:
+                self.bump_version()
+            return
+
+        with self._file_lock():
+            added = self._add(hash_values, self.get_version() + 1)
+            try:
+                yield
+            finally:
+                # Even a failed write may have committed on some shards
+                current = self.bump_version()
+                with self._lock:
+                    self._current, self._checked_at = current, time.monotonic()
+
+        if not added:
+            self.rebuild()
+        elif self._filter.false_positive_rate() > 2 * HASH_FILTER_FPR:
+            logger.info("[bloom] Filter is over capacity; rebuilding it larger")
+            self.rebuild()
+
+    def rebuild(self) -> int:
+        """Build the filter from every stored hash; returns the number of distinct hashes."""
+        if not self.enabled:
+            return 0
+
+        start = time.perf_counter()
+        with self._lock, self._file_lock():
+            # Two passes (count, then fill) so no hash list is held in memory
+            total = sum(len(batch) for batch in self.iter_hashes())
+            bloom = BloomFilter.for_capacity(max(2 * total, HASH_FILTER_MIN_CAPACITY))
+            for batch in self.iter_hashes():
+                bloom.add(batch)
+
+            version = self.get_version()
+            self._write(bloom, version)
+
+            self._filter, self._version, self._current = bloom, version, version
+            self._file_stat = self._stat()
+            self._checked_at = time.monotonic()
+
+        logger.info(
+            f"[bloom] Built filter of {total} hashes ({len(bloom.bits) / (1 << 20):.1f} MiB) "
+            f"in {time.perf_counter() - start:.2f}s"
+        )
+        return total
+
+    def delete(self):
+        with self._lock:
+            self._filter = self._version = self._file_stat = self._checked_at = None
+            for path in (self.path, Path(f"{self.path}.lock")):
+                path.unlink(missing_ok=True)
+
+    # ----- readers -----
+
+    def _usable(self) -> BloomFilter | None:
+        now = time.monotonic()
+        if self._checked_at is None or now - self._checked_at >= VERSION_CHECK_SECONDS:
+            self._current = self.get_version()
+            self._checked_at = now
+
+            # Every write replaces the file: reload it when another process did
+            stat = self._stat()
+            if stat != self._file_stat:
+                with self._lock:
+                    self._filter, self._version = self._read()
+                    self._file_stat = stat
+
+        return self._filter if self._version == self._current else None
+
+    def keep_present(self, hash_values) -> list:
+        """The hash values that may be stored; all of them when no current filter exists."""
+        hash_values = list(hash_values)
+        bloom = self._usable() if self.enabled else None
+        if bloom is None or not hash_values:
+            return hash_values
+        return [h for h, present in zip(hash_values, bloom.contains(hash_values)) if present]
+
+    def ensure(self):
+        """Build the filter for catalogs without one (or with an older file format)."""
+        if self.enabled and not self._readable():
+            logger.info("[bloom] No hash filter for this catalog yet; building it")
+            self.rebuild()
+
+    def stats(self) -> dict:
+        bloom = self._usable() if self.enabled else None
+        if bloom is None:
+            return {"enabled": self.enabled, "current": False}
+        return {
+            "enabled": True,
+            "current": True,
+            "bytes": len(bloom.bits),
+            "probes": bloom.num_probes,
+            "estimated_hashes": bloom.estimated_count(),
+            "false_positive_rate": round(bloom.false_positive_rate(), 5),
+        }
@@ -0,0 +1,631 @@
+# db/mongo.py
+
+import json
+import threading
+import time
+from collections import Counter, defaultdict
+from contextlib import contextmanager
+
+from pymongo import ASCENDING, DESCENDING, ReturnDocument, UpdateOne
+
+from config import (
+    MONGO_URI,
+    MONGO_NAME,
+    MONGO_POOL_SIZE,
+    SONG_CACHE_SIZE,
+    HASH_MAX_POSTINGS,
+    HASH_STOPLIST_AT_INGEST,
+)
+from utils import get_logger, LRUCache
+from db.base import (
+    SongRow,
+    FingerprintRow,
+    batched,
+    PROFILE_SETTING_KEY,
+    LEGACY_PROFILE_RECORD,
+    is_legacy_profile_record,
+)
+
+logger = get_logger("mongo_db")
+
+# Documents per insert_many call
+INSERT_BATCH_SIZE = 10_000
+
+# -----------------------------
+# SETUP
+# -----------------------------
+# One MongoClient per process; it owns a connection pool and is thread-safe.
+
+_client = None
+_client_lock = threading.Lock()
+
+
+def get_client():
+    global _client
+    if _client is None:
+        with _client_lock:
+            if _client is None:
+                if MONGO_URI.startswith("mongomock://"):
+                    import mongomock
+
+                    _client = mongomock.MongoClient()
+                else:
+                    from pymongo import MongoClient
+
+                    _client = MongoClient(MONGO_URI, maxPoolSize=MONGO_POOL_SIZE)
+                logger.info("MongoDB client created.")
+    return _client
+
+
+def get_database():
+    return get_client()[MONGO_NAME]
+
+# -----------------------------
+# COLLECTIONS
+# -----------------------------
+# songs:        {_id: int, title, artist, path, spotify_url, youtube_url}
+# fingerprints: {hash, song_id, offset}
+# hash_counts:  {_id: hash, count: int}  (posting count per hash)
+# settings:     {_id: key, value: str}
+# counters:     {_id: "songs", seq: int}  (integer song ids, like SQLite)
+
+def _songs():
+    return get_database()["songs"]
+
+
+def _fingerprints():
+    return get_database()["fingerprints"]
+
+
+def _counters():
+    return get_database()["counters"]
+
+
+def _hash_counts():
+    return get_database()["hash_counts"]
+
+
+def _settings():
+    return get_database()["settings"]
+
+
+_song_cache = LRUCache(maxsize=SONG_CACHE_SIZE)
+
+_FP_PROJECTION = {"_id": 0, "hash": 1, "song_id": 1, "offset": 1}
+
+# -----------------------------
+# CONNECTION SCOPE
+# -----------------------------
+
+@contextmanager
+def connection_scope():
+    """
+    MongoClient already pools connections; this only exists so callers
+    can use the same API as the SQLite backend.
+    """
+    yield get_database()
+
+# -----------------------------
+# DB INIT
+# -----------------------------
+
+_initialized = False
+
+
+def init_db():
+    """
+    Create indexes if they do not exist.
+    Call once at startup; repeated calls are no-ops.
+    """
+    global _initialized
+    if _initialized:
+        return
+
+    logger.info("Initializing MongoDB database...")
+
+    # Compound index: hash lookups are served from the index alone
+    _fingerprints().create_index(
+        [("hash", ASCENDING), ("song_id", ASCENDING), ("offset", ASCENDING)],
+        name="idx_hash_lookup",
+    )
+    _fingerprints().create_index([("song_id", ASCENDING)], name="idx_fingerprint_song")
+    _songs().create_index([("path", ASCENDING)], unique=True, name="idx_song_path")
+    _songs().create_index([("artist", ASCENDING)], name="idx_song_artist")
+    _songs().create_index([("spotify_url", ASCENDING)], name="idx_song_spotify_url")
+    _hash_counts().create_index([("count", DESCENDING)], name="idx_hash_count")
+
+    _initialized = True
+    logger.info("MongoDB ready.")
+
+# -----------------------------
+# INSERT OPERATIONS
+# -----------------------------
+
+def _next_song_id() -> int:
+    counter = _counters().find_one_and_update(
+        {"_id": "songs"},
+        {"$inc": {"seq": 1}},
+        upsert=True,
+        return_document=ReturnDocument.AFTER,
+    )
+    return counter["seq"]
+
+
+def insert_song(title: str, artist: str, path: str, spotify_url: str = None, youtube_url: str = None) -> int:
+    song_id = _next_song_id()
+
+    _songs().insert_one(
+        {
+            "_id": song_id,
+            "title": title,
+            "artist": artist,
+            "path": path,
+            "spotify_url": spotify_url,
+            "youtube_url": youtube_url,
+        }
+    )
+
+    logger.info(f"Inserted song: {title} by {artist}")
+    return song_id
+
+
+def insert_fingerprints(song_id: int, hashes: list):
+    """
+    hashes = list of (hash_value, offset)
+    Written with unordered insert_many so the server can apply batches in parallel.
+    """
+    if HASH_STOPLIST_AT_INGEST and HASH_MAX_POSTINGS > 0:
+        stoplist = get_stoplist(refresh=True)
+        kept = [h for h in hashes if h[0] not in stoplist]
+        if len(kept) != len(hashes):
+            logger.info(f"Stop-list dropped {len(hashes) - len(kept)} fingerprints for song_id={song_id}")
+        hashes = kept
+
+    docs = [
+        {"hash": hash_value, "song_id": song_id, "offset": int(offset)}
+        for hash_value, offset in hashes
+    ]
+
+    collection = _fingerprints()
+    for batch in batched(docs, INSERT_BATCH_SIZE):
+        collection.insert_many(batch, ordered=False)
+
+    _update_hash_counts(Counter(hash_value for hash_value, _ in hashes))
+
+    logger.info(f"Inserted {len(hashes)} fingerprints for song_id={song_id}")
+
+# -----------------------------
+# QUERY OPERATIONS
+# -----------------------------
+
+def get_fingerprints_by_hash(hash_value: str):
+    """Return FingerprintRow(song_id, offset) entries sharing this hash."""
+    if hash_value in get_stoplist():
+        return []
+
+    cursor = _fingerprints().find({"hash": hash_value}, _FP_PROJECTION)
+    return [FingerprintRow(doc["song_id"], doc["offset"]) for doc in cursor]
+
+
+def get_fingerprints_by_hashes(hash_values):
+    """
+    Batched lookup: one $in query per LOOKUP_BATCH_SIZE hashes.
+
+    Returns:
+        {hash_value: [FingerprintRow, ...]} for hashes present in the DB.
+    """
+    stoplist = get_stoplist()
+    unique_hashes = [h for h in dict.fromkeys(hash_values) if h not in stoplist]
+    results = defaultdict(list)
+
+    collection = _fingerprints()
+    for batch in batched(unique_hashes):
+        for doc in collection.find({"hash": {"$in": batch}}, _FP_PROJECTION):
+            results[doc["hash"]].append(FingerprintRow(doc["song_id"], doc["offset"]))
+
+    return dict(results)
+
+
+def get_hash_counts(hash_values) -> dict[str, int] | None:
+    """
+    Posting-list length of each hash (from hash_counts), without fetching
+    the postings. Hashes absent from the catalog are left out; None when
+    the counts are unavailable (hash_counts is empty).
+    """
+    results = {}
+    unique_hashes = list(dict.fromkeys(hash_values))
+    collection = _hash_counts()
+    for batch in batched(unique_hashes):
+        for doc in collection.find({"_id": {"$in": batch}}):
+            if doc["count"] > 0:
+                results[doc["_id"]] = doc["count"]
+
+    if not results and unique_hashes and collection.find_one({}, {"_id": 1}) is None:
+        return None
+    return results
+
+
+def get_song_by_id(song_id: int):
+    """Fetch a song by its ID (returns a cached SongRow or None)."""
+    if song_id is None:
+        return None
+
+    song = _song_cache.get(song_id)
+    if song is not None:
+        return song
+
+    doc = _songs().find_one({"_id": song_id})
+    if doc is None:
+        return None
+
+    song = SongRow(
+        doc["_id"],
+        doc.get("title"),
+        doc.get("artist"),
+        doc.get("path"),
+        doc.get("spotify_url"),
+        doc.get("youtube_url"),
+    )
+    _song_cache.put(song_id, song)
+    return song
+
+
+def get_song_ids(
+    path: str | None = None, artist: str | None = None, spotify_url: str | None = None
+) -> list[int]:
+    """Song ids matching an exact path, artist and/or spotify_url."""
+    query = {}
+    if path is not None:
+        query["path"] = path
+    if artist is not None:
+        query["artist"] = artist
+    if spotify_url is not None:
+        query["spotify_url"] = spotify_url
+
+    return [doc["_id"] for doc in _songs().find(query, {"_id": 1})]
+
+
+def get_fingerprints_by_song(song_id: int):
+    """All (hash_value, offset) pairs of one song (via idx_fingerprint_song)."""
+    cursor = _fingerprints().find({"song_id": song_id}, {"_id": 0, "hash": 1, "offset": 1})
+    return [(doc["hash"], doc["offset"]) for doc in cursor]
+
+
+def get_song_fingerprint_counts(song_ids: list[int] | None = None) -> dict[int, int]:
+    """{song_id: number of stored fingerprints} for every song, or for song_ids only (via idx_fingerprint_song)."""
+    match = [] if song_ids is None else [{"$match": {"song_id": {"$in": list(song_ids)}}}]
+    counts = _fingerprints().aggregate(match + [
+        {"$group": {"_id": "$song_id", "n": {"$sum": 1}}},
+    ])
+    return {doc["_id"]: doc["n"] for doc in counts}
+
+# -----------------------------
+# SETTINGS
+# -----------------------------
+
+def get_setting(key: str) -> str | None:
+    doc = _settings().find_one({"_id": key})
+    return doc["value"] if doc else None
+
+
+def set_setting(key: str, value: str):
+    _settings().update_one({"_id": key}, {"$set": {"value": value}}, upsert=True)
+
+# -----------------------------
+# HASH STOP-LIST
+# -----------------------------
+# Same scheme as the SQLite backend: hashes above HASH_MAX_POSTINGS are
+# kept in an in-memory stop-list (refreshed every STOPLIST_TTL seconds)
+# and never looked up.
+
+STOPLIST_TTL = 300
+
+_stoplist = frozenset()
+_stoplist_loaded_at = None
+_stoplist_lock = threading.Lock()
+
+
+def _update_hash_counts(deltas: dict):
+    if MONGO_URI.startswith("mongomock://"):
+        # mongomock's bulk_write rejects recent pymongo's UpdateOne (unknown `sort`)
+        for h, n in deltas.items():
+            _hash_counts().update_one({"_id": h}, {"$inc": {"count": n}}, upsert=True)
+        _invalidate_stoplist()
+        return
+
+    ops = [
+        UpdateOne({"_id": h}, {"$inc": {"count": n}}, upsert=True)
+        for h, n in deltas.items()
+    ]
+    for batch in batched(ops, INSERT_BATCH_SIZE):
+        _hash_counts().bulk_write(batch, ordered=False)
+    _invalidate_stoplist()
+
+
+def _invalidate_stoplist():
+    global _stoplist_loaded_at
+    _stoplist_loaded_at = None
+
+
+def get_stoplist(refresh: bool = False) -> frozenset:
+    """Hashes whose posting count exceeds HASH_MAX_POSTINGS."""
+    global _stoplist, _stoplist_loaded_at
+
+    if HASH_MAX_POSTINGS <= 0:
+        return frozenset()
+
+    loaded_at = _stoplist_loaded_at
+    if not refresh and loaded_at is not None and time.monotonic() - loaded_at < STOPLIST_TTL:
+        return _stoplist
+
+    with _stoplist_lock:
+        cursor = _hash_counts().find({"count": {"$gt": HASH_MAX_POSTINGS}}, {"_id": 1})
+        _stoplist = frozenset(doc["_id"] for doc in cursor)
+        _stoplist_loaded_at = time.monotonic()
+
+    return _stoplist
+
+
+# -----------------------------
+# HASH FILTER
+# -----------------------------
+# None with MongoDB: the Bloom filter file (see db/bloom.py) only covers
+# writes made on its own host, but a MongoDB catalog is shared by every
+# host connected to it. Songs saved elsewhere would be missing from a
+# host's filter and their hashes never looked up there.
+
+def filter_hashes(hash_values) -> list:
+    """No filter with MongoDB: every hash value may be in the catalog."""
+    return list(hash_values)
+
+
+def rebuild_hash_filter() -> int:
+    """No filter with MongoDB: nothing to build."""
+    return 0
+
+
+def rebuild_hash_counts():
+    """Recompute hash_counts from the fingerprints collection."""
+    logger.info("Rebuilding hash posting counts...")
+    _hash_counts().delete_many({})
+    counts = _fingerprints().aggregate([
+        {"$group": {"_id": "$hash", "n": {"$sum": 1}}},
+    ])
+    _update_hash_counts({doc["_id"]: doc["n"] for doc in counts})
+    logger.info("Hash posting counts rebuilt.")
+
+
+def get_hash_stats(top_n: int = 20) -> dict:
+    """Posting-count summary (same shape as db.sqlite.get_hash_stats)."""
+    totals = list(_hash_counts().aggregate([
+        {"$group": {"_id": None, "distinct": {"$sum": 1}, "postings": {"$sum": "$count"}}},
+    ]))
+    top = _hash_counts().find().sort("count", DESCENDING).limit(top_n)
+
+    return {
+        "distinct_hashes": totals[0]["distinct"] if totals else 0,
+        "postings": totals[0]["postings"] if totals else 0,
+        "max_postings": HASH_MAX_POSTINGS,
+        "stopped_hashes": len(get_stoplist(refresh=True)),
+        "top": [(doc["_id"], doc["count"]) for doc in top],
+        "filter": {"enabled": False, "current": False},
+    }
+
+# -----------------------------
+# ERASE OPERATIONS
+# -----------------------------
+
+def delete_songs(song_ids: list[int]) -> int:
+    """
+    Delete songs and all their fingerprints (via idx_fingerprint_song).
+
+    Returns:
+        number of songs deleted
+    """
+    song_ids = list(dict.fromkeys(song_ids))
+    if not song_ids:
+        return 0
+
+    deleted = 0
+    for batch in batched(song_ids):
+        removed = _fingerprints().aggregate([
+            {"$match": {"song_id": {"$in": batch}}},
+            {"$group": {"_id": "$hash", "n": {"$sum": 1}}},
+        ])
+        _update_hash_counts({doc["_id"]: -doc["n"] for doc in removed})
+        _fingerprints().delete_many({"song_id": {"$in": batch}})
+        deleted += _songs().delete_many({"_id": {"$in": batch}}).deleted_count
+
+    for song_id in song_ids:
+        _song_cache.pop(song_id)
+
+    _hash_counts().delete_many({"count": {"$lte": 0}})
+    _invalidate_stoplist()
+
+    logger.info(f"Deleted {deleted} song(s) and their fingerprints.")
+    return deleted
+
+
+def delete_db():
+    """
+    Drop the whole MongoDB database.
+    Mirrors Go's `erase db` behavior.
+    """
+    global _initialized
+
+    get_client().drop_database(MONGO_NAME)
+    _song_cache.clear()
+    _invalidate_stoplist()
+    _initialized = False
+
+    logger.info("MongoDB database dropped.")
+
+# -----------------------------
+# PROCESS LIFECYCLE
+# -----------------------------
+
+def warm_cache():
+    """Preload the most recent songs and the stop-list before serving."""
+    _song_cache.clear()
+
+    cursor = _songs().find().sort("_id", DESCENDING).limit(SONG_CACHE_SIZE)
+    docs = list(cursor)
+    for doc in reversed(docs):
+        _song_cache.put(
+            doc["_id"],
+            SongRow(
+                doc["_id"],
+                doc.get("title"),
+                doc.get("artist"),
+                doc.get("path"),
+                doc.get("spotify_url"),
+                doc.get("youtube_url"),
+            ),
+        )
+
+    get_stoplist(refresh=True)
+    logger.info(f"Warmed {len(docs)} song rows.")
+
+
+def get_catalog_version():
+    """Changes whenever songs are added or removed."""
+    counter = _counters().find_one({"_id": "songs"})
+    return (counter["seq"] if counter else 0, _songs().estimated_document_count())
+
+
+def after_fork():
+    """
+    Call first thing in a forked child: MongoClient is not fork-safe,
+    so the child opens its own pool on first use.
+    """
+    global _client
+    _client = None
+
+# -----------------------------
+# BULK EXPORT / LOAD
+# -----------------------------
+
+def get_all_songs() -> list:
+    """Every song as a SongRow, by id."""
+    return [
+        SongRow(doc["_id"], doc.get("title"), doc.get("artist"), doc.get("path"),
+                doc.get("spotify_url"), doc.get("youtube_url"))
+        for doc in _songs().find().sort("_id", ASCENDING)
+    ]
+
+
+def get_all_settings() -> dict:
+    return {doc["_id"]: doc["value"] for doc in _settings().find()}
+
+
+def iter_fingerprints(batch_size: int = 100_000):
+    """Yield lists of (hash_value, song_id, offset) tuples."""
+    cursor = _fingerprints().find({}, _FP_PROJECTION, batch_size=min(batch_size, 10_000))
+    rows = []
+    for doc in cursor:
+        rows.append((doc["hash"], doc["song_id"], doc["offset"]))
+        if len(rows) >= batch_size:
+            yield rows
+            rows = []
+    if rows:
+        yield rows
+
+
+def bulk_load(songs: list, settings: dict, fingerprint_batches) -> int:
+    """
+    Fill an empty catalog in bulk (snapshot import).
+    Fingerprint indexes are dropped during the load and rebuilt after;
+    hash_counts is recomputed server-side in one aggregation.
+
+    Returns:
+        number of fingerprints loaded
+    """
+    global _initialized
+
+    if _songs().estimated_document_count():
+        raise ValueError("bulk_load needs an empty catalog")
+
+    if songs:
+        _songs().insert_many(
+            [{"_id": s.id, "title": s.title, "artist": s.artist, "path": s.path,
+              "spotify_url": s.spotify_url, "youtube_url": s.youtube_url} for s in songs],
+            ordered=False,
+        )
+        _counters().update_one(
+            {"_id": "songs"}, {"$max": {"seq": max(s.id for s in songs)}}, upsert=True
+        )
+    for key, value in settings.items():
+        set_setting(key, value)
+
+    _fingerprints().drop_indexes()
+
+    loaded = 0
+    collection = _fingerprints()
+    for rows in fingerprint_batches:
+        docs = [{"hash": h, "song_id": song_id, "offset": offset} for h, song_id, offset in rows]
+        for batch in batched(docs, INSERT_BATCH_SIZE):
+            collection.insert_many(batch, ordered=False)
+        loaded += len(rows)
+
+    _initialized = False
+    init_db()
+    rebuild_hash_counts()
+    _song_cache.clear()
+    logger.info(f"Bulk-loaded {len(songs)} songs and {loaded} fingerprints.")
+    return loaded
+
+# -----------------------------
+# MAINTENANCE OPERATIONS
+# -----------------------------
+
+_COLLECTIONS = ("songs", "fingerprints", "hash_counts")
+
+
+def vacuum_db():
+    """Release space left by deleted documents back to the storage engine."""
+    logger.info("Running compact...")
+    for name in _COLLECTIONS:
+        get_database().command("compact", name)
+    logger.info("compact done.")
+
+
+def analyze_db():
+    """MongoDB keeps planner statistics itself; only clears cached plans."""
+    logger.info("Clearing cached query plans...")
+    for name in _COLLECTIONS:
+        get_database().command("planCacheClear", name)
+    logger.info("Plan cache cleared.")
+
+
+def reindex_db():
+    """Drop and rebuild all secondary indexes."""
+    global _initialized
+
+    logger.info("Rebuilding indexes...")
+    for name in _COLLECTIONS:
+        get_database()[name].drop_indexes()
+    _initialized = False
+    init_db()
+    logger.info("Indexes rebuilt.")
+
+
+def migrate_db() -> int:
+    """
+    Fingerprints already use integer offsets and the covering
+    (hash, song_id, offset) index; only converts stray double offsets,
+    and renames an old "default" profile record "legacy".
+
+    Returns:
+        number of documents converted
+    """
+    raw = get_setting(PROFILE_SETTING_KEY)
+    if raw and is_legacy_profile_record(json.loads(raw)):
+        set_setting(PROFILE_SETTING_KEY, LEGACY_PROFILE_RECORD)
+        logger.info("Recorded the catalog's fingerprint profile as 'legacy'.")
+
+    result = _fingerprints().update_many(
+        {"offset": {"$type": "double"}},
+        [{"$set": {"offset": {"$toInt": {"$round": ["$offset", 0]}}}}],
+    )
+    logger.info(f"Converted {result.modified_count} fingerprint offsets to integers.")
+    return result.modified_count
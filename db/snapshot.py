@@ -0,0 +1,193 @@
+# db/snapshot.py
+
+import time
+from pathlib import Path
+
+import numpy as np
+
+from db import (
+    get_all_songs,
+    get_all_settings,
+    iter_fingerprints,
+    bulk_load,
+    get_catalog_version,
+    delete_db,
+    init_db,
+)
+from db.base import SongRow
+from utils import get_logger
+
+logger = get_logger("snapshot")
+
+SNAPSHOT_FORMAT = "seektune-snapshot"
+SNAPSHOT_VERSION = 1
+
+# Fingerprint rows converted to/from Python tuples per step
+CHUNK_ROWS = 200_000
+
+# SHA-1 hex digests are stored as 20 raw bytes
+_HASH_HEX_LEN = 40
+_HASH_BYTES = 20
+
+_SONG_TEXT_FIELDS = ("title", "artist", "path", "spotify_url", "youtube_url")
+
+# -----------------------------
+# SNAPSHOT LAYOUT (.npz, zip-deflated)
+# -----------------------------
+# format, version            scalars
+# song_id                    int64   [S]
+# song_title ... song_youtube_url  unicode [S]  (None stored as "" + mask)
+# song_<field>_null          bool    [S]
+# setting_key, setting_value unicode
+# fp_hash                    uint8   [N, 20]  (or fp_hash_str unicode [N])
+# fp_song_id                 int64   [N]
+# fp_offset                  int32   [N]
+# Fingerprints are sorted by (hash, song_id, offset), i.e. primary key order.
+
+
+def _encode_hashes(hashes: list):
+    """20-byte rows for SHA-1 hex digests; None when any hash is not one."""
+    if not all(len(h) == _HASH_HEX_LEN for h in hashes):
+        return None
+    joined = "".join(hashes)
+    try:
+        raw = bytes.fromhex(joined)
+    except ValueError:
+        return None
+    # Must round-trip exactly (lowercase, no whitespace)
+    if raw.hex() != joined:
+        return None
+    return np.frombuffer(raw, dtype=np.uint8).reshape(-1, _HASH_BYTES)
+
+
+def _hash_strings(block) -> list[str]:
+    if block.dtype == np.uint8:
+        hex_all = block.tobytes().hex()
+        return [hex_all[i:i + _HASH_HEX_LEN] for i in range(0, len(hex_all), _HASH_HEX_LEN)]
+    return block.tolist()
+
+
+def export_snapshot(path: str | Path) -> dict:
+    """
+    Dump songs, settings and fingerprints to a compressed columnar .npz.
+
+    Returns:
+        {"songs": int, "fingerprints": int, "bytes": int, "seconds": float}
+    """
+    start = time.perf_counter()
+    path = Path(path)
+
+    songs = get_all_songs()
+    arrays = {
+        "format": np.array(SNAPSHOT_FORMAT),
+        "version": np.array(SNAPSHOT_VERSION),
+        "song_id": np.array([s.id for s in songs], dtype=np.int64),
+    }
+    for field in _SONG_TEXT_FIELDS:
+        values = [getattr(s, field) for s in songs]
+        arrays[f"song_{field}"] = np.array([v or "" for v in values], dtype=str)
+        arrays[f"song_{field}_null"] = np.array([v is None for v in values], dtype=bool)
+
+    settings = get_all_settings()
+    arrays["setting_key"] = np.array(list(settings), dtype=str)
+    arrays["setting_value"] = np.array(list(settings.values()), dtype=str)
+
+    hash_parts, song_parts, offset_parts = [], [], []
+    binary = True
+    for rows in iter_fingerprints(CHUNK_ROWS):
+        hashes, song_ids, offsets = zip(*rows)
+        encoded = _encode_hashes(hashes) if binary else None
+        if encoded is None and binary:
+            # Fall back to text for everything seen so far
+            binary = False
+            hash_parts = [np.array(_hash_strings(part), dtype=str) for part in hash_parts]
+        hash_parts.append(encoded if binary else np.array(hashes, dtype=str))
+        song_parts.append(np.array(song_ids, dtype=np.int64))
+        offset_parts.append(np.array(offsets, dtype=np.int32))
+
+    if hash_parts:
+        hashes = np.concatenate(hash_parts)
+        song_ids = np.concatenate(song_parts)
+        offsets = np.concatenate(offset_parts)
+    else:
+        hashes = np.zeros((0, _HASH_BYTES), dtype=np.uint8)
+        song_ids = np.zeros(0, dtype=np.int64)
+        offsets = np.zeros(0, dtype=np.int32)
+
+    # Primary key order: better compression, and appends on import
+    hash_key = hashes.view(f"S{_HASH_BYTES}").ravel() if binary else hashes
+    order = np.lexsort((offsets, song_ids, hash_key))
+
+    arrays["fp_hash" if binary else "fp_hash_str"] = hashes[order]
+    arrays["fp_song_id"] = song_ids[order]
+    arrays["fp_offset"] = offsets[order]
+
+    with open(path, "wb") as f:
+        np.savez_compressed(f, **arrays)
+
+    stats = {
+        "songs": len(songs),
+        "fingerprints": int(len(order)),
+        "bytes": path.stat().st_size,
+        "seconds": round(time.perf_counter() - start, 2),
+    }
+    logger.info(f"[snapshot] Exported {stats} to {path}")
+    return stats
+
+
+def import_snapshot(path: str | Path, replace: bool = False) -> dict:
+    """
+    Bulk-load a snapshot written by export_snapshot() into an empty catalog
+    (replace=True erases the current one first). Works across backends and
+    DB_SHARDS settings: fingerprints are re-routed on load.
+
+    Returns:
+        {"songs": int, "fingerprints": int, "seconds": float}
+    """
+    start = time.perf_counter()
+
+    with np.load(path, allow_pickle=False) as data:
+        if "format" not in data or str(data["format"]) != SNAPSHOT_FORMAT:
+            raise ValueError(f"{path} is not a catalog snapshot")
+        if int(data["version"]) > SNAPSHOT_VERSION:
+            raise ValueError(f"Snapshot version {int(data['version'])} is newer than supported ({SNAPSHOT_VERSION})")
+
+        if get_catalog_version()[0]:
+            if not replace:
+                raise ValueError("Catalog is not empty (erase it first or use replace)")
+            logger.info("[snapshot] Erasing current catalog...")
+            delete_db()
+            init_db()
+
+        columns = {}
+        for field in _SONG_TEXT_FIELDS:
+            values = data[f"song_{field}"].tolist()
+            nulls = data[f"song_{field}_null"].tolist()
+            columns[field] = [None if null else value for value, null in zip(values, nulls)]
+        songs = [
+            SongRow(song_id, *(columns[field][i] for field in _SONG_TEXT_FIELDS))
+            for i, song_id in enumerate(data["song_id"].tolist())
+        ]
+        settings = dict(zip(data["setting_key"].tolist(), data["setting_value"].tolist()))
+
+        hashes = data["fp_hash"] if "fp_hash" in data else data["fp_hash_str"]
+        song_ids = data["fp_song_id"]
+        offsets = data["fp_offset"]
+
+        def batches():
+            for i in range(0, len(song_ids), CHUNK_ROWS):
+                yield list(zip(
+                    _hash_strings(hashes[i:i + CHUNK_ROWS]),
+                    song_ids[i:i + CHUNK_ROWS].tolist(),
+                    offsets[i:i + CHUNK_ROWS].tolist(),
+                ))
+
+        loaded = bulk_load(songs, settings, batches())
+
+    stats = {
+        "songs": len(songs),
+        "fingerprints": loaded,
+        "seconds": round(time.perf_counter() - start, 2),
+    }
+    logger.info(f"[snapshot] Imported {stats} from {path}")
+    return stats
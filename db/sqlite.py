@@ -1,19 +1,55 @@
 # db/sqlite.py
 
+import json
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from collections import Counter, defaultdict
+from contextlib import contextmanager
+
 from sqlalchemy import (
     create_engine,
+    event,
+    inspect,
+    text,
+    select,
+    insert,
+    delete,
+    update,
+    func,
+    bindparam,
+    cast,
     Column,
     Integer,
     String,
-    Float,
     ForeignKey,
     Index,
+    MetaData,
 )
+from sqlalchemy.dialects.sqlite import insert as sqlite_insert
+from sqlalchemy.schema import CreateTable
 from sqlalchemy.orm import declarative_base, sessionmaker
 from pathlib import Path
 
-from config import SQLITE_DB_PATH, DB_DIR
-from utils import create_folder, get_logger
+from config import (
+    SQLITE_DB_PATH,
+    DB_DIR,
+    DB_SHARDS,
+    SQLITE_MMAP_SIZE,
+    SONG_CACHE_SIZE,
+    HASH_MAX_POSTINGS,
+    HASH_STOPLIST_AT_INGEST,
+    HASH_FILTER,
+)
+from utils import create_folder, get_logger, LRUCache
+from db.base import (
+    SongRow,
+    batched,
+    PROFILE_SETTING_KEY,
+    LEGACY_PROFILE_RECORD,
+    is_legacy_profile_record,
+)
+from db.bloom import HashFilter
 
 logger = get_logger("sqlite_db")
 
@@ -23,44 +59,272 @@ logger = get_logger("sqlite_db")
 
 create_folder(DB_DIR)
 
-engine = create_engine(f"sqlite:///{SQLITE_DB_PATH}", echo=False)
+def _set_sqlite_pragmas(dbapi_conn, _record):
+    # WAL lets readers (matching) run while a writer (ingest) is active
+    cursor = dbapi_conn.cursor()
+    cursor.execute("PRAGMA journal_mode=WAL")
+    cursor.execute("PRAGMA synchronous=NORMAL")
+    cursor.execute(f"PRAGMA mmap_size={SQLITE_MMAP_SIZE}")
+    cursor.close()
+
+
+def _make_engine(path: Path):
+    eng = create_engine(f"sqlite:///{path}", echo=False)
+    event.listen(eng, "connect", _set_sqlite_pragmas)
+    return eng
+
+
+def shard_path(index: int) -> Path:
+    """File holding fingerprint shard `index` (only used when DB_SHARDS > 1)."""
+    return SQLITE_DB_PATH.with_name(f"{SQLITE_DB_PATH.stem}.shard{index}{SQLITE_DB_PATH.suffix}")
+
+
+engine = _make_engine(SQLITE_DB_PATH)
 SessionLocal = sessionmaker(bind=engine)
 Base = declarative_base()
 
+# -----------------------------
+# SHARDS
+# -----------------------------
+# Fingerprints are partitioned by hash prefix. Each shard is its own SQLite
+# file with its own B-tree, so lookups and inserts for different shards run
+# concurrently (sqlite3 releases the GIL while executing).
+
+if DB_SHARDS > 1:
+    shard_engines = [_make_engine(shard_path(i)) for i in range(DB_SHARDS)]
+    _shard_pool = ThreadPoolExecutor(max_workers=len(shard_engines), thread_name_prefix="db-shard")
+else:
+    shard_engines = [engine]
+    _shard_pool = None
+
+
+def shard_for_hash(hash_value: str) -> int:
+    """Shard index for a hex hash (first 8 hex digits, modulo DB_SHARDS)."""
+    if len(shard_engines) == 1:
+        return 0
+    return int(hash_value[:8], 16) % len(shard_engines)
+
+
+def _group_by_shard(items, key):
+    groups = defaultdict(list)
+    for item in items:
+        groups[shard_for_hash(key(item))].append(item)
+    return groups
+
+
+def db_files() -> list[Path]:
+    """Every SQLite file backing the catalog (main file + shards)."""
+    files = [SQLITE_DB_PATH]
+    if len(shard_engines) > 1:
+        files += [shard_path(i) for i in range(len(shard_engines))]
+    return files
+
+
+def _all_shards() -> dict:
+    return dict.fromkeys(range(len(shard_engines)))
+
+
+def _run_per_shard(fn, groups: dict):
+    """
+    Run fn(shard_index, items) for every shard group, concurrently when sharded.
+    Returns {shard_index: result}.
+    """
+    if _shard_pool is None or len(groups) <= 1:
+        return {idx: fn(idx, items) for idx, items in groups.items()}
+
+    futures = {idx: _shard_pool.submit(fn, idx, items) for idx, items in groups.items()}
+    return {idx: future.result() for idx, future in futures.items()}
+
 # -----------------------------
 # TABLES
 # -----------------------------
 
 class Song(Base):
     __tablename__ = "songs"
+    # Ids of deleted songs are never handed out again: caches and the hash
+    # filter's catalog version key on them
+    __table_args__ = {"sqlite_autoincrement": True}
 
     id = Column(Integer, primary_key=True, index=True)
     title = Column(String, index=True)
     artist = Column(String, index=True)
     path = Column(String, unique=True, index=True)
-    spotify_url = Column(String, nullable=True, index=False)
+    spotify_url = Column(String, nullable=True, index=True)
     youtube_url = Column(String, nullable=True, index=False)
 
 
 class Fingerprint(Base):
+    """
+    WITHOUT ROWID table clustered on (hash_value, song_id, offset): a hash
+    lookup is a single range scan of the primary key B-tree, with no
+    second seek into a rowid table. Offsets are integer frame indices.
+    """
     __tablename__ = "fingerprints"
+    __table_args__ = {"sqlite_with_rowid": False}
 
-    id = Column(Integer, primary_key=True, index=True)
-    song_id = Column(Integer, ForeignKey("songs.id"))
-    hash_value = Column(String, index=True)
-    offset = Column(Float)
+    hash_value = Column(String, primary_key=True)
+    song_id = Column(Integer, ForeignKey("songs.id"), primary_key=True)
+    offset = Column(Integer, primary_key=True)
+
+# Index so per-song deletes don't scan the whole fingerprints table
+# (secondary indexes of a WITHOUT ROWID table carry the full key, so it
+# also covers get_fingerprints_by_song)
+Index("idx_fingerprint_song", Fingerprint.song_id)
+
+
+class HashCount(Base):
+    """Posting count per hash; lives in the same file/shard as its fingerprints."""
+    __tablename__ = "hash_counts"
+
+    hash_value = Column(String, primary_key=True)
+    count = Column(Integer, nullable=False, index=True)
+
+
+class Setting(Base):
+    """Catalog-wide key/value settings (e.g. the fingerprint profile used at ingest)."""
+    __tablename__ = "settings"
 
-# Index for fast lookup by hash
-Index("idx_hash_lookup", Fingerprint.hash_value)
+    key = Column(String, primary_key=True)
+    value = Column(String, nullable=False)
+
+
+_fp = Fingerprint.__table__
+_song = Song.__table__
+_hc = HashCount.__table__
+_setting = Setting.__table__
+
+_FINGERPRINT_TABLES = [_fp, _hc]
+
+# Catalogs created before the clustered layout store offsets as REAL in a
+# rowid table with a separate hash index; reads cast so both layouts
+# return ints. See migrate_db().
+_offset = cast(_fp.c.offset, Integer).label("offset")
+
+# Indexes of the old rowid layout, dropped by migrate_db()
+_LEGACY_FP_INDEXES = ["idx_hash_lookup", "ix_fingerprints_hash_value", "ix_fingerprints_id", "idx_fingerprint_song"]
+
+# -----------------------------
+# LIGHTWEIGHT ROWS
+# -----------------------------
+# Read paths return plain tuples (SongRow, Row) instead of ORM instances:
+# no identity map, no attribute instrumentation, safe to cache.
+
+_song_cache = LRUCache(maxsize=SONG_CACHE_SIZE)
+
+# -----------------------------
+# CONNECTION SCOPE
+# -----------------------------
+
+_local = threading.local()
+
+
+@contextmanager
+def connection_scope():
+    """
+    Reuse one pooled connection for every DB call made inside the block
+    (e.g. all hash lookups of a single match request).
+    Nested scopes share the outer connection.
+    """
+    current = getattr(_local, "conn", None)
+    if current is not None:
+        yield current
+        return
+
+    with engine.connect() as conn:
+        _local.conn = conn
+        try:
+            yield conn
+        finally:
+            _local.conn = None
+
+
+@contextmanager
+def _read_conn():
+    current = getattr(_local, "conn", None)
+    if current is not None:
+        yield current
+    else:
+        with engine.connect() as conn:
+            yield conn
+
+
+@contextmanager
+def _shard_conn(index: int):
+    # The request-scoped connection is only reused for the main file
+    if shard_engines[index] is engine:
+        with _read_conn() as conn:
+            yield conn
+    else:
+        with shard_engines[index].connect() as conn:
+            yield conn
 
 # -----------------------------
 # DB INIT
 # -----------------------------
 
+_initialized = False
+
+
 def init_db():
-    """Create tables if they do not exist."""
+    """
+    Create tables if they do not exist.
+    Call once at startup; repeated calls are no-ops.
+    """
+    global _initialized
+    if _initialized:
+        return
+
     logger.info("Initializing SQLite database...")
-    Base.metadata.create_all(bind=engine)
+    missing_counts = [
+        index for index, shard_engine in enumerate(shard_engines)
+        if not inspect(shard_engine).has_table(HashCount.__tablename__)
+    ]
+    main_inspector = inspect(engine)
+    legacy_catalog = (
+        main_inspector.has_table(Song.__tablename__)
+        and not main_inspector.has_table(Setting.__tablename__)
+    )
+
+    if len(shard_engines) == 1:
+        Base.metadata.create_all(bind=engine)
+    else:
+        Base.metadata.create_all(bind=engine, tables=[_song, _setting])
+        for shard_engine in shard_engines:
+            Base.metadata.create_all(bind=shard_engine, tables=_FINGERPRINT_TABLES)
+        logger.info(f"Fingerprints sharded across {len(shard_engines)} files.")
+
+    # Databases created before hash_counts existed: backfill once
+    for index in missing_counts:
+        _rebuild_shard_counts(index)
+
+    # Catalogs from before settings existed were built with the original
+    # parameters (no gating, global threshold: see _LEGACY_FIELDS)
+    if legacy_catalog:
+        set_setting(PROFILE_SETTING_KEY, LEGACY_PROFILE_RECORD)
+
+    legacy_shards = _legacy_layout_shards()
+    if legacy_shards:
+        logger.warning(
+            f"Fingerprints in {len(legacy_shards)} file(s) use the old rowid/REAL-offset layout; "
+            "run `python main.py maintain migrate` for index-only lookups."
+        )
+    if _songs_reuse_ids():
+        logger.warning(
+            "The songs table reuses the ids of deleted songs; "
+            "run `python main.py maintain migrate` to stop that."
+        )
+
+    # create_all skips existing tables, so add indexes introduced later
+    for index in Song.__table__.indexes:
+        index.create(bind=engine, checkfirst=True)
+    for shard_engine in shard_engines:
+        for table in _FINGERPRINT_TABLES:
+            for index in table.indexes:
+                index.create(bind=shard_engine, checkfirst=True)
+
+    _initialized = True
+    if get_catalog_version()[0]:
+        _hash_filter.ensure()
     logger.info("SQLite DB ready.")
 
 # -----------------------------
@@ -68,41 +332,54 @@ def init_db():
 # -----------------------------
 
 def insert_song(title: str, artist: str, path: str, spotify_url: str = None, youtube_url: str = None) -> int:
-    session = SessionLocal()
-
-    song = Song(
-        title=title,
-        artist=artist,
-        path=path,
-        spotify_url=spotify_url,
-        youtube_url=youtube_url,
-    )
-
-    session.add(song)
-    session.commit()
-    session.refresh(song)
-    session.close()
+    with engine.begin() as conn:
+        result = conn.execute(
+            insert(_song).values(
+                title=title,
+                artist=artist,
+                path=path,
+                spotify_url=spotify_url,
+                youtube_url=youtube_url,
+            )
+        )
+        song_id = result.inserted_primary_key[0]
 
     logger.info(f"Inserted song: {title} by {artist}")
-    return song.id
+    return song_id
 
 
 def insert_fingerprints(song_id: int, hashes: list):
     """
     hashes = list of (hash_value, offset)
+    Routed to shards by hash; each shard gets one executemany in one
+    transaction (fingerprints + hash_counts), and shards are written in parallel.
     """
-    session = SessionLocal()
+    if HASH_STOPLIST_AT_INGEST and HASH_MAX_POSTINGS > 0:
+        stoplist = get_stoplist(refresh=True)
+        kept = [h for h in hashes if h[0] not in stoplist]
+        if len(kept) != len(hashes):
+            logger.info(f"Stop-list dropped {len(hashes) - len(kept)} fingerprints for song_id={song_id}")
+        hashes = kept
 
-    for hash_value, offset in hashes:
-        fp = Fingerprint(
-            song_id=song_id,
-            hash_value=hash_value,
-            offset=float(offset),
-        )
-        session.add(fp)
+    if hashes:
+        # (hash_value, song_id, offset) is the primary key: drop exact repeats
+        rows = [
+            {"song_id": song_id, "hash_value": hash_value, "offset": offset}
+            for hash_value, offset in dict.fromkeys((h, int(o)) for h, o in hashes)
+        ]
 
-    session.commit()
-    session.close()
+        def write_shard(index: int, shard_rows: list):
+            counts = Counter(r["hash_value"] for r in shard_rows)
+            with shard_engines[index].begin() as conn:
+                conn.execute(insert(_fp), shard_rows)
+                conn.execute(
+                    _count_upsert,
+                    [{"hash_value": h, "count": n} for h, n in counts.items()],
+                )
+
+        with _hash_filter.adding(list(dict.fromkeys(r["hash_value"] for r in rows))):
+            _run_per_shard(write_shard, _group_by_shard(rows, lambda r: r["hash_value"]))
+        _invalidate_stoplist()
 
     logger.info(f"Inserted {len(hashes)} fingerprints for song_id={song_id}")
 
@@ -110,53 +387,744 @@ def insert_fingerprints(song_id: int, hashes: list):
 # QUERY OPERATIONS
 # -----------------------------
 
+# Both read only primary key columns: index-only range scans on the clustered layout
+_fingerprint_lookup = select(_fp.c.song_id, _offset).where(
+    _fp.c.hash_value == bindparam("hash_value")
+)
+
+_fingerprint_batch_lookup = select(
+    _fp.c.hash_value, _fp.c.song_id, _offset
+).where(_fp.c.hash_value.in_(bindparam("hash_values", expanding=True)))
+
+_song_lookup = select(
+    _song.c.id,
+    _song.c.title,
+    _song.c.artist,
+    _song.c.path,
+    _song.c.spotify_url,
+    _song.c.youtube_url,
+).where(_song.c.id == bindparam("song_id"))
+
+
 def get_fingerprints_by_hash(hash_value: str):
-    session = SessionLocal()
+    """
+    Return (song_id, offset) rows sharing this hash.
+    Rows expose .song_id / .offset like the ORM objects did.
+    Stop-listed hashes return no rows.
+    """
+    if hash_value in get_stoplist():
+        return []
 
-    results = (
-        session.query(Fingerprint)
-        .filter(Fingerprint.hash_value == hash_value)
-        .all()
-    )
+    with _shard_conn(shard_for_hash(hash_value)) as conn:
+        return conn.execute(_fingerprint_lookup, {"hash_value": hash_value}).all()
+
+
+def get_fingerprints_by_hashes(hash_values):
+    """
+    Batched lookup: one IN query per LOOKUP_BATCH_SIZE hashes.
+    With DB_SHARDS > 1 the hashes are scattered to their shards, looked up
+    concurrently, and the (disjoint) results gathered.
+
+    Returns:
+        {hash_value: [row(.song_id, .offset), ...]} for hashes present in the DB.
+    """
+    stoplist = get_stoplist()
+    unique_hashes = [h for h in dict.fromkeys(hash_values) if h not in stoplist]
+
+    def lookup_shard(index: int, shard_hashes: list):
+        shard_results = defaultdict(list)
+        with _shard_conn(index) as conn:
+            for batch in batched(shard_hashes):
+                for row in conn.execute(_fingerprint_batch_lookup, {"hash_values": batch}):
+                    shard_results[row.hash_value].append(row)
+        return shard_results
+
+    results = {}
+    for shard_results in _run_per_shard(lookup_shard, _group_by_shard(unique_hashes, lambda h: h)).values():
+        results.update(shard_results)
 
-    session.close()
     return results
 
-def get_song_by_id(song_id: int):
-    """Fetch a Song row by its ID (returns SQLAlchemy Song object or None)."""
-    session = SessionLocal()
-    song = (
-        session.query(Song)
-        .filter(Song.id == song_id)
-        .first()
+
+def get_hash_counts(hash_values) -> dict[str, int] | None:
+    """
+    Posting-list length of each hash (from hash_counts), without fetching
+    the postings. Hashes absent from the catalog are left out; None when
+    the counts are unavailable (hash_counts is empty).
+    """
+    unique_hashes = list(dict.fromkeys(hash_values))
+    query = select(_hc.c.hash_value, _hc.c.count).where(
+        _hc.c.hash_value.in_(bindparam("hash_values", expanding=True))
     )
-    session.close()
+
+    def count_shard(index: int, shard_hashes: list):
+        counts = {}
+        with _shard_conn(index) as conn:
+            for batch in batched(shard_hashes):
+                counts.update(conn.execute(query, {"hash_values": batch}).all())
+        return counts
+
+    results = {}
+    for counts in _run_per_shard(count_shard, _group_by_shard(unique_hashes, lambda h: h)).values():
+        results.update(counts)
+
+    if not results and unique_hashes and not _hash_counts_built():
+        return None
+    return {h: n for h, n in results.items() if n > 0}
+
+
+def _hash_counts_built() -> bool:
+    query = select(_hc.c.hash_value).limit(1)
+    for index in range(len(shard_engines)):
+        with _shard_conn(index) as conn:
+            if conn.execute(query).first() is not None:
+                return True
+    return False
+
+
+def get_song_by_id(song_id: int):
+    """Fetch a song by its ID (returns a cached SongRow or None)."""
+    if song_id is None:
+        return None
+
+    song = _song_cache.get(song_id)
+    if song is not None:
+        return song
+
+    with _read_conn() as conn:
+        row = conn.execute(_song_lookup, {"song_id": song_id}).first()
+
+    if row is None:
+        return None
+
+    song = SongRow(*row)
+    _song_cache.put(song_id, song)
     return song
 
 
+def get_song_ids(
+    path: str | None = None, artist: str | None = None, spotify_url: str | None = None
+) -> list[int]:
+    """Song ids matching an exact path, artist and/or spotify_url."""
+    query = select(_song.c.id)
+    if path is not None:
+        query = query.where(_song.c.path == path)
+    if artist is not None:
+        query = query.where(_song.c.artist == artist)
+    if spotify_url is not None:
+        query = query.where(_song.c.spotify_url == spotify_url)
+
+    with _read_conn() as conn:
+        return list(conn.execute(query).scalars())
+
+
+def get_fingerprints_by_song(song_id: int):
+    """All (hash_value, offset) rows of one song (via idx_fingerprint_song)."""
+    query = select(_fp.c.hash_value, _offset).where(_fp.c.song_id == song_id)
+
+    rows = []
+    for index in range(len(shard_engines)):
+        with _shard_conn(index) as conn:
+            rows += conn.execute(query).all()
+    return rows
+
+
+def get_song_fingerprint_counts(song_ids: list[int] | None = None) -> dict[int, int]:
+    """{song_id: number of stored fingerprints} for every song, or for song_ids only (COUNT via idx_fingerprint_song)."""
+    query = select(_fp.c.song_id, func.count()).group_by(_fp.c.song_id)
+    if song_ids is not None:
+        query = query.where(_fp.c.song_id.in_(song_ids))
+
+    counts = Counter()
+    for index in range(len(shard_engines)):
+        with _shard_conn(index) as conn:
+            for song_id, count in conn.execute(query):
+                counts[song_id] += count
+    return dict(counts)
+
+
+# -----------------------------
+# SETTINGS
+# -----------------------------
+
+_setting_upsert = sqlite_insert(_setting).values(
+    key=bindparam("key"), value=bindparam("value")
+)
+_setting_upsert = _setting_upsert.on_conflict_do_update(
+    index_elements=[_setting.c.key],
+    set_={"value": _setting_upsert.excluded.value},
+)
+
+
+def get_setting(key: str) -> str | None:
+    with _read_conn() as conn:
+        return conn.execute(
+            select(_setting.c.value).where(_setting.c.key == key)
+        ).scalar()
+
+
+def set_setting(key: str, value: str):
+    with engine.begin() as conn:
+        conn.execute(_setting_upsert, {"key": key, "value": value})
+
+
+# Bumped after every write that stores hashes (see db/bloom.py)
+_GENERATION_KEY = "catalog_generation"
+
+_generation_bump = sqlite_insert(_setting).values(key=_GENERATION_KEY, value="1")
+_generation_bump = _generation_bump.on_conflict_do_update(
+    index_elements=[_setting.c.key],
+    set_={"value": cast(cast(_setting.c.value, Integer) + 1, String)},
+)
+
+
+def _catalog_generation() -> int:
+    return int(get_setting(_GENERATION_KEY) or 0)
+
+
+def _bump_catalog_generation() -> int:
+    with engine.begin() as conn:
+        conn.execute(_generation_bump)
+        return int(conn.execute(
+            select(_setting.c.value).where(_setting.c.key == _GENERATION_KEY)
+        ).scalar())
+
+
+# -----------------------------
+# HASH STOP-LIST
+# -----------------------------
+# hash_counts holds the posting count of every hash. Hashes above
+# HASH_MAX_POSTINGS (hum, silence artefacts, common chords) are kept in an
+# in-memory stop-list and never looked up. Writers in this process refresh
+# it immediately; other processes pick changes up within STOPLIST_TTL seconds.
+
+STOPLIST_TTL = 300
+
+_count_upsert = sqlite_insert(_hc).values(
+    hash_value=bindparam("hash_value"), count=bindparam("count")
+)
+_count_upsert = _count_upsert.on_conflict_do_update(
+    index_elements=[_hc.c.hash_value],
+    set_={"count": _hc.c.count + _count_upsert.excluded.count},
+)
+
+_count_decrement = (
+    update(_hc)
+    .where(_hc.c.hash_value == bindparam("h"))
+    .values(count=_hc.c.count - bindparam("n"))
+)
+
+_stoplist = frozenset()
+_stoplist_loaded_at = None
+_stoplist_lock = threading.Lock()
+
+
+def _invalidate_stoplist():
+    global _stoplist_loaded_at
+    _stoplist_loaded_at = None
+
+
+def get_stoplist(refresh: bool = False) -> frozenset:
+    """Hashes whose posting count exceeds HASH_MAX_POSTINGS."""
+    global _stoplist, _stoplist_loaded_at
+
+    if HASH_MAX_POSTINGS <= 0:
+        return frozenset()
+
+    loaded_at = _stoplist_loaded_at
+    if not refresh and loaded_at is not None and time.monotonic() - loaded_at < STOPLIST_TTL:
+        return _stoplist
+
+    with _stoplist_lock:
+        stopped = set()
+        query = select(_hc.c.hash_value).where(_hc.c.count > HASH_MAX_POSTINGS)
+        for index in range(len(shard_engines)):
+            with _shard_conn(index) as conn:
+                stopped.update(conn.execute(query).scalars())
+
+        _stoplist = frozenset(stopped)
+        _stoplist_loaded_at = time.monotonic()
+
+    return _stoplist
+
+
+# -----------------------------
+# HASH FILTER
+# -----------------------------
+# Bloom filter of every stored hash value in <db>.bloom next to the
+# catalog (see db/bloom.py). The matcher passes clip hashes through
+# filter_hashes() so hashes the catalog lacks cost no index probe.
+
+def _iter_hash_values(batch_size: int = 100_000):
+    """Yield lists of all distinct stored hash values (from hash_counts), shard by shard."""
+    for shard_engine in shard_engines:
+        raw = shard_engine.raw_connection()
+        try:
+            cursor = raw.cursor()
+            cursor.execute("SELECT hash_value FROM hash_counts")
+            while rows := cursor.fetchmany(batch_size):
+                yield [row[0] for row in rows]
+            cursor.close()
+        finally:
+            raw.close()
+
+
+_hash_filter = HashFilter(
+    SQLITE_DB_PATH.with_suffix(".bloom"),
+    _catalog_generation,
+    _bump_catalog_generation,
+    _iter_hash_values,
+    enabled=HASH_FILTER,
+)
+
+
+def filter_hashes(hash_values) -> list:
+    """The hash values that may be in the catalog: definite misses are dropped."""
+    return _hash_filter.keep_present(hash_values)
+
+
+def rebuild_hash_filter() -> int:
+    """Rebuild the hash filter from the stored hashes; returns the number of distinct hashes."""
+    return _hash_filter.rebuild()
+
+
+def _rebuild_shard_counts(index: int):
+    with shard_engines[index].begin() as conn:
+        conn.execute(delete(_hc))
+        conn.execute(
+            text(
+                "INSERT INTO hash_counts (hash_value, count) "
+                "SELECT hash_value, COUNT(*) FROM fingerprints GROUP BY hash_value"
+            )
+        )
+
+
+def rebuild_hash_counts():
+    """Recompute hash_counts from the fingerprints table(s)."""
+    logger.info("Rebuilding hash posting counts...")
+    _run_per_shard(lambda index, _items: _rebuild_shard_counts(index), _all_shards())
+    _invalidate_stoplist()
+    logger.info("Hash posting counts rebuilt.")
+    _hash_filter.rebuild()
+
+
+def get_hash_stats(top_n: int = 20) -> dict:
+    """
+    Posting-count summary:
+        {
+          "distinct_hashes": int,
+          "postings": int,
+          "max_postings": int,       # HASH_MAX_POSTINGS (0 = disabled)
+          "stopped_hashes": int,
+          "top": [(hash_value, count), ...],  # most common first
+          "filter": {...}                     # hash filter size and false positive rate
+        }
+    """
+    distinct = postings = 0
+    top = []
+
+    for index in range(len(shard_engines)):
+        with _shard_conn(index) as conn:
+            n, total = conn.execute(select(func.count(), func.coalesce(func.sum(_hc.c.count), 0))).one()
+            distinct += n
+            postings += total
+            top += conn.execute(
+                select(_hc.c.hash_value, _hc.c.count).order_by(_hc.c.count.desc()).limit(top_n)
+            ).all()
+
+    top = sorted(((h, c) for h, c in top), key=lambda item: item[1], reverse=True)[:top_n]
+
+    return {
+        "distinct_hashes": distinct,
+        "postings": postings,
+        "max_postings": HASH_MAX_POSTINGS,
+        "stopped_hashes": len(get_stoplist(refresh=True)),
+        "top": top,
+        "filter": _hash_filter.stats(),
+    }
+
+
 # -----------------------------
 # ERASE OPERATIONS
 # -----------------------------
 
+def delete_songs(song_ids: list[int]) -> int:
+    """
+    Delete songs and all their fingerprints (via idx_fingerprint_song).
+    Fingerprint shards are cleaned in parallel.
+
+    Returns:
+        number of songs deleted
+    """
+    song_ids = list(dict.fromkeys(song_ids))
+    if not song_ids:
+        return 0
+
+    def delete_from_shard(index: int, _items):
+        with shard_engines[index].begin() as conn:
+            for batch in batched(song_ids):
+                removed = conn.execute(
+                    select(_fp.c.hash_value, func.count())
+                    .where(_fp.c.song_id.in_(batch))
+                    .group_by(_fp.c.hash_value)
+                ).all()
+                if removed:
+                    conn.execute(
+                        _count_decrement,
+                        [{"h": h, "n": n} for h, n in removed],
+                    )
+                conn.execute(delete(_fp).where(_fp.c.song_id.in_(batch)))
+            conn.execute(delete(_hc).where(_hc.c.count <= 0))
+
+    _run_per_shard(delete_from_shard, _all_shards())
+    _invalidate_stoplist()
+
+    deleted = 0
+    with engine.begin() as conn:
+        for batch in batched(song_ids):
+            deleted += conn.execute(delete(_song).where(_song.c.id.in_(batch))).rowcount
+
+    for song_id in song_ids:
+        _song_cache.pop(song_id)
+
+    logger.info(f"Deleted {deleted} song(s) and their fingerprints.")
+    return deleted
+
+
 def delete_db():
     """
     Delete the entire SQLite database file.
     Mirrors Go's `erase db` behavior.
     """
-    if SQLITE_DB_PATH.exists():
-        SQLITE_DB_PATH.unlink()
-        logger.info("SQLite database deleted.")
-    else:
+    global _initialized
+
+    # Drop pooled connections before the files disappear underneath them
+    engine.dispose()
+    for shard_engine in shard_engines:
+        shard_engine.dispose()
+    _song_cache.clear()
+    _invalidate_stoplist()
+    _hash_filter.delete()
+    _initialized = False
+
+    if not SQLITE_DB_PATH.exists():
         logger.warning("SQLite database does not exist.")
+        return
+
+    for path in db_files():
+        for suffix in ("", "-wal", "-shm"):
+            db_file = path.with_name(path.name + suffix)
+            if db_file.exists():
+                db_file.unlink()
+
+    logger.info("SQLite database deleted.")
+
+
+# -----------------------------
+# PROCESS LIFECYCLE
+# -----------------------------
+
+def warm_cache():
+    """
+    Pre-touch the catalog before serving: read every DB file once so its
+    pages sit in the OS page cache (shared by all worker processes), and
+    preload the most recent songs into the song cache.
+    """
+    _song_cache.clear()
+
+    total = 0
+    for path in db_files():
+        for db_file in (path, path.with_name(path.name + "-wal")):
+            if not db_file.exists():
+                continue
+            with open(db_file, "rb") as f:
+                while chunk := f.read(1 << 20):
+                    total += len(chunk)
+
+    query = select(
+        _song.c.id,
+        _song.c.title,
+        _song.c.artist,
+        _song.c.path,
+        _song.c.spotify_url,
+        _song.c.youtube_url,
+    ).order_by(_song.c.id.desc()).limit(SONG_CACHE_SIZE)
+
+    with _read_conn() as conn:
+        rows = conn.execute(query).all()
+    for row in reversed(rows):
+        _song_cache.put(row.id, SongRow(*row))
+
+    get_stoplist(refresh=True)
+    logger.info(f"Warmed {total / (1 << 20):.1f} MiB of DB files and {len(rows)} song rows.")
+
+
+def get_catalog_version():
+    """
+    (song count, highest song id): changes whenever songs are added or removed.
+    File mtimes are not used: WAL checkpoints touch them without any catalog change.
+    """
+    with _read_conn() as conn:
+        return tuple(conn.execute(select(func.count(), func.max(_song.c.id))).one())
+
+
+def after_fork():
+    """
+    Call first thing in a forked child. Pooled connections and the shard
+    thread pool belong to the parent and must not be used here.
+    """
+    global _shard_pool
+
+    engine.dispose(close=False)
+    for shard_engine in shard_engines:
+        shard_engine.dispose(close=False)
+    _local.__dict__.clear()
+
+    if _shard_pool is not None:
+        _shard_pool = ThreadPoolExecutor(max_workers=len(shard_engines), thread_name_prefix="db-shard")
+
+
+# -----------------------------
+# BULK EXPORT / LOAD
+# -----------------------------
+
+def get_all_songs() -> list:
+    """Every song as a SongRow, by id."""
+    with _read_conn() as conn:
+        return [SongRow(*row) for row in conn.execute(
+            select(
+                _song.c.id,
+                _song.c.title,
+                _song.c.artist,
+                _song.c.path,
+                _song.c.spotify_url,
+                _song.c.youtube_url,
+            ).order_by(_song.c.id)
+        )]
+
+
+def get_all_settings() -> dict:
+    with _read_conn() as conn:
+        return dict(conn.execute(select(_setting.c.key, _setting.c.value)).all())
+
+
+def iter_fingerprints(batch_size: int = 100_000):
+    """Yield lists of (hash_value, song_id, offset) tuples, shard by shard."""
+    for shard_engine in shard_engines:
+        raw = shard_engine.raw_connection()
+        try:
+            cursor = raw.cursor()
+            cursor.execute('SELECT hash_value, song_id, CAST("offset" AS INTEGER) FROM fingerprints')
+            while rows := cursor.fetchmany(batch_size):
+                yield rows
+            cursor.close()
+        finally:
+            raw.close()
+
+
+def bulk_load(songs: list, settings: dict, fingerprint_batches) -> int:
+    """
+    Fill an empty catalog in bulk (snapshot import).
+
+    Songs keep their ids. Fingerprints go through raw executemany on one
+    transaction per shard with synchronous=OFF; secondary indexes are
+    dropped for the load and built afterwards, and hash_counts is computed
+    with one GROUP BY per shard. Batches sorted by primary key load fastest.
+
+    Returns:
+        number of fingerprints loaded
+    """
+    if get_catalog_version()[0]:
+        raise ValueError("bulk_load needs an empty catalog")
+
+    # Rebuilt after the load; until then no filter claims to cover it
+    _hash_filter.delete()
+
+    with engine.begin() as conn:
+        if songs:
+            conn.execute(insert(_song), [song._asdict() for song in songs])
+        for key, value in settings.items():
+            conn.execute(_setting_upsert, {"key": key, "value": value})
+
+    for shard_engine in shard_engines:
+        for index in _fp.indexes:
+            index.drop(bind=shard_engine, checkfirst=True)
+
+    raws = [shard_engine.raw_connection() for shard_engine in shard_engines]
+    cursors = [raw.cursor() for raw in raws]
+    loaded = 0
+    try:
+        for cursor in cursors:
+            cursor.execute("PRAGMA synchronous=OFF")
+
+        statement = 'INSERT INTO fingerprints (hash_value, song_id, "offset") VALUES (?, ?, ?)'
+        for rows in fingerprint_batches:
+            if len(cursors) == 1:
+                cursors[0].executemany(statement, rows)
+            else:
+                for index, shard_rows in _group_by_shard(rows, lambda r: r[0]).items():
+                    cursors[index].executemany(statement, shard_rows)
+            loaded += len(rows)
+
+        for raw in raws:
+            raw.commit()
+    except BaseException:
+        for raw in raws:
+            raw.rollback()
+        raise
+    finally:
+        # Connections go back to the pool: restore the normal durability
+        for raw, cursor in zip(raws, cursors):
+            cursor.execute("PRAGMA synchronous=NORMAL")
+            cursor.close()
+            raw.close()
+
+    def finish_shard(index: int, _items):
+        _rebuild_shard_counts(index)
+        for fp_index in _fp.indexes:
+            fp_index.create(bind=shard_engines[index], checkfirst=True)
+
+    _run_per_shard(finish_shard, _all_shards())
+    _song_cache.clear()
+    _invalidate_stoplist()
+    _bump_catalog_generation()
+    _hash_filter.rebuild()
+    analyze_db()
+
+    logger.info(f"Bulk-loaded {len(songs)} songs and {loaded} fingerprints.")
+    return loaded
+
+# -----------------------------
+# MAINTENANCE OPERATIONS
+# -----------------------------
+
+def _run_maintenance(statement: str):
+    # VACUUM cannot run inside a transaction
+    for eng in dict.fromkeys([engine] + shard_engines):
+        with eng.connect().execution_options(isolation_level="AUTOCOMMIT") as conn:
+            conn.exec_driver_sql(statement)
+
+
+def vacuum_db():
+    """Reclaim space left by deleted rows (rewrites every DB file)."""
+    logger.info("Running VACUUM...")
+    _run_maintenance("VACUUM")
+    logger.info("VACUUM done.")
+
+
+def analyze_db():
+    """Refresh the query planner statistics."""
+    logger.info("Running ANALYZE...")
+    _run_maintenance("ANALYZE")
+    logger.info("ANALYZE done.")
+
+
+def reindex_db():
+    """Rebuild all indexes from scratch."""
+    logger.info("Running REINDEX...")
+    _run_maintenance("REINDEX")
+    logger.info("REINDEX done.")
+    _hash_filter.rebuild()
+
+
+def _legacy_layout_shards() -> list[int]:
+    """Shards whose fingerprints table still has the surrogate `id` rowid column."""
+    legacy = []
+    for index, shard_engine in enumerate(shard_engines):
+        inspector = inspect(shard_engine)
+        if not inspector.has_table(Fingerprint.__tablename__):
+            continue
+        if "id" in {c["name"] for c in inspector.get_columns(Fingerprint.__tablename__)}:
+            legacy.append(index)
+    return legacy
+
+
+def _migrate_shard(index: int):
+    shard_engine = shard_engines[index]
+    with shard_engine.begin() as conn:
+        conn.exec_driver_sql("ALTER TABLE fingerprints RENAME TO fingerprints_legacy")
+        for name in _LEGACY_FP_INDEXES:
+            conn.exec_driver_sql(f"DROP INDEX IF EXISTS {name}")
+
+        # Table first, secondary index after the bulk insert
+        conn.execute(CreateTable(_fp))
+        # Insert in primary key order so the new B-tree is built by appends
+        conn.exec_driver_sql(
+            'INSERT OR IGNORE INTO fingerprints (hash_value, song_id, "offset") '
+            'SELECT hash_value, song_id, CAST(ROUND("offset") AS INTEGER) FROM fingerprints_legacy '
+            'WHERE hash_value IS NOT NULL AND song_id IS NOT NULL AND "offset" IS NOT NULL '
+            'ORDER BY 1, 2, 3'
+        )
+        conn.exec_driver_sql("DROP TABLE fingerprints_legacy")
+
+        for fp_index in _fp.indexes:
+            fp_index.create(bind=conn)
+
+    # Exact duplicate rows collapsed into one: recount
+    _rebuild_shard_counts(index)
+
+    with shard_engine.connect().execution_options(isolation_level="AUTOCOMMIT") as conn:
+        conn.exec_driver_sql("VACUUM")
+
+
+def _songs_reuse_ids() -> bool:
+    """True for a songs table created without AUTOINCREMENT (SQLite reuses the highest deleted id)."""
+    with engine.connect() as conn:
+        sql = conn.exec_driver_sql(
+            "SELECT sql FROM sqlite_master WHERE type = 'table' AND name = 'songs'"
+        ).scalar()
+    return sql is not None and "AUTOINCREMENT" not in sql.upper()
+
+
+def _migrate_songs():
+    """
+    Recreate the songs table with AUTOINCREMENT, keeping every id (SQLite's
+    create-copy-drop-rename procedure, so references to "songs" stay valid).
+    """
+    songs_new = _song.to_metadata(MetaData(), name="songs_new")
+    columns = ", ".join(f'"{c.name}"' for c in _song.columns)
+
+    with engine.begin() as conn:
+        conn.execute(CreateTable(songs_new))
+        # Explicit ids also advance sqlite_sequence to the current maximum
+        conn.exec_driver_sql(f"INSERT INTO songs_new ({columns}) SELECT {columns} FROM songs ORDER BY id")
+        conn.exec_driver_sql("DROP TABLE songs")
+        conn.exec_driver_sql("ALTER TABLE songs_new RENAME TO songs")
+        for index in _song.indexes:
+            index.create(bind=conn)
+
+    _song_cache.clear()
+
+
+def migrate_db() -> int:
+    """
+    Convert fingerprints from the old layout (rowid table, REAL offsets,
+    separate hash index) to the clustered WITHOUT ROWID layout with integer
+    offsets. Shards are migrated in parallel, each in one transaction,
+    then vacuumed. Already migrated files are skipped. A songs table that
+    reuses deleted ids is recreated with AUTOINCREMENT, and an old
+    "default" profile record is renamed "legacy".
+
+    Returns:
+        number of files migrated
+    """
+    raw = get_setting(PROFILE_SETTING_KEY)
+    if raw and is_legacy_profile_record(json.loads(raw)):
+        set_setting(PROFILE_SETTING_KEY, LEGACY_PROFILE_RECORD)
+        logger.info("Recorded the catalog's fingerprint profile as 'legacy'.")
+
+    if _songs_reuse_ids():
+        logger.info("Recreating the songs table with AUTOINCREMENT ids...")
+        _migrate_songs()
+        logger.info("Songs table migrated.")
+
+    legacy = _legacy_layout_shards()
+    if not legacy:
+        logger.info("Fingerprints already use the clustered layout.")
+        return 0
 
-       
-# def get_song_by_id(song_id: int):
-#     """Fetch a Song row by its ID."""
-#     session = SessionLocal()
-#     song = (
-#         session.query(Song)
-#         .filter(Song.id == song_id)
-#         .first()
-#     )
-#     session.close()
-#     return song
+    logger.info(f"Migrating fingerprints in {len(legacy)} file(s) to the clustered layout...")
+    _run_per_shard(lambda index, _items: _migrate_shard(index), dict.fromkeys(legacy))
+    _invalidate_stoplist()
+    logger.info("Fingerprint migration done.")
+    return len(legacy)
@@ -0,0 +1,598 @@
+# diff_test.py
+#
+# Differential correctness harness for fingerprint / match engines:
+#     python diff_test.py [--engines parallel,planner,streaming] [--candidate mymodule:MyEngine]
+#
+# Generates a deterministic corpus (synthetic songs, some with silent gaps
+# or quiet passages, and noisy clips with a known source and offset),
+# fingerprints it into a throwaway catalog with the reference engine (the
+# single-core pipeline of fingerprint/ and matcher/), then runs every
+# candidate engine side by side with it, stage by stage:
+#
+#   spectrogram   audio file -> magnitude spectrogram (max relative error)
+#   peaks         reference spectrogram -> peaks (exact, or within +-N bins)
+#   hashes        reference peaks -> (hash, offset) list
+#   fingerprint   audio file -> hashes, end to end
+#   match         reference clip hashes -> top-K songs, scores and offsets
+#   identify      clip file -> result, end to end, plus accuracy against
+#                 the clip's known source
+#
+# Only the stages a candidate changes are compared (a composed stage is
+# compared when any stage it uses is overridden), each with the
+# reference/candidate time ratio. Engines marked exact must reproduce the
+# reference bit for bit; the others must stay within --min-overlap and
+# --offset-tolerance. Exits with status 1 on any failure.
+#
+# A candidate is an Engine subclass that overrides some stages:
+#
+#     from diff_test import Engine
+#
+#     class FastPeaks(Engine):
+#         name, exact = "fast_peaks", True
+#
+#         def peaks(self, spec, profile):
+#             ...
+#
+#     python diff_test.py --engines none --candidate mymodule:FastPeaks
+
+import argparse
+import importlib
+import json
+import os
+import random
+import sys
+import tempfile
+import time
+from collections import Counter
+from pathlib import Path
+
+from load_test import SAMPLE_RATE, synth_song
+
+STAGES = ("spectrogram", "peaks", "hashes", "fingerprint", "match", "identify")
+
+# Stages whose default implementation is built from other stages
+_USES = {
+    "fingerprint": ("spectrogram", "peaks", "hashes"),
+    "identify": ("spectrogram", "peaks", "hashes", "match"),
+}
+
+
+# -----------------------------
+# ENGINES
+# -----------------------------
+
+class Engine:
+    """
+    The reference pipeline, one method per stage. Candidates subclass it
+    and override the stages they reimplement; the rest stay the reference.
+
+    exact: the candidate must give identical output (False: within tolerance)
+    """
+
+    name = "reference"
+    exact = True
+
+    def warm_up(self, file_path: str, profile):
+        """Called once before timing (start pools, import lazily loaded modules)."""
+
+    def spectrogram(self, file_path: str, profile):
+        from fingerprint.spectrogram import generate_spectrogram
+
+        return generate_spectrogram(
+            file_path,
+            sample_rate=profile.sample_rate,
+            n_fft=profile.n_fft,
+            hop_length=profile.hop_length,
+        )
+
+    def peaks(self, spec, profile):
+        """Energy gate and peak picking: np.ndarray (N, 2) of [freq_bin, time_bin]."""
+        from fingerprint.gating import active_segments
+        from fingerprint.peak_picker import find_peaks
+
+        segments = active_segments(spec, profile.silence_db, min_gap=profile.neighborhood[1])
+        return find_peaks(
+            spec,
+            threshold_percentile=profile.threshold_percentile,
+            neighborhood=profile.neighborhood,
+            threshold_window=profile.threshold_window,
+            segments=segments,
+        )
+
+    def hashes(self, peaks, profile, strengths=None):
+        from fingerprint import hash_peaks
+
+        return hash_peaks(peaks, profile, strengths)
+
+    def fingerprint(self, file_path: str, profile):
+        return self.hashes(self.peaks(self.spectrogram(file_path, profile), profile), profile)
+
+    def match(self, query_hashes: list, profile, top_k: int) -> dict:
+        """Lookup, voting and ranking of every clip hash (no query planner)."""
+        from matcher.matcher import match_hashes
+
+        return match_hashes(query_hashes, profile, top_k, budget=0)
+
+    def identify(self, file_path: str, profile, top_k: int) -> dict:
+        spec = self.spectrogram(file_path, profile)
+        peaks = self.peaks(spec, profile)
+        strengths = spec[peaks[:, 0], peaks[:, 1]]
+        return self.match(self.hashes(peaks, profile, strengths), profile, top_k)
+
+
+class ParallelEngine(Engine):
+    """fingerprint/parallel.py on every song, in small chunks so chunk boundaries are exercised."""
+
+    name = "parallel"
+    exact = True
+
+    def __init__(self, workers: int = 2, chunk_seconds: float = 4.0):
+        self.workers = workers
+        self.chunk_seconds = chunk_seconds
+
+    def warm_up(self, file_path: str, profile):
+        self.fingerprint(file_path, profile)
+
+    def fingerprint(self, file_path: str, profile):
+        from fingerprint.parallel import compute_hashes_parallel
+
+        return compute_hashes_parallel(file_path, profile, self.workers, self.chunk_seconds)
+
+
+class PlannerEngine(Engine):
+    """The budgeted query planner (MATCH_HASH_BUDGET) instead of looking up every clip hash."""
+
+    name = "planner"
+    exact = False
+
+    def match(self, query_hashes: list, profile, top_k: int) -> dict:
+        from matcher.matcher import match_hashes
+
+        return match_hashes(query_hashes, profile, top_k)
+
+
+class StreamingEngine(Engine):
+    """StreamingMatcher fed the clip in quarter-second chunks, answering as soon as it is decisive."""
+
+    name = "streaming"
+    exact = False
+
+    def identify(self, file_path: str, profile, top_k: int) -> dict:
+        import soundfile as sf
+
+        from matcher.streaming import StreamingMatcher
+
+        samples, rate = sf.read(file_path, dtype="float32", always_2d=True)
+        samples = samples.mean(axis=1)
+        sm = StreamingMatcher(profile, input_rate=rate, top_k=top_k)
+        chunk = max(rate // 4, 1)
+        for start in range(0, len(samples), chunk):
+            if sm.feed(samples[start:start + chunk])["done"]:
+                break
+        return sm.finish()["result"]
+
+
+BUILTIN_ENGINES = {
+    "parallel": ParallelEngine,
+    "planner": PlannerEngine,
+    "streaming": StreamingEngine,
+}
+
+
+def load_candidate(spec: str) -> Engine:
+    """'module:attr' -> Engine instance (attr is an Engine subclass or a factory)."""
+    module_name, _, attr = spec.partition(":")
+    if not attr:
+        raise argparse.ArgumentTypeError(f"--candidate must be module:attr, got '{spec}'")
+    engine = getattr(importlib.import_module(module_name), attr)()
+    if not isinstance(engine, Engine):
+        raise argparse.ArgumentTypeError(f"{spec} is not an Engine")
+    return engine
+
+
+def compared_stages(engine: Engine) -> list[str]:
+    """Stages where the engine's output can differ from the reference."""
+    overridden = {s for s in STAGES if getattr(type(engine), s) is not getattr(Engine, s)}
+    return [s for s in STAGES if s in overridden or set(_USES.get(s, ())) & overridden]
+
+
+# -----------------------------
+# CORPUS
+# -----------------------------
+
+def build_corpus(out_dir: Path, args) -> tuple[list, list]:
+    """
+    Songs [(title, path)] and clips [(label, path, song index or None,
+    true offset in seconds)], all derived from args.seed. Every third song
+    has a silent gap (energy gate), every third a quiet second half
+    (per-block thresholds); one clip comes from a song not in the catalog.
+    """
+    import numpy as np
+    import soundfile as sf
+
+    rng = random.Random(args.seed)
+    out_dir.mkdir(parents=True, exist_ok=True)
+
+    def excerpt(song, label, index):
+        n = int(args.clip_seconds * SAMPLE_RATE)
+        start = rng.randrange(0, max(1, len(song) - n))
+        noise = np.random.default_rng(rng.getrandbits(32)).standard_normal(n)
+        clip = rng.uniform(0.5, 1.0) * song[start:start + n] + 0.01 * noise
+        path = out_dir / f"{label}.wav"
+        sf.write(path, clip.astype(np.float32), SAMPLE_RATE)
+        return label, str(path), index, start / SAMPLE_RATE
+
+    songs, clips = [], []
+    for i in range(args.songs):
+        samples = synth_song(args.seed * 10_000 + i, args.song_seconds)
+        if i % 3 == 1:
+            gap = len(samples) // 2
+            samples[gap:gap + 2 * SAMPLE_RATE] = 0
+        elif i % 3 == 2:
+            samples[len(samples) // 2:] *= 0.05
+
+        title = f"diff_song_{i}"
+        path = out_dir / f"{title}.wav"
+        sf.write(path, samples, SAMPLE_RATE)
+        songs.append((title, str(path)))
+        clips += [excerpt(samples, f"clip_{i}_{c}", i) for c in range(args.clips_per_song)]
+
+    unknown = synth_song(args.seed * 10_000 + 9_999, args.song_seconds)
+    clips.append(excerpt(unknown, "clip_unknown", None))
+    return songs, clips
+
+
+# -----------------------------
+# COMPARISONS
+# -----------------------------
+# Each returns {"identical": bool, "overlap": float in [0, 1], ...details}
+
+def compare_spectrograms(ref, cand, args) -> dict:
+    import numpy as np
+
+    if ref.shape != cand.shape:
+        return {"identical": False, "overlap": 0.0, "detail": f"shape {cand.shape} != {ref.shape}"}
+    if np.array_equal(ref, cand):
+        return {"identical": True, "overlap": 1.0}
+
+    error = float(np.abs(ref - cand).max() / max(float(np.abs(ref).max()), 1e-12))
+    return {
+        "identical": False,
+        "overlap": 1.0 if error <= args.spec_rtol else 0.0,
+        "detail": f"max relative error {error:.2e}",
+    }
+
+
+def compare_peaks(ref, cand, args) -> dict:
+    """Identical arrays (same order), else the share of peaks with a partner within +-peak_tolerance bins."""
+    import numpy as np
+
+    ref, cand = np.asarray(ref), np.asarray(cand)
+    if ref.shape == cand.shape and np.array_equal(ref, cand):
+        return {"identical": True, "overlap": 1.0}
+
+    tol = args.peak_tolerance
+    offsets = [(df, dt) for df in range(-tol, tol + 1) for dt in range(-tol, tol + 1)]
+
+    def share_found(peaks, others):
+        others = set(map(tuple, others.tolist()))
+        if not len(peaks):
+            return 1.0
+        found = sum(any((f + df, t + dt) in others for df, dt in offsets) for f, t in peaks.tolist())
+        return found / len(peaks)
+
+    recall, precision = share_found(ref, cand), share_found(cand, ref)
+    same_set = len(ref) == len(cand) and set(map(tuple, ref.tolist())) == set(map(tuple, cand.tolist()))
+    return {
+        "identical": False,
+        "overlap": min(recall, precision),
+        "detail": "same peaks, different order" if same_set else
+        f"{len(cand)} vs {len(ref)} peaks, recall {recall:.3f}, precision {precision:.3f}",
+    }
+
+
+def compare_hashes(ref: list, cand: list, args) -> dict:
+    """Identical (hash, offset) sequences, else their multiset overlap."""
+    ref = [tuple(h[:2]) for h in ref]
+    cand = [tuple(h[:2]) for h in cand]
+    if ref == cand:
+        return {"identical": True, "overlap": 1.0}
+
+    ref_counts, cand_counts = Counter(ref), Counter(cand)
+    common = sum((ref_counts & cand_counts).values())
+    return {
+        "identical": False,
+        "overlap": common / max(len(ref), len(cand), 1),
+        "detail": "same hashes, different order" if ref_counts == cand_counts else
+        f"{len(cand)} vs {len(ref)} hashes, {common} in common",
+    }
+
+
+def compare_results(ref: dict, cand: dict, args) -> dict:
+    """
+    Identical: same ranked songs with the same scores, confidences and
+    offsets. Otherwise overlap is 1 when the best song agrees and its
+    offset is within offset_tolerance seconds, else 0.
+    """
+    def ranking(result):
+        return [(m["song_id"], m["score"], m["confidence"], m["offset_seconds"]) for m in result["matches"]]
+
+    if ranking(ref) == ranking(cand) and ref["song_id"] == cand["song_id"]:
+        return {"identical": True, "overlap": 1.0}
+
+    same_best = ref["song_id"] == cand["song_id"]
+    if ref["offset_seconds"] is None or cand["offset_seconds"] is None:
+        offset_ok = ref["offset_seconds"] is None and cand["offset_seconds"] is None
+    else:
+        offset_ok = abs(ref["offset_seconds"] - cand["offset_seconds"]) <= args.offset_tolerance
+
+    ref_ids = [m["song_id"] for m in ref["matches"]]
+    cand_ids = [m["song_id"] for m in cand["matches"]]
+    return {
+        "identical": False,
+        "overlap": 1.0 if same_best and offset_ok else 0.0,
+        "detail": f"ranking {cand_ids} vs {ref_ids}, "
+        f"best score {cand['score']} vs {ref['score']}, offset {cand['offset_seconds']} vs {ref['offset_seconds']}",
+    }
+
+
+# -----------------------------
+# RUNNER
+# -----------------------------
+
+def timed(fn, *args):
+    start = time.perf_counter()
+    out = fn(*args)
+    return out, time.perf_counter() - start
+
+
+def is_correct(result: dict, song_id, true_offset, args) -> bool:
+    if song_id is None:
+        return result["song_id"] is None
+    return (
+        result["song_id"] == song_id
+        and result["offset_seconds"] is not None
+        and abs(result["offset_seconds"] - true_offset) <= args.offset_tolerance
+    )
+
+
+class Harness:
+    def __init__(self, profile, songs: list, clips: list, args):
+        self.profile = profile
+        self.songs = songs
+        self.clips = clips
+        self.args = args
+        self.reference = Engine()
+        self.song_ids = []
+        self._ref = {}      # (stage, case) -> (output, seconds)
+
+    def seed_catalog(self):
+        """Fingerprint every song with the reference engine into the catalog."""
+        from db import insert_song, insert_fingerprints
+
+        # Untimed first run: it pays for librosa's import
+        self.reference.fingerprint(self.songs[0][1], self.profile)
+        for title, path in self.songs:
+            hashes, seconds = timed(self.reference.fingerprint, path, self.profile)
+            self._ref[("fingerprint", path)] = (hashes, seconds)
+            song_id = insert_song(title=title, artist="Diff Test", path=path)
+            insert_fingerprints(song_id, hashes)
+            self.song_ids.append(song_id)
+
+    def reference_output(self, stage: str, case: str, *inputs):
+        key = (stage, case)
+        if key not in self._ref:
+            self._ref[key] = timed(getattr(self.reference, stage), *inputs)
+        return self._ref[key]
+
+    def cases(self, stage: str):
+        """(case, inputs) of a stage; isolated stages get the reference's output of the stage before."""
+        p, top_k = self.profile, self.args.top_k
+        if stage in ("spectrogram", "fingerprint"):
+            return [(path, (path, p)) for _title, path in self.songs]
+        if stage == "peaks":
+            return [(path, (self.reference_spectrogram(path), p)) for _title, path in self.songs]
+        if stage == "hashes":
+            return [(path, (self.reference_peaks(path), p)) for _title, path in self.songs]
+        if stage == "match":
+            return [(path, (self.clip_hashes(path), p, top_k)) for _label, path, _song, _offset in self.clips]
+        return [(path, (path, p, top_k)) for _label, path, _song, _offset in self.clips]
+
+    def reference_spectrogram(self, path: str):
+        return self.reference_output("spectrogram", path, path, self.profile)[0]
+
+    def reference_peaks(self, path: str):
+        return self.reference_output("peaks", path, self.reference_spectrogram(path), self.profile)[0]
+
+    def clip_hashes(self, path: str) -> list:
+        """Reference clip hashes with anchor strengths, as identify() produces them."""
+        key = ("clip_hashes", path)
+        if key not in self._ref:
+            spec = self.reference.spectrogram(path, self.profile)
+            peaks = self.reference.peaks(spec, self.profile)
+            strengths = spec[peaks[:, 0], peaks[:, 1]]
+            self._ref[key] = (self.reference.hashes(peaks, self.profile, strengths), 0.0)
+        return self._ref[key][0]
+
+    def run_engine(self, engine: Engine) -> dict:
+        compare = {
+            "spectrogram": compare_spectrograms,
+            "peaks": compare_peaks,
+            "hashes": compare_hashes,
+            "fingerprint": compare_hashes,
+            "match": compare_results,
+            "identify": compare_results,
+        }
+        truth = {path: (song, offset) for _label, path, song, offset in self.clips}
+
+        engine.warm_up(self.songs[0][1], self.profile)
+        report = {"name": engine.name, "exact": engine.exact, "stages": {}}
+        for stage in compared_stages(engine):
+            rows = []
+            ref_seconds = cand_seconds = 0.0
+            correct = {"reference": 0, "candidate": 0}
+            for case, inputs in self.cases(stage):
+                ref_out, ref_t = self.reference_output(stage, case, *inputs)
+                cand_out, cand_t = timed(getattr(engine, stage), *inputs)
+                ref_seconds += ref_t
+                cand_seconds += cand_t
+
+                row = compare[stage](ref_out, cand_out, self.args)
+                row["ok"] = row["identical"] or (not engine.exact and row["overlap"] >= self.args.min_overlap)
+                row["case"] = Path(case).stem
+                rows.append(row)
+
+                if stage == "identify":
+                    song, offset = truth[case]
+                    song_id = self.song_ids[song] if song is not None else None
+                    correct["reference"] += is_correct(ref_out, song_id, offset, self.args)
+                    correct["candidate"] += is_correct(cand_out, song_id, offset, self.args)
+
+            stats = {
+                "cases": len(rows),
+                "identical": sum(r["identical"] for r in rows),
+                "failed": sum(not r["ok"] for r in rows),
+                "mean_overlap": round(sum(r["overlap"] for r in rows) / max(len(rows), 1), 4),
+                "reference_seconds": round(ref_seconds, 4),
+                "candidate_seconds": round(cand_seconds, 4),
+                "speedup": round(ref_seconds / cand_seconds, 3) if cand_seconds > 0 else None,
+                "differences": [
+                    {k: r[k] for k in ("case", "ok", "overlap", "detail")}
+                    for r in rows if not r["identical"]
+                ][:self.args.max_differences],
+            }
+            if stage == "identify":
+                stats["accuracy"] = {k: round(v / max(len(rows), 1), 4) for k, v in correct.items()}
+            report["stages"][stage] = stats
+        return report
+
+
+# -----------------------------
+# REPORT
+# -----------------------------
+
+def print_report(report: dict):
+    print(
+        f"\nCorpus: {report['songs']} songs, {report['clips']} clips, "
+        f"profile '{report['profile']}'\n"
+    )
+    header = f"{'engine':<14}{'stage':<13}{'cases':>6}{'same':>6}{'fail':>6}{'overlap':>9}{'ref ms':>9}{'cand ms':>9}{'speedup':>9}"
+    print(header)
+    print("-" * len(header))
+    for engine in report["engines"]:
+        name = f"{engine['name']}{'' if engine['exact'] else '~'}"
+        if not engine["stages"]:
+            print(f"{name:<14}(overrides no stage)")
+        for stage, s in engine["stages"].items():
+            speedup = f"{s['speedup']:.2f}x" if s["speedup"] else "-"
+            print(
+                f"{name:<14}{stage:<13}{s['cases']:>6}{s['identical']:>6}{s['failed']:>6}{s['mean_overlap']:>9.3f}"
+                f"{1000 * s['reference_seconds']:>9.0f}{1000 * s['candidate_seconds']:>9.0f}{speedup:>9}"
+            )
+
+    print("\n(~ = compared within tolerance; others must be identical)")
+    for engine in report["engines"]:
+        for stage, s in engine["stages"].items():
+            if "accuracy" in s:
+                acc = s["accuracy"]
+                print(
+                    f"{engine['name']}: identify accuracy {100 * acc['candidate']:.0f}% "
+                    f"(reference {100 * acc['reference']:.0f}%)"
+                )
+            for d in s["differences"]:
+                status = "ok  " if d["ok"] else "FAIL"
+                print(f"  {status} {engine['name']}/{stage} {d['case']}: {d['detail']}")
+
+    print(f"\n{'FAILED' if report['failed'] else 'PASSED'}: {report['failed']} failing case(s)")
+
+
+# -----------------------------
+# MAIN
+# -----------------------------
+
+def main():
+    parser = argparse.ArgumentParser(prog="python diff_test.py")
+    parser.add_argument("--engines", default=",".join(BUILTIN_ENGINES),
+                        help=f"Built-in candidates to run, comma-separated ({', '.join(BUILTIN_ENGINES)}; 'none')")
+    parser.add_argument("--candidate", action="append", default=[],
+                        help="Extra candidate engine as module:attr (repeatable)")
+    parser.add_argument("--songs", default=6, type=int, help="Generated songs in the catalog")
+    parser.add_argument("--song-seconds", default=30, type=float, help="Length of generated songs")
+    parser.add_argument("--clips-per-song", default=2, type=int)
+    parser.add_argument("--clip-seconds", default=6, type=float)
+    parser.add_argument("--profile", default=None, help="Fingerprint profile preset (default: FINGERPRINT_PROFILE)")
+    parser.add_argument("--top-k", default=3, type=int, help="Ranked songs compared per clip")
+    parser.add_argument("--workers", default=2, type=int, help="Processes of the parallel engine")
+    parser.add_argument("--spec-rtol", default=1e-5, type=float,
+                        help="Max spectrogram error relative to its peak magnitude (inexact engines)")
+    parser.add_argument("--peak-tolerance", default=1, type=int, help="Bins a peak may move (inexact engines)")
+    parser.add_argument("--min-overlap", default=0.95, type=float,
+                        help="Min share of matching peaks/hashes, or of agreeing clips (inexact engines)")
+    parser.add_argument("--offset-tolerance", default=0.1, type=float, help="Seconds a match offset may differ")
+    parser.add_argument("--max-differences", default=5, type=int, help="Differences listed per stage")
+    parser.add_argument("--data-dir", default=None, help="Catalog and corpus directory (default: a temp dir)")
+    parser.add_argument("--seed", default=0, type=int)
+    parser.add_argument("--json", action="store_true", help="Print the report as JSON")
+    parser.add_argument("-v", "--verbose", action="store_true", help="Keep INFO logs")
+    args = parser.parse_args()
+
+    names = [n for n in args.engines.split(",") if n and n != "none"]
+    unknown = [n for n in names if n not in BUILTIN_ENGINES]
+    if unknown:
+        parser.error(f"unknown engine(s) {', '.join(unknown)} (available: {', '.join(BUILTIN_ENGINES)})")
+
+    # Must be set before config is imported
+    tmp = None
+    if args.data_dir is None:
+        tmp = tempfile.TemporaryDirectory(prefix="seektune_diff_")
+        args.data_dir = tmp.name
+    os.environ["DATA_DIR"] = str(Path(args.data_dir).resolve())
+
+    if not args.verbose:
+        import logging
+
+        logging.disable(logging.INFO)
+
+    # Candidates do `from diff_test import Engine`: make that this module, not a second copy
+    sys.modules.setdefault("diff_test", sys.modules[__name__])
+    try:
+        candidates = [load_candidate(spec) for spec in args.candidate]
+    except (ImportError, AttributeError, argparse.ArgumentTypeError) as e:
+        parser.error(f"--candidate: {e}")
+
+    engines = [
+        ParallelEngine(args.workers) if n == "parallel" else BUILTIN_ENGINES[n]()
+        for n in names
+    ] + candidates
+
+    from db import init_db
+    from fingerprint.profile import resolve_profile
+
+    init_db()
+    profile = resolve_profile(args.profile, record=True)
+
+    print(f"[diff] Generating corpus in {args.data_dir}...", file=sys.stderr)
+    songs, clips = build_corpus(Path(args.data_dir) / "corpus", args)
+
+    harness = Harness(profile, songs, clips, args)
+    print(f"[diff] Fingerprinting {len(songs)} songs with the reference engine...", file=sys.stderr)
+    harness.seed_catalog()
+
+    report = {"songs": len(songs), "clips": len(clips), "profile": profile.name, "engines": []}
+    for engine in engines:
+        print(f"[diff] Running {engine.name}...", file=sys.stderr)
+        report["engines"].append(harness.run_engine(engine))
+    report["failed"] = sum(s["failed"] for e in report["engines"] for s in e["stages"].values())
+
+    if args.json:
+        print(json.dumps(report, indent=2))
+    else:
+        print_report(report)
+
+    if tmp is not None:
+        tmp.cleanup()
+    sys.exit(1 if report["failed"] else 0)
+
+
+if __name__ == "__main__":
+    main()
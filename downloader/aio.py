@@ -0,0 +1,140 @@
+# downloader/aio.py
+
+import asyncio
+import weakref
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from functools import partial
+from urllib.parse import urlparse
+
+from config import DOWNLOAD_CONCURRENCY, DOWNLOAD_PER_HOST, DOWNLOAD_WORKERS
+from utils import get_logger
+
+logger = get_logger("download_aio")
+
+# Lines of a child's stderr kept for error messages (the rest is dropped)
+STDERR_TAIL_LINES = 40
+
+
+class ProcessError(RuntimeError):
+    """An external command exited non-zero or ran past its timeout."""
+
+    def __init__(self, name: str, returncode: int | None, stderr: str):
+        self.name = name
+        self.returncode = returncode
+        self.stderr = stderr
+        reason = "timed out" if returncode is None else f"exited with {returncode}"
+        super().__init__(f"{name} {reason}: {stderr[-2000:]}")
+
+
+# -----------------------------
+# SUBPROCESSES
+# -----------------------------
+
+async def _drain_tail(stream: asyncio.StreamReader, tail: deque):
+    while True:
+        line = await stream.readline()
+        if not line:
+            return
+        tail.append(line.decode("utf-8", "replace").rstrip())
+
+
+async def run_process(cmd: list[str], timeout: float, name: str | None = None) -> str:
+    """
+    Run `cmd` without blocking the event loop; returns its stdout.
+
+    stderr is consumed as it is produced and only its last lines are kept.
+    On timeout or cancellation the child is killed and reaped before the
+    exception propagates. Raises ProcessError on failure or timeout.
+    """
+    name = name or cmd[0]
+    proc = await asyncio.create_subprocess_exec(
+        *cmd,
+        stdin=asyncio.subprocess.DEVNULL,
+        stdout=asyncio.subprocess.PIPE,
+        stderr=asyncio.subprocess.PIPE,
+    )
+    tail = deque(maxlen=STDERR_TAIL_LINES)
+
+    try:
+        async with asyncio.timeout(timeout):
+            stdout, _ = await asyncio.gather(proc.stdout.read(), _drain_tail(proc.stderr, tail))
+            await proc.wait()
+    except TimeoutError:
+        await _kill(proc)
+        logger.error(f"[proc] {name} killed after {timeout}s")
+        raise ProcessError(name, None, "\n".join(tail)) from None
+    except BaseException:
+        await _kill(proc)
+        raise
+
+    if proc.returncode != 0:
+        raise ProcessError(name, proc.returncode, "\n".join(tail))
+    return stdout.decode("utf-8", "replace")
+
+
+async def _kill(proc: asyncio.subprocess.Process):
+    if proc.returncode is None:
+        try:
+            proc.kill()
+        except ProcessLookupError:
+            pass
+        # Shielded so a second cancellation can't leave a zombie behind
+        await asyncio.shield(proc.wait())
+
+
+# -----------------------------
+# CONCURRENCY LIMITS
+# -----------------------------
+
+class DownloadLimits:
+    """Semaphores for one event loop: downloads in flight overall and per host."""
+
+    def __init__(self, total: int = DOWNLOAD_CONCURRENCY, per_host: int = DOWNLOAD_PER_HOST):
+        self.total = asyncio.Semaphore(total)
+        self.per_host = per_host
+        self._hosts = {}
+
+    def host(self, url: str) -> asyncio.Semaphore:
+        key = host_key(url)
+        if key not in self._hosts:
+            self._hosts[key] = asyncio.Semaphore(self.per_host)
+        return self._hosts[key]
+
+
+# Semaphores belong to a loop: the CLI runs a fresh loop per command
+_limits = weakref.WeakKeyDictionary()
+
+
+def get_limits() -> DownloadLimits:
+    loop = asyncio.get_running_loop()
+    if loop not in _limits:
+        _limits[loop] = DownloadLimits()
+    return _limits[loop]
+
+
+def host_key(url: str) -> str:
+    """'https://www.youtube.com/watch?v=..' -> 'youtube.com'; yt-dlp searches count as youtube."""
+    if url.startswith("ytsearch"):
+        return "youtube.com"
+    host = (urlparse(url).hostname or url).lower()
+    for prefix in ("www.", "m.", "music."):
+        if host.startswith(prefix):
+            host = host[len(prefix):]
+    return host
+
+
+# -----------------------------
+# BLOCKING STEPS
+# -----------------------------
+
+# Created on first use, so pre-forked server workers each get their own
+_executor = None
+
+
+def run_blocking(fn, *args, **kwargs):
+    """Run a blocking call in the bounded download thread pool (awaitable)."""
+    global _executor
+    if _executor is None:
+        _executor = ThreadPoolExecutor(max_workers=DOWNLOAD_WORKERS, thread_name_prefix="download")
+    return asyncio.get_running_loop().run_in_executor(_executor, partial(fn, *args, **kwargs))
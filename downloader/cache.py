@@ -0,0 +1,193 @@
+# downloader/cache.py
+
+import json
+import os
+import re
+import time
+from collections import Counter
+from contextlib import contextmanager
+from pathlib import Path
+from urllib.parse import urlparse, parse_qs
+
+from config import TMP_DIR, DOWNLOAD_CACHE_BYTES
+from utils import create_folder, get_logger
+
+logger = get_logger("download_cache")
+
+# -----------------------------
+# LAYOUT
+# -----------------------------
+# TMP_DIR/cache/spotify/<track_id>.json   {"title", "artist", "youtube_id", "youtube_url"}
+# TMP_DIR/cache/audio/<video_id>.<ext>    audio as downloaded by yt-dlp
+#
+# Plain files written with os.replace(), so API workers and CLI runs share
+# the cache without locking. A file's mtime is its last use: hits touch
+# it, and evict() removes the oldest files of TMP_DIR first.
+
+CACHE_DIR = TMP_DIR / "cache"
+_SPOTIFY_DIR = CACHE_DIR / "spotify"
+_AUDIO_DIR = CACHE_DIR / "audio"
+
+# Files written or used this recently are never evicted: they may be an
+# in-flight download or conversion of another process
+EVICT_GRACE_SECONDS = 60
+
+# Ids that are safe as file names (YouTube video ids, Spotify base62 ids)
+_SAFE_ID = re.compile(r"[A-Za-z0-9_-]{1,64}")
+
+# Paths this process is reading right now (see in_use())
+_pinned = Counter()
+
+
+# -----------------------------
+# IDS
+# -----------------------------
+
+def spotify_track_id(spotify_url: str) -> str | None:
+    """Track id of an open.spotify.com/track/<id> URL (or a spotify:track:<id> URI)."""
+    if spotify_url.startswith("spotify:track:"):
+        track_id = spotify_url.rsplit(":", 1)[-1]
+    else:
+        parts = urlparse(spotify_url).path.split("/")
+        track_id = parts[2] if len(parts) >= 3 and parts[1] == "track" else ""
+    return track_id if _SAFE_ID.fullmatch(track_id) else None
+
+
+def canonical_spotify_url(spotify_url: str) -> str:
+    """https://open.spotify.com/track/<id> without share parameters; other URLs unchanged."""
+    track_id = spotify_track_id(spotify_url)
+    return f"https://open.spotify.com/track/{track_id}" if track_id else spotify_url
+
+
+def youtube_video_id(youtube_url: str) -> str | None:
+    """Video id of a youtube.com/watch?v=, youtu.be/, /shorts/ or /embed/ URL."""
+    parsed = urlparse(youtube_url)
+    host = parsed.hostname or ""
+    video_id = ""
+    if host == "youtu.be":
+        video_id = parsed.path.lstrip("/").split("/")[0]
+    elif host == "youtube.com" or host.endswith(".youtube.com"):
+        if parsed.path == "/watch":
+            video_id = parse_qs(parsed.query).get("v", [""])[0]
+        elif parsed.path.startswith(("/shorts/", "/embed/", "/live/")):
+            video_id = parsed.path.split("/")[2]
+    return video_id if _SAFE_ID.fullmatch(video_id) else None
+
+
+# -----------------------------
+# LOOKUPS
+# -----------------------------
+
+def _touch(path: Path):
+    try:
+        os.utime(path)
+    except FileNotFoundError:
+        pass
+
+
+def lookup_track(track_id: str) -> dict | None:
+    """Remembered metadata and YouTube video of a Spotify track, or None."""
+    path = _SPOTIFY_DIR / f"{track_id}.json"
+    try:
+        with open(path, encoding="utf-8") as f:
+            entry = json.load(f)
+    except (FileNotFoundError, ValueError):
+        return None
+    _touch(path)
+    return entry
+
+
+def remember_track(track_id: str, entry: dict):
+    """Record {"title", "artist", "youtube_id", "youtube_url"} for a Spotify track."""
+    create_folder(_SPOTIFY_DIR)
+    path = _SPOTIFY_DIR / f"{track_id}.json"
+    tmp = path.with_name(f"{path.name}.{os.getpid()}.tmp")
+    with open(tmp, "w", encoding="utf-8") as f:
+        json.dump(entry, f)
+    os.replace(tmp, path)
+
+
+def cached_audio(video_id: str) -> Path | None:
+    """Previously downloaded audio of a YouTube video, or None."""
+    if DOWNLOAD_CACHE_BYTES <= 0 or not _SAFE_ID.fullmatch(video_id or ""):
+        return None
+    for path in _AUDIO_DIR.glob(f"{video_id}.*"):
+        if path.suffix != ".tmp":
+            _touch(path)
+            return path
+    return None
+
+
+def store_audio(video_id: str | None, downloaded_path: Path) -> Path:
+    """
+    Move a finished yt-dlp download into the cache under its video id and
+    return the new path. Without a usable id, or with the cache disabled,
+    the file stays where it is (and is removed after use, see in_use()).
+    """
+    if DOWNLOAD_CACHE_BYTES <= 0 or not _SAFE_ID.fullmatch(video_id or ""):
+        return downloaded_path
+
+    create_folder(_AUDIO_DIR)
+    target = _AUDIO_DIR / f"{video_id}{downloaded_path.suffix}"
+    os.replace(downloaded_path, target)
+    _touch(target)
+    return target
+
+
+@contextmanager
+def in_use(path: Path):
+    """
+    Keep `path` from being evicted by this process while it is read. Files
+    outside the cache (downloads that could not be cached) are removed
+    afterwards.
+    """
+    path = Path(path)
+    _pinned[path] += 1
+    try:
+        yield path
+    finally:
+        _pinned[path] -= 1
+        if not _pinned[path]:
+            del _pinned[path]
+        if path.parent != _AUDIO_DIR:
+            path.unlink(missing_ok=True)
+
+
+# -----------------------------
+# EVICTION
+# -----------------------------
+
+def evict(max_bytes: int = DOWNLOAD_CACHE_BYTES) -> int:
+    """
+    Remove the least recently used files under TMP_DIR (cached audio,
+    track mappings, leftovers of failed runs) until it holds at most
+    max_bytes. Files in use or touched within EVICT_GRACE_SECONDS are
+    kept. Returns the number of bytes freed.
+    """
+    files = []
+    for root, _dirs, names in os.walk(TMP_DIR):
+        for name in names:
+            path = Path(root) / name
+            try:
+                st = path.stat()
+            except FileNotFoundError:
+                continue
+            files.append((st.st_mtime, st.st_size, path))
+
+    total = sum(size for _mtime, size, _path in files)
+    if total <= max_bytes:
+        return 0
+
+    cutoff = time.time() - EVICT_GRACE_SECONDS
+    freed = removed = 0
+    for mtime, size, path in sorted(files):
+        if total - freed <= max_bytes:
+            break
+        if mtime > cutoff or path in _pinned:
+            continue
+        path.unlink(missing_ok=True)
+        freed += size
+        removed += 1
+
+    logger.info(f"[cache] Evicted {removed} file(s), {freed / 1e6:.1f} MB from {TMP_DIR}")
+    return freed
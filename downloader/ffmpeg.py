@@ -1,34 +1,88 @@
 # downloader/ffmpeg.py
 
 import subprocess
+import threading
+from collections import deque
 from pathlib import Path
+
+from config import FFMPEG_BIN, FFMPEG_TIMEOUT
+from downloader.aio import STDERR_TAIL_LINES, run_process
 from utils import get_logger
 
 logger = get_logger("ffmpeg")
 
 
-def run_ffmpeg_command(args: list):
+def run_ffmpeg_command(args: list, timeout: float = FFMPEG_TIMEOUT):
     """
     Run an ffmpeg command and log output.
-    Raises CalledProcessError if ffmpeg fails.
+    Raises CalledProcessError if ffmpeg fails (TimeoutExpired past `timeout`).
+
+    stderr is read line by line and only its tail is kept, so long
+    conversions don't accumulate ffmpeg's progress output in memory.
     """
     logger.info(f"[ffmpeg] Running: ffmpeg {' '.join(args)}")
 
-    completed = subprocess.run(
-        ["ffmpeg", "-y"] + args,
-        stdout=subprocess.PIPE,
+    cmd = [FFMPEG_BIN, "-y"] + args
+    tail = deque(maxlen=STDERR_TAIL_LINES)
+
+    with subprocess.Popen(
+        cmd,
+        stdin=subprocess.DEVNULL,
+        stdout=subprocess.DEVNULL,
         stderr=subprocess.PIPE,
         text=True,
-    )
+        errors="replace",
+    ) as proc:
+        timed_out = threading.Event()
+
+        def kill():
+            timed_out.set()
+            proc.kill()
+
+        # Killing from a timer also ends the stderr loop below
+        timer = threading.Timer(timeout, kill)
+        timer.start()
+        try:
+            for line in proc.stderr:
+                tail.append(line.rstrip())
+            proc.wait()
+        except BaseException:
+            proc.kill()
+            raise
+        finally:
+            timer.cancel()
+
+    stderr = "\n".join(tail)
+    if timed_out.is_set():
+        raise subprocess.TimeoutExpired(cmd, timeout, None, stderr)
+    if proc.returncode != 0:
+        logger.error(f"[ffmpeg] Error: {stderr}")
+        raise subprocess.CalledProcessError(proc.returncode, cmd, None, stderr)
+
+    logger.info("[ffmpeg] Done.")
+    return None, stderr
 
-    if completed.returncode != 0:
-        logger.error(f"[ffmpeg] Error: {completed.stderr}")
-        raise subprocess.CalledProcessError(
-            completed.returncode, completed.args, completed.stdout, completed.stderr
-        )
 
+async def run_ffmpeg_command_async(args: list, timeout: float = FFMPEG_TIMEOUT):
+    """run_ffmpeg_command() for the event loop; raises downloader.aio.ProcessError."""
+    logger.info(f"[ffmpeg] Running: ffmpeg {' '.join(args)}")
+    await run_process([FFMPEG_BIN, "-y", "-nostdin"] + args, timeout, name="ffmpeg")
     logger.info("[ffmpeg] Done.")
-    return completed.stdout, completed.stderr
+
+
+def _wav_args(in_p: Path, out_p: Path, sample_rate: int | None, mono: bool) -> list:
+    if not in_p.exists():
+        raise FileNotFoundError(f"Input audio file does not exist: {in_p}")
+
+    args = ["-i", str(in_p)]
+
+    if mono:
+        args += ["-ac", "1"]  # 1 channel
+    if sample_rate is not None:
+        args += ["-ar", str(sample_rate)]  # sample rate
+
+    args += [str(out_p)]
+    return args
 
 
 def convert_to_wav(
@@ -42,22 +96,27 @@ def convert_to_wav(
     - sample_rate: target sample rate (e.g., 22050)
     - mono: convert stereo -> mono
     """
-
-    in_p = Path(input_path)
     out_p = Path(output_path)
+    run_ffmpeg_command(_wav_args(Path(input_path), out_p, sample_rate, mono))
+    return str(out_p)
 
-    if not in_p.exists():
-        raise FileNotFoundError(f"Input audio file does not exist: {input_path}")
-
-    args = ["-i", str(in_p)]
-
-    if mono:
-        args += ["-ac", "1"]  # 1 channel
-    if sample_rate is not None:
-        args += ["-ar", str(sample_rate)]  # sample rate
-
-    args += [str(out_p)]
-
-    run_ffmpeg_command(args)
 
+async def convert_to_wav_async(
+    input_path: str,
+    output_path: str,
+    sample_rate: int = 22050,
+    mono: bool = True,
+    timeout: float = FFMPEG_TIMEOUT,
+):
+    """
+    convert_to_wav() without blocking the event loop. A failed, timed-out
+    or cancelled conversion leaves no partial WAV behind.
+    """
+    out_p = Path(output_path)
+    args = _wav_args(Path(input_path), out_p, sample_rate, mono)
+    try:
+        await run_ffmpeg_command_async(args, timeout)
+    except BaseException:
+        out_p.unlink(missing_ok=True)
+        raise
     return str(out_p)
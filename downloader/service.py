@@ -1,67 +1,50 @@
 # downloader/service.py
 
+import asyncio
 from pathlib import Path
-import yt_dlp
 
 from utils import get_logger
 from config import SONGS_DIR, TMP_DIR
 from utils import create_folder
 from spotify.client import SpotifyClient
-from downloader.ffmpeg import convert_to_wav
+from downloader.aio import DownloadLimits, get_limits, run_blocking
+from downloader.cache import (
+    canonical_spotify_url,
+    spotify_track_id,
+    lookup_track,
+    remember_track,
+    cached_audio,
+    store_audio,
+    in_use,
+    evict,
+)
+from downloader.ffmpeg import convert_to_wav_async
+from downloader.youtube import ytdlp_download
+from db import get_song_ids, get_song_by_id, get_song_fingerprint_counts
 from fingerprint import generate_fingerprint
 
 logger = get_logger("download_service")
 
 
-def _youtube_download_by_search(query: str, tmp_audio_base: Path) -> tuple[Path, dict]:
+async def _youtube_download_by_search_async(query: str, tmp_audio_base: Path) -> tuple[Path, dict]:
     """
     Use yt-dlp with 'ytsearch1:' to download the best audio for a search query.
     Saves to tmp_audio_base.<ext> and returns (downloaded_file_path, info_dict).
     """
-    create_folder(tmp_audio_base.parent)
-
-    ydl_opts = {
-        "format": "bestaudio/best",
-        "outtmpl": str(tmp_audio_base.with_suffix(".%(ext)s")),
-        "quiet": True,
-        "noprogress": True,
-        "overwrites": True,
-        "cachedir": False,
-    }
-
     logger.info(f"[dl] Searching YouTube for: {query}")
 
-    with yt_dlp.YoutubeDL(ydl_opts) as ydl:
-        info = ydl.extract_info(f"ytsearch1:{query}", download=True)
-
-    # When using ytsearch1, info["entries"][0] contains the actual video
-    if "entries" in info and info["entries"]:
-        info_video = info["entries"][0]
-    else:
-        info_video = info
-
-    ext = info_video.get("ext", "webm")
-    vid_id = info_video.get("id")
-
-    candidate1 = tmp_audio_base.with_suffix(f".{ext}")
-    candidate2 = tmp_audio_base.parent / f"{vid_id}.{ext}"
-
-    if candidate1.exists():
-        downloaded_path = candidate1
-    elif candidate2.exists():
-        downloaded_path = candidate2
-    else:
-        # As a last resort, try to derive filename from info (some yt-dlp configs)
-        # but raise if not found
-        raise FileNotFoundError(
-            f"[dl] Could not find downloaded file at {candidate1} or {candidate2}"
-        )
+    downloaded_path, info_video = await ytdlp_download(f"ytsearch1:{query}", tmp_audio_base)
 
     logger.info(f"[dl] YouTube audio downloaded: {downloaded_path}")
     return downloaded_path, info_video
 
 
 def download_and_fingerprint_from_spotify(spotify_url: str) -> dict:
+    """Blocking wrapper around download_and_fingerprint_from_spotify_async() for the CLI."""
+    return asyncio.run(download_and_fingerprint_from_spotify_async(spotify_url))
+
+
+async def download_and_fingerprint_from_spotify_async(spotify_url: str) -> dict:
     """
     Full pipeline for the 'download' command:
 
@@ -81,47 +64,31 @@ def download_and_fingerprint_from_spotify(spotify_url: str) -> dict:
           "spotify_url": str,
           "youtube_url": str
         }
-    """
-    client = SpotifyClient()
 
-    # 1) Get track metadata from Spotify
-    track_info = client.get_track_info(spotify_url)
-    title = track_info["title"]
-    artist = track_info["artist"]
+    Network and ffmpeg steps are subprocesses/threads awaited on the event
+    loop, bounded by DOWNLOAD_CONCURRENCY overall and DOWNLOAD_PER_HOST per
+    remote host; cancelling the task kills them and removes partial files.
 
-    logger.info(f"[dl] Download pipeline for: '{title}' by '{artist}'")
-
-    # 2) Build YouTube search query
-    search_query = f"{title} {artist} audio"
-
-    # Make a SAFE filename base for temp download (unique per track)
-    safe_title = "".join(c for c in title if c not in r'\/:*?"<>|')
-    safe_artist = "".join(c for c in artist if c not in r'\/:*?"<>|')
-    tmp_audio_base = TMP_DIR / f"spotify_dl_{safe_title}_{safe_artist}"
-
-    # 3) Download best audio using yt-dlp search
-    downloaded_path, info_video = _youtube_download_by_search(search_query, tmp_audio_base)
-
-    # Try to find a canonical YouTube URL
-    yt_url = info_video.get("webpage_url")
-    if not yt_url:
-        vid_id = info_video.get("id")
-        if vid_id:
-            yt_url = f"https://www.youtube.com/watch?v={vid_id}"
-        else:
-            yt_url = None
-
-    logger.info(f"[dl] Selected YouTube URL: {yt_url}")
+    A track already in the catalog (same Spotify track) is returned as is,
+    with "existing": True. Otherwise the Spotify metadata, the YouTube video
+    found for it and the downloaded audio are reused from the download cache
+    (downloader/cache.py) when present.
+    """
+    requested_url, spotify_url = spotify_url, canonical_spotify_url(spotify_url)
 
-    # 4) Convert to WAV in SONGS_DIR
-    create_folder(SONGS_DIR)
-    wav_target = SONGS_DIR / f"{safe_title} - {safe_artist}.wav"
+    existing = await run_blocking(_existing_song, spotify_url, requested_url)
+    if existing is not None:
+        logger.info(f"[dl] Already in catalog: song_id={existing['song_id']} for {spotify_url}")
+        return existing
 
-    wav_path = convert_to_wav(str(downloaded_path), str(wav_target))
+    limits = get_limits()
+    async with limits.total:
+        title, artist, wav_path, yt_url = await _download_spotify_track(spotify_url, limits)
 
     # 5) Fingerprint and insert into DB
     # NOTE: generate_fingerprint should accept spotify_url and youtube_url (see fingerprint changes)
-    song_id, num_hashes = generate_fingerprint(
+    song_id, num_hashes = await run_blocking(
+        generate_fingerprint,
         wav_path,
         title=title,
         artist=artist,
@@ -141,4 +108,96 @@ def download_and_fingerprint_from_spotify(spotify_url: str) -> dict:
         "wav_path": str(wav_path),
         "spotify_url": spotify_url,
         "youtube_url": yt_url,
+        "existing": False,
+    }
+
+
+def _existing_song(*spotify_urls: str) -> dict | None:
+    """
+    The pipeline result for a track that is already fingerprinted, or None.
+    Songs are stored with canonical track URLs; older rows may hold the URL
+    as it was given, so every spelling passed is tried.
+    """
+    song_ids = []
+    for url in dict.fromkeys(spotify_urls):
+        song_ids = song_ids or get_song_ids(spotify_url=url)
+    song = get_song_by_id(song_ids[0]) if song_ids else None
+    if song is None:
+        return None
+
+    return {
+        "song_id": song.id,
+        "title": song.title,
+        "artist": song.artist,
+        "hashes": get_song_fingerprint_counts([song.id]).get(song.id, 0),
+        "wav_path": song.path,
+        "spotify_url": song.spotify_url,
+        "youtube_url": song.youtube_url,
+        "existing": True,
     }
+
+
+async def _download_spotify_track(spotify_url: str, limits: DownloadLimits):
+    """Steps 1-4: returns (title, artist, wav_path, youtube_url)."""
+    track_id = spotify_track_id(spotify_url)
+    cached = (lookup_track(track_id) if track_id else None) or {}
+
+    # 1) Get track metadata from Spotify (unless this track was resolved before)
+    if cached:
+        title = cached["title"]
+        artist = cached["artist"]
+        logger.info(f"[dl] Cached Spotify metadata for track {track_id}")
+    else:
+        client = SpotifyClient()
+        async with limits.host(spotify_url):
+            track_info = await run_blocking(client.get_track_info, spotify_url)
+        title = track_info["title"]
+        artist = track_info["artist"]
+
+    logger.info(f"[dl] Download pipeline for: '{title}' by '{artist}'")
+
+    # Make a SAFE filename base for temp download (unique per track)
+    safe_title = "".join(c for c in title if c not in r'\/:*?"<>|')
+    safe_artist = "".join(c for c in artist if c not in r'\/:*?"<>|')
+    tmp_audio_base = TMP_DIR / f"spotify_dl_{safe_title}_{safe_artist}"
+
+    video_id = cached.get("youtube_id")
+    yt_url = cached.get("youtube_url")
+    downloaded_path = cached_audio(video_id) if video_id else None
+
+    if downloaded_path is not None:
+        logger.info(f"[dl] Cached YouTube audio: {downloaded_path}")
+    else:
+        # 2) + 3) Download best audio: the known video, or a YouTube search
+        if video_id:
+            downloaded_path, info_video = await ytdlp_download(yt_url, tmp_audio_base)
+        else:
+            search_query = f"{title} {artist} audio"
+            downloaded_path, info_video = await _youtube_download_by_search_async(search_query, tmp_audio_base)
+
+        # Try to find a canonical YouTube URL
+        video_id = info_video.get("id")
+        yt_url = info_video.get("webpage_url")
+        if not yt_url:
+            if video_id:
+                yt_url = f"https://www.youtube.com/watch?v={video_id}"
+            else:
+                yt_url = None
+
+        downloaded_path = store_audio(video_id, downloaded_path)
+        if track_id and video_id:
+            remember_track(track_id, {"title": title, "artist": artist, "youtube_id": video_id, "youtube_url": yt_url})
+
+    logger.info(f"[dl] Selected YouTube URL: {yt_url}")
+
+    # 4) Convert to WAV in SONGS_DIR
+    create_folder(SONGS_DIR)
+    wav_target = SONGS_DIR / f"{safe_title} - {safe_artist}.wav"
+
+    with in_use(downloaded_path):
+        wav_path = await convert_to_wav_async(str(downloaded_path), str(wav_target))
+
+    # Keep TMP_DIR within DOWNLOAD_CACHE_BYTES
+    await run_blocking(evict)
+
+    return title, artist, wav_path, yt_url
@@ -1,70 +1,112 @@
 # downloader/youtube.py
 
+import asyncio
+import glob
+import json
 from pathlib import Path
-import yt_dlp
 
-from config import SONGS_DIR, TMP_DIR
+from config import SONGS_DIR, TMP_DIR, YTDLP_CMD, DOWNLOAD_TIMEOUT
 from utils import create_folder, get_logger
-from downloader.ffmpeg import convert_to_wav
+from downloader.aio import get_limits, run_blocking, run_process
+from downloader.cache import youtube_video_id, cached_audio, store_audio, in_use, evict
+from downloader.ffmpeg import convert_to_wav_async
 
 logger = get_logger("youtube_downloader")
 
+# Printed by yt-dlp once the file is in place: one JSON object per video
+_PRINT_TEMPLATE = "after_move:%(.{id,ext,webpage_url,filepath})j"
 
-def download_youtube_audio(youtube_url: str, title_hint: str | None = None):
+
+async def ytdlp_download(target: str, tmp_audio_base: Path, timeout: float = DOWNLOAD_TIMEOUT) -> tuple[Path, dict]:
+    """
+    Download the best audio for `target` (a video URL, or 'ytsearch1:<query>')
+    to tmp_audio_base.<ext> with a yt-dlp subprocess.
+
+    Waits for a free per-host slot first. On failure, timeout or
+    cancellation the process is killed and partial files are removed.
+
+    Returns:
+        (downloaded_file_path, {"id", "ext", "webpage_url", "filepath"})
+    """
+    create_folder(tmp_audio_base.parent)
+
+    cmd = YTDLP_CMD + [
+        "--format", "bestaudio/best",
+        "--output", f"{tmp_audio_base}.%(ext)s",
+        "--no-playlist",
+        "--no-progress",
+        "--no-cache-dir",
+        "--force-overwrites",
+        "--no-simulate",
+        "--print", _PRINT_TEMPLATE,
+        "--",
+        target,
+    ]
+
+    async with get_limits().host(target):
+        logger.info(f"[yt] yt-dlp: {target}")
+        try:
+            stdout = await run_process(cmd, timeout, name="yt-dlp")
+        except BaseException:
+            for partial in tmp_audio_base.parent.glob(f"{glob.escape(tmp_audio_base.name)}.*"):
+                partial.unlink(missing_ok=True)
+            raise
+
+    lines = [line for line in stdout.splitlines() if line.startswith("{")]
+    if not lines:
+        raise FileNotFoundError(f"[yt] yt-dlp reported no download for {target}")
+    info = json.loads(lines[-1])
+
+    downloaded_path = Path(info.get("filepath") or f"{tmp_audio_base}.{info.get('ext', 'webm')}")
+    if not downloaded_path.exists():
+        raise FileNotFoundError(f"[yt] Could not locate downloaded file at {downloaded_path}")
+
+    logger.info(f"[yt] Downloaded file: {downloaded_path}")
+    return downloaded_path, info
+
+
+async def download_youtube_audio_async(youtube_url: str, title_hint: str | None = None) -> str:
     """
     Download audio from a YouTube URL using yt-dlp,
     convert it to normalized WAV, save into SONGS_DIR.
+    Audio downloaded before for the same video id is reused (downloader/cache.py).
 
     Returns:
         path_to_wav (str)
     """
-
     create_folder(SONGS_DIR)
     create_folder(TMP_DIR)
 
     logger.info(f"[yt] Downloading from YouTube: {youtube_url}")
 
-    # Temporary output (any audio format)
-    tmp_audio = TMP_DIR / "yt_audio.%(ext)s"
-
-    ydl_opts = {
-        "format": "bestaudio/best",
-        "outtmpl": str(tmp_audio),
-        "quiet": True,
-        "noprogress": True,
-    }
-
-    with yt_dlp.YoutubeDL(ydl_opts) as ydl:
-        info = ydl.extract_info(youtube_url, download=True)
-
-    # Determine actual downloaded file path
-    # yt-dlp returns a dict with 'ext' and 'id'
-    ext = info.get("ext", "webm")
-    downloaded_path = TMP_DIR / f"yt_audio.{ext}"
-
-    if not downloaded_path.exists():
-        # fallback: sometimes outtmpl uses video id
-        vid_id = info.get("id")
-        alt_path = TMP_DIR / f"{vid_id}.{ext}"
-        if alt_path.exists():
-            downloaded_path = alt_path
-        else:
-            raise FileNotFoundError(
-                f"[yt] Could not locate downloaded file at {downloaded_path} or {alt_path}"
-            )
-
-    logger.info(f"[yt] Downloaded file: {downloaded_path}")
-
     # Decide final WAV filename
     if title_hint:
         safe_name = "".join(c for c in title_hint if c not in r'\/:*?"<>|')
-        output_wav = SONGS_DIR / f"{safe_name}.wav"
     else:
-        output_wav = SONGS_DIR / "downloaded_track.wav"
+        safe_name = "downloaded_track"
+    output_wav = SONGS_DIR / f"{safe_name}.wav"
 
-    # Convert to WAV
-    wav_path = convert_to_wav(str(downloaded_path), str(output_wav))
+    async with get_limits().total:
+        video_id = youtube_video_id(youtube_url)
+        downloaded_path = cached_audio(video_id) if video_id else None
+
+        if downloaded_path is None:
+            downloaded_path, info = await ytdlp_download(youtube_url, TMP_DIR / f"yt_audio_{safe_name}")
+            downloaded_path = store_audio(info.get("id") or video_id, downloaded_path)
+        else:
+            logger.info(f"[yt] Cached audio: {downloaded_path}")
+
+        # Convert to WAV
+        with in_use(downloaded_path):
+            wav_path = await convert_to_wav_async(str(downloaded_path), str(output_wav))
+
+    await run_blocking(evict)
 
     logger.info(f"[yt] Converted to WAV: {wav_path}")
 
     return wav_path
+
+
+def download_youtube_audio(youtube_url: str, title_hint: str | None = None) -> str:
+    """Blocking wrapper around download_youtube_audio_async() for scripts."""
+    return asyncio.run(download_youtube_audio_async(youtube_url, title_hint))
@@ -3,19 +3,108 @@
 from pathlib import Path
 
 from fingerprint.spectrogram import generate_spectrogram
+from fingerprint.gating import active_segments
 from fingerprint.peak_picker import find_peaks
 from fingerprint.hasher import generate_hashes
-from db import init_db, insert_song, insert_fingerprints
+from fingerprint.profile import FingerprintProfile, resolve_profile
+from config import FINGERPRINT_WORKERS, FINGERPRINT_PARALLEL_MIN_SECONDS
+from db import insert_song, insert_fingerprints
 from utils import get_logger
+from utils.profiling import stage
 
 logger = get_logger("fingerprint")
 
 
-def generate_fingerprint(file_path: str, title: str | None = None, artist: str | None = None, spotify_url: str = None, youtube_url: str = None):
+def compute_peaks(file_path: str, profile: FingerprintProfile, with_strengths: bool = False):
+    """
+    audio file -> spectrogram -> energy gate -> peaks, using one profile's parameters.
+
+    Returns:
+        np.ndarray (N, 2) of [freq_bin, time_bin]
+        or (peaks, strengths) with with_strengths=True, strengths being the
+        spectrogram magnitude at each peak
+    """
+    # 1) Spectrogram
+    with stage("spectrogram"):
+        spec = generate_spectrogram(
+            file_path,
+            sample_rate=profile.sample_rate,
+            n_fft=profile.n_fft,
+            hop_length=profile.hop_length,
+        )
+
+    # 2) Skip silent / near-silent frames
+    with stage("gating"):
+        segments = active_segments(spec, profile.silence_db, min_gap=profile.neighborhood[1])
+
+    # 3) Peaks
+    with stage("peaks"):
+        peaks = find_peaks(
+            spec,
+            threshold_percentile=profile.threshold_percentile,
+            neighborhood=profile.neighborhood,
+            threshold_window=profile.threshold_window,
+            segments=segments,
+        )
+
+    if with_strengths:
+        return peaks, spec[peaks[:, 0], peaks[:, 1]]
+    return peaks
+
+
+def hash_peaks(peaks, profile: FingerprintProfile, strengths=None):
+    """
+    peaks -> hashes with one profile's pairing parameters.
+
+    Returns:
+        List of (hash_value, offset_time_bin), or
+        (hash_value, offset_time_bin, anchor_strength) when strengths are given
+    """
+    with stage("hashes"):
+        return generate_hashes(
+            peaks,
+            fan_value=profile.fan_value,
+            min_time_delta=profile.min_time_delta,
+            max_time_delta=profile.max_time_delta,
+            strengths=strengths,
+        )
+
+
+def compute_hashes(file_path: str, profile: FingerprintProfile):
+    """
+    audio file -> spectrogram -> peaks -> hashes, using one profile's parameters.
+    Recordings of FINGERPRINT_PARALLEL_MIN_SECONDS or more are processed in
+    time chunks by FINGERPRINT_WORKERS processes (same hashes).
+
+    Returns:
+        List of (hash_value, offset_time_bin)
+    """
+    if FINGERPRINT_WORKERS > 1 and _duration(file_path) >= FINGERPRINT_PARALLEL_MIN_SECONDS:
+        from fingerprint.parallel import compute_hashes_parallel
+
+        return compute_hashes_parallel(file_path, profile, FINGERPRINT_WORKERS)
+
+    return hash_peaks(compute_peaks(file_path, profile), profile)
+
+
+def _duration(file_path: str) -> float:
+    """Length of an audio file in seconds, from its header (0 if unknown)."""
+    import librosa
+
+    try:
+        return librosa.get_duration(path=file_path)
+    except Exception:
+        return 0.0
+
+
+def generate_fingerprint(file_path: str, title: str | None = None, artist: str | None = None, spotify_url: str = None, youtube_url: str = None, profile: FingerprintProfile | str | None = None):
     """
     Full pipeline:
         audio file -> spectrogram -> peaks -> hashes -> DB
 
+    profile: FingerprintProfile or preset name. Defaults to the catalog's
+    recorded profile (or FINGERPRINT_PROFILE for a new catalog).
+
     Returns:
         (song_id, num_hashes)
     """
@@ -26,17 +115,9 @@ def generate_fingerprint(file_path: str, title: str | None = None, artist: str |
     if not p.exists():
         raise FileNotFoundError(f"Audio file does not exist: {file_path}")
 
-    # Initialize DB (create tables if needed)
-    init_db()
-
-    # 1) Spectrogram
-    spec = generate_spectrogram(file_path)
-
-    # 2) Peaks
-    peaks = find_peaks(spec)
-
-    # 3) Hashes
-    hashes = generate_hashes(peaks)
+    # 1-3) Spectrogram -> peaks -> hashes
+    profile = resolve_profile(profile, record=True)
+    hashes = compute_hashes(file_path, profile)
 
     if not hashes:
         logger.warning(f"No hashes generated for file: {file_path}")
@@ -45,16 +126,17 @@ def generate_fingerprint(file_path: str, title: str | None = None, artist: str |
     inferred_title = title if title is not None else p.stem
     inferred_artist = artist if artist is not None else "Unknown Artist"
 
-    song_id = insert_song(
-        title=inferred_title,
-        artist=inferred_artist,
-        path=file_path,
-        spotify_url=spotify_url,
-        youtube_url=youtube_url
-    )
-
-    # 5) Insert fingerprints
-    insert_fingerprints(song_id, hashes)
+    with stage("db_insert"):
+        song_id = insert_song(
+            title=inferred_title,
+            artist=inferred_artist,
+            path=file_path,
+            spotify_url=spotify_url,
+            youtube_url=youtube_url
+        )
+
+        # 5) Insert fingerprints
+        insert_fingerprints(song_id, hashes)
 
     logger.info(
         f"Fingerprint for '{inferred_title}' by '{inferred_artist}' saved in DB successfully "
@@ -0,0 +1,56 @@
+# fingerprint/gating.py
+
+import numpy as np
+from utils import get_logger
+
+logger = get_logger("gating")
+
+# Frames with less energy than this are digital silence whatever the track level
+_ENERGY_FLOOR = 1e-10
+
+
+def active_segments(
+    spectrogram: np.ndarray,
+    silence_db: float | None,
+    min_gap: int = 1,
+) -> list[tuple[int, int]]:
+    """
+    Energy gate: time-frame ranges worth peak picking.
+
+    A frame is silent when its energy is more than `silence_db` dB below
+    the loudest frame of the recording (or is digital silence). Silent
+    gaps shorter than `min_gap` frames are bridged, so a segment's local
+    maxima still see their whole neighbourhood.
+
+    Returns:
+        List of (start_frame, end_frame) half-open ranges, in time order.
+    """
+    num_frames = spectrogram.shape[1]
+    if silence_db is None or num_frames == 0:
+        return [(0, num_frames)]
+
+    energy = np.einsum("ft,ft->t", spectrogram, spectrogram)
+    floor = max(energy.max() * 10.0 ** (silence_db / 10.0), _ENERGY_FLOOR)
+    active = energy >= floor
+
+    if not active.any():
+        logger.info("Energy gate: recording is silent")
+        return []
+
+    # Run boundaries of the active mask
+    edges = np.flatnonzero(np.diff(active.astype(np.int8), prepend=0, append=0))
+    starts, ends = edges[::2], edges[1::2]
+
+    segments = [(int(starts[0]), int(ends[0]))]
+    for start, end in zip(starts[1:], ends[1:]):
+        if start - segments[-1][1] < min_gap:
+            segments[-1] = (segments[-1][0], int(end))
+        else:
+            segments.append((int(start), int(end)))
+
+    kept = sum(end - start for start, end in segments)
+    logger.info(
+        f"Energy gate: {len(segments)} segments, {kept}/{num_frames} frames kept "
+        f"({100 * (num_frames - kept) / num_frames:.1f}% skipped)"
+    )
+    return segments
@@ -14,14 +14,28 @@ MIN_TIME_DELTA = 1
 MAX_TIME_DELTA = 200
 
 
-def generate_hashes(peaks: np.ndarray):
+def pair_hash(f1: int, f2: int, dt: int) -> str:
+    """Hash of one anchor/target peak pair (frequency bins and time delta)."""
+    # SHA1 hash for compactness
+    return hashlib.sha1(f"{int(f1)}|{int(f2)}|{int(dt)}".encode("utf-8")).hexdigest()
+
+
+def generate_hashes(
+    peaks: np.ndarray,
+    fan_value: int = FAN_VALUE,
+    min_time_delta: int = MIN_TIME_DELTA,
+    max_time_delta: int = MAX_TIME_DELTA,
+    strengths: np.ndarray | None = None,
+):
     """
     Generate Shazam-style hashes from a list/array of peaks.
 
     peaks: np.ndarray of shape (N, 2), each row = [freq_bin, time_bin]
+    strengths: optional magnitude of each peak (same order as peaks)
 
     Returns:
-        List of (hash_value, offset_time_bin)
+        List of (hash_value, offset_time_bin), or
+        (hash_value, offset_time_bin, anchor_strength) when strengths are given
     """
 
     logger.info("Generating hashes from peaks...")
@@ -33,21 +47,45 @@ def generate_hashes(peaks: np.ndarray):
         logger.warning("No peaks provided, returning empty hash list.")
         return []
 
-    hashes = []
-
     # Sort peaks by time for consistency
     # peaks[:, 0] = freq, peaks[:, 1] = time (assuming that order)
     # If you used (time, freq) earlier, just swap indexing.
     # Here we'll assume (freq, time) as in our peak_picker output.
-    peaks = peaks[np.argsort(peaks[:, 1])]
+    order = np.argsort(peaks[:, 1])
+    peaks = peaks[order]
+    if strengths is not None:
+        strengths = np.asarray(strengths, dtype=float)[order]
 
     num_peaks = peaks.shape[0]
+    hashes = hash_sorted_peaks(peaks, num_peaks, fan_value, min_time_delta, max_time_delta, strengths)
+
+    logger.info(f"Generated {len(hashes)} hashes from {num_peaks} peaks")
 
-    for i in range(num_peaks):
+    return hashes
+
+
+def hash_sorted_peaks(
+    peaks: np.ndarray,
+    num_anchors: int,
+    fan_value: int = FAN_VALUE,
+    min_time_delta: int = MIN_TIME_DELTA,
+    max_time_delta: int = MAX_TIME_DELTA,
+    strengths: np.ndarray | None = None,
+) -> list:
+    """
+    Hashes anchored at the first num_anchors of time-sorted peaks, each
+    paired with the next fan_value peaks. A slice sorted_peaks[a:b + fan_value]
+    with num_anchors = b - a gives exactly the hashes of anchors a..b-1, so
+    anchor ranges can be hashed independently (see fingerprint/parallel.py).
+    """
+    hashes = []
+    num_peaks = peaks.shape[0]
+
+    for i in range(num_anchors):
         f1, t1 = peaks[i]
 
-        # Pair this anchor with the next FAN_VALUE peaks
-        for j in range(1, FAN_VALUE + 1):
+        # Pair this anchor with the next fan_value peaks
+        for j in range(1, fan_value + 1):
             if i + j >= num_peaks:
                 break
 
@@ -55,18 +93,15 @@ def generate_hashes(peaks: np.ndarray):
             dt = t2 - t1
 
             # Only consider pairs within allowed time range
-            if dt < MIN_TIME_DELTA or dt > MAX_TIME_DELTA:
+            if dt < min_time_delta or dt > max_time_delta:
                 continue
 
-            # Create hash string
-            hash_str = f"{int(f1)}|{int(f2)}|{int(dt)}"
-
-            # SHA1 hash for compactness
-            hash_value = hashlib.sha1(hash_str.encode("utf-8")).hexdigest()
+            hash_value = pair_hash(f1, f2, dt)
 
             # Offset = time of anchor peak
-            hashes.append((hash_value, int(t1)))
-
-    logger.info(f"Generated {len(hashes)} hashes from {num_peaks} peaks")
+            if strengths is None:
+                hashes.append((hash_value, int(t1)))
+            else:
+                hashes.append((hash_value, int(t1), float(strengths[i])))
 
     return hashes
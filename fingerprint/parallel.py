@@ -0,0 +1,251 @@
+# fingerprint/parallel.py
+
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor
+from multiprocessing import shared_memory
+
+import numpy as np
+
+from config import FINGERPRINT_WORKERS, FINGERPRINT_CHUNK_SECONDS
+from fingerprint.gating import active_segments
+from fingerprint.hasher import hash_sorted_peaks
+from fingerprint.profile import FingerprintProfile
+from utils import get_logger
+from utils.profiling import stage
+
+logger = get_logger("fingerprint_parallel")
+
+# -----------------------------
+# SEGMENT-PARALLEL FINGERPRINTING
+# -----------------------------
+# A long recording is split into time chunks processed by a process pool,
+# producing exactly the hashes of the single-core pipeline:
+#
+#   spectrogram  chunks of frames, each STFT'd from its own slice of the
+#                centre-padded audio (frames are independent, so the
+#                result is bit-identical to one librosa.stft call)
+#   gating       in the parent, over the whole spectrogram (global max)
+#   peaks        chunks of whole threshold blocks; each worker runs the
+#                maximum filter with neighbourhood-wide halo columns so
+#                boundary frames see the same window as in one pass
+#   hashes       the parent sorts all peaks by time exactly as
+#                generate_hashes() does; workers hash anchor ranges, each
+#                given fan_value extra peaks past its range, so every pair
+#                is formed exactly once
+#
+# Audio and spectrogram live in shared memory; only peaks and hashes are
+# pickled between processes.
+
+_pool = None
+
+
+def _get_pool(workers: int) -> ProcessPoolExecutor:
+    global _pool
+    if _pool is None or _pool._max_workers != workers:
+        if _pool is not None:
+            _pool.shutdown()
+        # spawn: the API calls this from threads, where fork is unsafe
+        _pool = ProcessPoolExecutor(max_workers=workers, mp_context=multiprocessing.get_context("spawn"))
+    return _pool
+
+
+def _attach(ref):
+    """(SharedMemory, ndarray view) for a (shape, dtype, order, name) reference."""
+    shape, dtype, order, name = ref
+    shm = shared_memory.SharedMemory(name=name)
+    return shm, np.ndarray(shape, dtype=dtype, buffer=shm.buf, order=order)
+
+
+# -----------------------------
+# WORKER TASKS
+# -----------------------------
+# Views into shared memory must be gone before it is closed, so the work
+# happens in helpers whose views die when they return.
+
+def _stft_frames(audio, spec, n_fft: int, hop_length: int, start: int, end: int):
+    import librosa
+
+    segment = audio[start * hop_length:(end - 1) * hop_length + n_fft]
+    spec[:, start:end] = np.abs(librosa.stft(segment, n_fft=n_fft, hop_length=hop_length, center=False))
+
+
+def _stft_task(audio_ref, spec_ref, n_fft: int, hop_length: int, start: int, end: int):
+    """Frames [start, end) of the magnitude spectrogram, written into shared memory."""
+    audio_shm, audio = _attach(audio_ref)
+    spec_shm, spec = _attach(spec_ref)
+    try:
+        _stft_frames(audio, spec, n_fft, hop_length, start, end)
+    finally:
+        del audio, spec
+        audio_shm.close()
+        spec_shm.close()
+
+
+def _block_peaks(spec, seg_start: int, seg_end: int, blocks: list, percentile: float, neighborhood: tuple):
+    from scipy.ndimage import maximum_filter
+
+    halo = neighborhood[1]
+    lo, hi = blocks[0][0], blocks[-1][1]
+
+    part = spec[:, seg_start:seg_end]
+    c0, c1 = max(0, lo - halo), min(part.shape[1], hi + halo)
+    window = part[:, c0:c1]
+    local_max = maximum_filter(window, size=tuple(neighborhood)) == window
+
+    found = []
+    for b0, b1, threshold in blocks:
+        block = part[:, b0:b1]
+        if threshold is None:
+            threshold = np.percentile(block, percentile)
+        peaks = np.argwhere(local_max[:, b0 - c0:b1 - c0] & (block >= threshold))
+        peaks[:, 1] += seg_start + b0
+        found.append(peaks)
+
+    return np.concatenate(found)
+
+
+def _peaks_task(spec_ref, seg_start: int, seg_end: int, blocks: list, percentile: float, neighborhood: tuple):
+    """
+    Peaks of whole threshold blocks [(b0, b1, threshold or None), ...]
+    (frames relative to the gating segment) of one segment, as find_peaks()
+    finds them when run over the whole segment: the maximum filter sees
+    `neighborhood` extra frames on each side (within the segment).
+    """
+    spec_shm, spec = _attach(spec_ref)
+    try:
+        return _block_peaks(spec, seg_start, seg_end, blocks, percentile, neighborhood)
+    finally:
+        del spec
+        spec_shm.close()
+
+
+def _hash_task(peaks: np.ndarray, num_anchors: int, fan_value: int, min_time_delta: int, max_time_delta: int):
+    return hash_sorted_peaks(peaks, num_anchors, fan_value, min_time_delta, max_time_delta)
+
+
+# -----------------------------
+# PIPELINE
+# -----------------------------
+
+def _peak_tasks(segments: list, profile: FingerprintProfile, chunk_frames: int, spec: np.ndarray) -> list:
+    """
+    Split each gating segment into runs of whole threshold blocks of about
+    chunk_frames. A single block longer than that (threshold_window=0) gets
+    its percentile from the parent and is split freely.
+    """
+    tasks = []
+    for seg_start, seg_end in segments:
+        length = seg_end - seg_start
+        window = profile.threshold_window
+        num_blocks = max(1, round(length / window)) if window > 0 else 1
+        bounds = np.linspace(0, length, num_blocks + 1).astype(int)
+
+        run = []
+        for b0, b1 in zip(bounds[:-1], bounds[1:]):
+            b0, b1 = int(b0), int(b1)
+            if b1 - b0 > 2 * chunk_frames:
+                threshold = np.percentile(spec[:, seg_start + b0:seg_start + b1], profile.threshold_percentile)
+                for c0 in range(b0, b1, chunk_frames):
+                    tasks.append((seg_start, seg_end, [(c0, min(c0 + chunk_frames, b1), threshold)]))
+                continue
+
+            run.append((b0, b1, None))
+            if run[-1][1] - run[0][0] >= chunk_frames:
+                tasks.append((seg_start, seg_end, run))
+                run = []
+        if run:
+            tasks.append((seg_start, seg_end, run))
+    return tasks
+
+
+def compute_hashes_parallel(
+    file_path: str,
+    profile: FingerprintProfile,
+    workers: int = FINGERPRINT_WORKERS,
+    chunk_seconds: float = FINGERPRINT_CHUNK_SECONDS,
+) -> list:
+    """
+    Same result as compute_hashes(file_path, profile) — identical hashes in
+    the same order — with spectrogram, peak picking and hashing spread over
+    `workers` processes.
+    """
+    import librosa
+
+    pool = _get_pool(workers)
+    n_fft, hop = profile.n_fft, profile.hop_length
+    chunk_frames = max(int(chunk_seconds * profile.sample_rate / hop), 4 * profile.neighborhood[1])
+
+    with stage("load"):
+        y, _sr = librosa.load(file_path, sr=profile.sample_rate, mono=True)
+
+    # librosa.stft(center=True) pads n_fft // 2 zeros on both sides
+    padded_len = len(y) + 2 * (n_fft // 2)
+    num_frames = 1 + (padded_len - n_fft) // hop if padded_len >= n_fft else 0
+    logger.info(f"Parallel fingerprinting: {len(y) / profile.sample_rate:.0f}s of audio, {num_frames} frames, {workers} workers")
+
+    # Same memory order as np.abs(librosa.stft(...)), so the gate's sums match too
+    audio_ref = ((padded_len,), np.float32, "C")
+    spec_ref = ((n_fft // 2 + 1, num_frames), np.float32, "F")
+    audio_shm = shared_memory.SharedMemory(create=True, size=max(padded_len * 4, 1))
+    spec_shm = shared_memory.SharedMemory(create=True, size=max(spec_ref[0][0] * num_frames * 4, 1))
+    audio_ref += (audio_shm.name,)
+    spec_ref += (spec_shm.name,)
+
+    try:
+        audio = np.ndarray(audio_ref[0], dtype=np.float32, buffer=audio_shm.buf)
+        audio[:] = 0
+        audio[n_fft // 2:n_fft // 2 + len(y)] = y
+        del audio, y
+
+        # 1) Spectrogram
+        with stage("spectrogram"):
+            futures = [
+                pool.submit(_stft_task, audio_ref, spec_ref, n_fft, hop, start, min(start + chunk_frames, num_frames))
+                for start in range(0, num_frames, chunk_frames)
+            ]
+            for future in futures:
+                future.result()
+
+        spec = np.ndarray(spec_ref[0], dtype=np.float32, buffer=spec_shm.buf, order="F")
+
+        # 2) Skip silent / near-silent frames
+        with stage("gating"):
+            segments = active_segments(spec, profile.silence_db, min_gap=profile.neighborhood[1])
+
+        # 3) Peaks, in find_peaks() order: by frequency, then time
+        with stage("peaks"):
+            tasks = _peak_tasks(segments, profile, chunk_frames, spec)
+            del spec
+            futures = [
+                pool.submit(_peaks_task, spec_ref, *task, profile.threshold_percentile, tuple(profile.neighborhood))
+                for task in tasks
+            ]
+            found = [future.result() for future in futures]
+    finally:
+        for shm in (audio_shm, spec_shm):
+            shm.close()
+            shm.unlink()
+
+    peaks = np.concatenate(found) if found else np.zeros((0, 2), dtype=np.intp)
+    peaks = peaks[np.lexsort((peaks[:, 1], peaks[:, 0]))]
+    logger.info(f"Detected {len(peaks)} peaks")
+
+    # 4) Hashes: the time sort of generate_hashes(), then anchor ranges
+    with stage("hashes"):
+        peaks = peaks[np.argsort(peaks[:, 1])]
+        step = max(len(peaks) // (4 * workers), 1)
+        futures = [
+            pool.submit(
+                _hash_task,
+                peaks[start:start + step + profile.fan_value],
+                min(step, len(peaks) - start),
+                profile.fan_value,
+                profile.min_time_delta,
+                profile.max_time_delta,
+            )
+            for start in range(0, len(peaks), step)
+        ]
+        hashes = [h for future in futures for h in future.result()]
+
+    logger.info(f"Generated {len(hashes)} hashes from {len(peaks)} peaks")
+    return hashes
@@ -1,34 +1,70 @@
 # fingerprint/peak_picker.py
 
 import numpy as np
-from scipy.ndimage import maximum_filter
 from utils import get_logger
 
 logger = get_logger("peak_picker")
 
 
-def find_peaks(spectrogram: np.ndarray, threshold_percentile: int = 98):
+def find_peaks(
+    spectrogram: np.ndarray,
+    threshold_percentile: float = 98,
+    neighborhood: tuple[int, int] = (20, 20),
+    threshold_window: int = 0,
+    segments: list[tuple[int, int]] | None = None,
+):
     """
     Find local maxima in the spectrogram.
     Only the strongest peaks are selected.
 
+    neighborhood: (freq_bins, time_bins) window a peak must dominate.
+    threshold_window: frames per block with its own percentile threshold,
+        so loud passages don't starve quiet ones of peaks (0 = one
+        threshold for the whole spectrogram).
+    segments: (start, end) frame ranges to search (see gating.active_segments);
+        frames outside them are skipped entirely. None = all frames.
+
     Returns:
         List of (frequency_bin, time_bin) peak positions.
     """
 
+    from scipy.ndimage import maximum_filter
+
     logger.info("Finding spectral peaks...")
 
-    # Compute threshold based on percentile
-    threshold = np.percentile(spectrogram, threshold_percentile)
+    if segments is None:
+        segments = [(0, spectrogram.shape[1])]
+
+    found = []
+    for start, end in segments:
+        part = spectrogram[:, start:end]
+
+        # Apply local maximum filter
+        local_max = maximum_filter(part, size=tuple(neighborhood)) == part
 
-    # Apply local maximum filter
-    local_max = maximum_filter(spectrogram, size=(20, 20)) == spectrogram
+        # Apply threshold mask: percentile per block of ~threshold_window
+        # frames (equal-sized, so no short block ends up over-peaked)
+        num_blocks = max(1, round(part.shape[1] / threshold_window)) if threshold_window > 0 else 1
+        bounds = np.linspace(0, part.shape[1], num_blocks + 1).astype(int)
+        detected_peaks = np.zeros_like(local_max)
+        for b0, b1 in zip(bounds[:-1], bounds[1:]):
+            block = part[:, b0:b1]
+            threshold = np.percentile(block, threshold_percentile)
+            detected_peaks[:, b0:b1] = local_max[:, b0:b1] & (block >= threshold)
 
-    # Apply threshold mask
-    detected_peaks = local_max & (spectrogram >= threshold)
+        # Extract coordinates (time back in whole-recording frames)
+        peaks = np.argwhere(detected_peaks)
+        peaks[:, 1] += start
+        found.append(peaks)
 
-    # Extract coordinates
-    peaks = np.argwhere(detected_peaks)
+    if len(found) == 1:
+        peaks = found[0]
+    elif found:
+        # Same (freq, time) row order as a single argwhere over everything
+        peaks = np.concatenate(found)
+        peaks = peaks[np.lexsort((peaks[:, 1], peaks[:, 0]))]
+    else:
+        peaks = np.zeros((0, 2), dtype=np.intp)
 
     logger.info(f"Detected {len(peaks)} peaks")
 
@@ -0,0 +1,182 @@
+# fingerprint/profile.py
+
+import hashlib
+import json
+from dataclasses import dataclass, asdict, fields
+
+from config import FINGERPRINT_PROFILE
+from db import get_setting, set_setting
+from db.base import PROFILE_SETTING_KEY, LEGACY_PROFILE, is_legacy_profile_record
+from utils import get_logger
+
+logger = get_logger("profile")
+
+
+@dataclass(frozen=True)
+class FingerprintProfile:
+    """
+    Every DSP and hashing parameter used by the pipeline.
+    Ingest and matching must use the same profile, so the one a catalog
+    was built with is recorded in the DB.
+    """
+
+    name: str
+
+    # spectrogram
+    sample_rate: int = 22050
+    n_fft: int = 2048
+    hop_length: int = 512
+
+    # peak picking
+    threshold_percentile: float = 98
+    neighborhood: tuple[int, int] = (20, 20)
+
+    # energy gating / adaptive threshold (see fingerprint/gating.py):
+    # frames more than silence_db below the loudest one are skipped (None = off);
+    # the percentile threshold is taken per threshold_window frames (0 = global)
+    silence_db: float | None = None
+    threshold_window: int = 0
+
+    # hashing
+    fan_value: int = 10
+    min_time_delta: int = 1
+    max_time_delta: int = 200
+
+    def to_json(self) -> str:
+        return json.dumps(asdict(self), sort_keys=True)
+
+    def version_id(self) -> str:
+        """
+        16 hex chars identifying every parameter: hashes computed elsewhere
+        (e.g. by clients) are only comparable when their version_id matches.
+        """
+        return hashlib.sha1(self.to_json().encode("utf-8")).hexdigest()[:16]
+
+    @classmethod
+    def from_json(cls, raw: str) -> "FingerprintProfile":
+        """
+        Parse a recorded profile. Missing fields fall back to the named
+        preset, so a bare {"name": "legacy"} is valid, except fields added
+        after catalogs were first recorded: to_json() always writes them, so
+        a record without them predates them and keeps their original
+        behaviour. Existing catalogs aren't queried with different DSP than
+        they were built with. Old "default" records of the original
+        parameters are read as "legacy" (`maintain migrate` rewrites them).
+        """
+        data = json.loads(raw)
+        if is_legacy_profile_record(data):
+            data = {**data, "name": LEGACY_PROFILE}
+        base = asdict(get_profile(data["name"])) if data["name"] in PROFILES else {}
+        base.update({k: v for k, v in _LEGACY_FIELDS.items() if k not in data})
+        known = {f.name for f in fields(cls)}
+        merged = {**base, **{k: v for k, v in data.items() if k in known}}
+        merged["neighborhood"] = tuple(merged.get("neighborhood", (20, 20)))
+        return cls(**merged)
+
+
+# Fields added after catalogs were first recorded -> value matching the
+# behaviour those catalogs were built with
+_LEGACY_FIELDS = {
+    "silence_db": None,
+    "threshold_window": 0,
+}
+
+
+PROFILES = {
+    # Original parameters (no gating, global threshold): catalogs
+    # fingerprinted before profiles were recorded use these
+    LEGACY_PROFILE: FingerprintProfile(LEGACY_PROFILE),
+    # Original parameters, plus skipping near-silence (60 dB under the
+    # loudest frame) and a threshold per ~6s of audio
+    "default": FingerprintProfile("default", silence_db=-60, threshold_window=256),
+    # Half the sample rate and FFT size, fewer pairs per anchor:
+    # ~4x less DSP and about half the index size, less robust to noise
+    "fast": FingerprintProfile(
+        "fast",
+        sample_rate=11025,
+        n_fft=1024,
+        hop_length=256,
+        fan_value=5,
+        max_time_delta=100,
+        silence_db=-60,
+        threshold_window=256,
+    ),
+    # Finer time resolution, more peaks and pairs: larger index, best recall
+    "accurate": FingerprintProfile(
+        "accurate",
+        n_fft=4096,
+        hop_length=256,
+        threshold_percentile=97,
+        neighborhood=(15, 15),
+        fan_value=15,
+        max_time_delta=400,
+        silence_db=-60,
+        threshold_window=512,
+    ),
+    # Telephone-band audio and sparse peaks: smallest index and spectrograms
+    "low-memory": FingerprintProfile(
+        "low-memory",
+        sample_rate=8000,
+        n_fft=1024,
+        hop_length=512,
+        threshold_percentile=99,
+        neighborhood=(25, 25),
+        fan_value=5,
+        max_time_delta=100,
+        silence_db=-60,
+        threshold_window=96,
+    ),
+}
+
+
+def get_profile(name: str) -> FingerprintProfile:
+    try:
+        return PROFILES[name]
+    except KeyError:
+        raise ValueError(
+            f"Unknown fingerprint profile '{name}' (available: {', '.join(PROFILES)})"
+        ) from None
+
+
+def catalog_profile() -> FingerprintProfile | None:
+    """Profile recorded for the current catalog, or None for an empty one."""
+    raw = get_setting(PROFILE_SETTING_KEY)
+    return FingerprintProfile.from_json(raw) if raw else None
+
+
+def resolve_profile(
+    profile: FingerprintProfile | str | None = None,
+    record: bool = False,
+) -> FingerprintProfile:
+    """
+    Pick the profile for an ingest (record=True) or a query.
+
+    - The catalog's recorded profile always wins; explicitly asking for a
+      different one raises ValueError instead of silently mixing hashes.
+    - An empty catalog uses `profile` or FINGERPRINT_PROFILE, and records it
+      when record=True.
+    """
+    if isinstance(profile, str):
+        profile = get_profile(profile)
+
+    stored = catalog_profile()
+    if stored is not None:
+        if profile is not None and profile != stored:
+            message = (
+                f"Catalog was built with fingerprint profile '{stored.name}', "
+                f"cannot use '{profile.name}'"
+            )
+            if stored.name == LEGACY_PROFILE:
+                message += (
+                    f" ('{LEGACY_PROFILE}' is the original parameters, from before profiles were "
+                    "recorded: omit --profile, or re-save the songs into a new catalog; "
+                    "`python main.py maintain migrate` records the name in older catalogs)"
+                )
+            raise ValueError(message)
+        return stored
+
+    chosen = profile or get_profile(FINGERPRINT_PROFILE)
+    if record:
+        set_setting(PROFILE_SETTING_KEY, chosen.to_json())
+        logger.info(f"Recorded fingerprint profile '{chosen.name}' for this catalog.")
+    return chosen
@@ -1,18 +1,26 @@
 # fingerprint/spectrogram.py
 
-import librosa
 import numpy as np
 from utils import get_logger
 
 logger = get_logger("spectrogram")
 
 
-def generate_spectrogram(file_path: str, sample_rate: int = 22050):
+def generate_spectrogram(
+    file_path: str,
+    sample_rate: int = 22050,
+    n_fft: int = 2048,
+    hop_length: int = 512,
+):
     """
     Load audio file and generate magnitude spectrogram.
     This mirrors the Go FFT processing step.
     """
 
+    # librosa (and its audio backends) cost ~1s to import; only load it
+    # once audio is actually being processed
+    import librosa
+
     logger.info(f"Loading audio: {file_path}")
 
     # Load audio (mono)
@@ -21,7 +29,7 @@ def generate_spectrogram(file_path: str, sample_rate: int = 22050):
     logger.info(f"Audio loaded: {len(y)} samples @ {sr} Hz")
 
     # Short-Time Fourier Transform (STFT)
-    stft = librosa.stft(y, n_fft=2048, hop_length=512)
+    stft = librosa.stft(y, n_fft=n_fft, hop_length=hop_length)
 
     # Magnitude spectrogram
     spectrogram = np.abs(stft)
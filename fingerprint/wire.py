@@ -0,0 +1,87 @@
+# fingerprint/wire.py
+
+import struct
+
+import numpy as np
+
+# -----------------------------
+# HASH PAYLOAD (POST /api/find/hashes)
+# -----------------------------
+# Little-endian, produced by encode_hashes() on the client:
+#
+#   magic        4s    b"STH1"
+#   version      u8    1
+#   flags        u8    bit 0: anchor strengths follow the offsets
+#   profile_id   8s    FingerprintProfile.version_id() as 8 raw bytes
+#   count        u32   number of (hash, offset) pairs
+#   hashes       count x 20 bytes (SHA-1 digests)
+#   offsets      count x u32 (anchor time bins)
+#   strengths    count x f32 (only with flag bit 0)
+#
+# 24-28 bytes per hash instead of the clip's audio.
+
+MAGIC = b"STH1"
+VERSION = 1
+FLAG_STRENGTHS = 1
+
+_HEADER = struct.Struct("<4sBB8sI")
+_HASH_BYTES = 20
+
+# Payload size bounds, for limiting request bodies
+WIRE_HEADER_BYTES = _HEADER.size
+MAX_HASH_ROW_BYTES = _HASH_BYTES + 4 + 4
+
+
+def encode_hashes(hashes: list, profile_id: str) -> bytes:
+    """
+    (hash_value, offset) pairs, or (hash_value, offset, strength) triples as
+    returned by generate_hashes(), -> binary payload.
+    """
+    has_strengths = bool(hashes) and len(hashes[0]) > 2
+
+    if any(len(h[0]) != 2 * _HASH_BYTES for h in hashes):
+        raise ValueError("Only 40-character SHA-1 hex hashes can be encoded")
+    digests = b"".join(bytes.fromhex(h[0]) for h in hashes)
+
+    parts = [
+        _HEADER.pack(MAGIC, VERSION, FLAG_STRENGTHS if has_strengths else 0, bytes.fromhex(profile_id), len(hashes)),
+        digests,
+        np.array([h[1] for h in hashes], dtype="<u4").tobytes(),
+    ]
+    if has_strengths:
+        parts.append(np.array([h[2] for h in hashes], dtype="<f4").tobytes())
+    return b"".join(parts)
+
+
+def decode_hashes(payload: bytes) -> tuple[str, list]:
+    """
+    Binary payload -> (profile_id, [(hash_value, offset[, strength]), ...]).
+    Raises ValueError for anything that isn't a well-formed payload.
+    """
+    if len(payload) < _HEADER.size:
+        raise ValueError("Payload too short")
+
+    magic, version, flags, profile_id, count = _HEADER.unpack_from(payload)
+    if magic != MAGIC:
+        raise ValueError("Not a hash payload (bad magic)")
+    if version != VERSION:
+        raise ValueError(f"Unsupported hash payload version {version}")
+
+    has_strengths = bool(flags & FLAG_STRENGTHS)
+    row_bytes = _HASH_BYTES + 4 + (4 if has_strengths else 0)
+    if len(payload) != _HEADER.size + count * row_bytes:
+        raise ValueError(f"Payload size does not match its {count} hashes")
+
+    pos = _HEADER.size
+    hex_all = payload[pos:pos + count * _HASH_BYTES].hex()
+    hash_values = [hex_all[i:i + 2 * _HASH_BYTES] for i in range(0, len(hex_all), 2 * _HASH_BYTES)]
+    pos += count * _HASH_BYTES
+
+    offsets = np.frombuffer(payload, dtype="<u4", count=count, offset=pos).tolist()
+    pos += count * 4
+
+    if has_strengths:
+        strengths = np.frombuffer(payload, dtype="<f4", count=count, offset=pos).tolist()
+        return profile_id.hex(), list(zip(hash_values, offsets, strengths))
+
+    return profile_id.hex(), list(zip(hash_values, offsets))
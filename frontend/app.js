@@ -269,3 +269,120 @@ micBtn.addEventListener("click", async () => {
     micStatus.className = "status error";
   }
 });
+
+// -------------------- Live listening -> WebSocket /ws/find --------------------
+
+const listenBtn = document.getElementById("listenBtn");
+const listenProgress = document.getElementById("listenProgress");
+const listenStatus = document.getElementById("listenStatus");
+const listenResult = document.getElementById("listenResult");
+
+let listenSocket = null;
+let listenStream = null;
+let listenCtx = null;
+let listenNode = null;
+
+function stopListening() {
+  if (listenNode) {
+    listenNode.disconnect();
+    listenNode = null;
+  }
+  if (listenCtx) {
+    listenCtx.close();
+    listenCtx = null;
+  }
+  if (listenStream) {
+    listenStream.getTracks().forEach((t) => t.stop());
+    listenStream = null;
+  }
+  listenBtn.textContent = "👂 Listen (live)";
+}
+
+function showLiveResult(data) {
+  const pred = data.prediction;
+  let html = `Prediction:<br>Title: <strong>${pred.title}</strong><br>Artist: <strong>${pred.artist || "Unknown"}</strong>`;
+  html += `<br>Score: <code>${pred.score}</code>`;
+  html += `<br>Heard: <code>${data.seconds_heard}s</code>${data.early ? " (early answer)" : ""}`;
+  if (pred.spotify_url) {
+    html += `<div style="margin-top:0.5rem;"><a href="${pred.spotify_url}" target="_blank" rel="noopener">Open on Spotify</a></div>`;
+  }
+  if (pred.youtube_url) {
+    html += `<div style="margin-top:0.25rem;"><a href="${pred.youtube_url}" target="_blank" rel="noopener">Watch on YouTube</a></div>`;
+  }
+  listenResult.innerHTML = html;
+  listenResult.style.display = "block";
+}
+
+async function startListening() {
+  listenStatus.textContent = "";
+  listenResult.style.display = "none";
+
+  try {
+    listenStream = await navigator.mediaDevices.getUserMedia({ audio: true });
+  } catch (err) {
+    listenStatus.textContent = "Microphone access denied";
+    listenStatus.className = "status error";
+    console.error("getUserMedia error:", err);
+    return;
+  }
+
+  listenCtx = new AudioContext();
+  const wsUrl = BACKEND_URL.replace(/^http/, "ws");
+  listenSocket = new WebSocket(`${wsUrl}/ws/find?sample_rate=${listenCtx.sampleRate}&format=f32`);
+  listenSocket.binaryType = "arraybuffer";
+
+  listenSocket.onopen = () => {
+    const source = listenCtx.createMediaStreamSource(listenStream);
+    // Raw mono float32 chunks, sent as they are captured
+    listenNode = listenCtx.createScriptProcessor(4096, 1, 1);
+    listenNode.onaudioprocess = (e) => {
+      if (listenSocket && listenSocket.readyState === WebSocket.OPEN) {
+        listenSocket.send(new Float32Array(e.inputBuffer.getChannelData(0)).buffer);
+      }
+    };
+    source.connect(listenNode);
+    listenNode.connect(listenCtx.destination);
+
+    listenBtn.textContent = "⏹ Stop Listening";
+    listenStatus.textContent = "Listening...";
+    listenStatus.className = "status";
+  };
+
+  listenSocket.onmessage = (e) => {
+    const msg = JSON.parse(e.data);
+    if (msg.type === "progress") {
+      listenProgress.textContent = `${msg.seconds.toFixed(1)}s · ${msg.candidates} candidates · best ${msg.best_score}`;
+    } else if (msg.type === "result") {
+      stopListening();
+      listenProgress.textContent = "idle";
+      const found = msg.prediction.song_id !== null;
+      listenStatus.textContent = found ? "Done" : "No match";
+      listenStatus.className = found ? "status ok" : "status error";
+      showLiveResult(msg);
+    } else if (msg.type === "error") {
+      listenStatus.textContent = `Error: ${msg.detail}`;
+      listenStatus.className = "status error";
+    }
+  };
+
+  listenSocket.onclose = () => {
+    stopListening();
+    listenSocket = null;
+  };
+
+  listenSocket.onerror = (err) => {
+    console.error("WebSocket error:", err);
+    listenStatus.textContent = "Connection failed";
+    listenStatus.className = "status error";
+  };
+}
+
+listenBtn.addEventListener("click", async () => {
+  if (!listenSocket) {
+    await startListening();
+  } else {
+    // Stop sending and ask for the best answer from what was heard
+    stopListening();
+    if (listenSocket.readyState === WebSocket.OPEN) listenSocket.send("end");
+  }
+});
@@ -0,0 +1,88 @@
+# hash_client.py
+#
+# Edge-side fingerprinting for POST /api/find/hashes:
+#     python hash_client.py clip.wav [--url http://localhost:8000] [--top-k 3] [--out clip.sth]
+#
+# Fetches the catalog's fingerprint profile, computes the clip's hashes
+# locally (decode, STFT, peak picking, hashing) and uploads only the
+# compact (hash, offset) payload; the server does lookups and voting.
+# Needs the fingerprint dependencies (numpy, scipy, librosa); no catalog is opened.
+
+import argparse
+import json
+import sys
+
+import requests
+
+DEFAULT_URL = "http://localhost:8000"
+
+
+def fetch_profile(url: str = DEFAULT_URL, timeout: float = 10):
+    """The server catalog's FingerprintProfile (GET /api/profile)."""
+    from fingerprint.profile import FingerprintProfile
+
+    resp = requests.get(f"{url}/api/profile", timeout=timeout)
+    resp.raise_for_status()
+    return FingerprintProfile.from_json(json.dumps(resp.json()["profile"]))
+
+
+def encode_clip(file_path: str, profile) -> bytes:
+    """
+    Audio clip -> /api/find/hashes payload, using `profile` (must be the
+    catalog's; see fetch_profile()). Anchor strengths are included so the
+    server's query planner can look up the strongest hashes first.
+    """
+    from fingerprint import compute_peaks, hash_peaks
+    from fingerprint.wire import encode_hashes
+
+    peaks, strengths = compute_peaks(file_path, profile, with_strengths=True)
+    return encode_hashes(hash_peaks(peaks, profile, strengths), profile.version_id())
+
+
+def find_remote(file_path: str, url: str = DEFAULT_URL, top_k: int = 1, profile=None, timeout: float = 30) -> dict:
+    """Fingerprint `file_path` locally and match it on the server; returns the /api/find-style response."""
+    profile = profile or fetch_profile(url)
+    payload = encode_clip(file_path, profile)
+
+    resp = requests.post(
+        f"{url}/api/find/hashes",
+        params={"top_k": top_k},
+        data=payload,
+        headers={"Content-Type": "application/octet-stream"},
+        timeout=timeout,
+    )
+    data = resp.json()
+    if resp.status_code != 200:
+        raise RuntimeError(f"/api/find/hashes failed ({resp.status_code}): {data.get('detail')}")
+    data["payload_bytes"] = len(payload)
+    return data
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Fingerprint a clip locally and match it on a SeekTune server")
+    parser.add_argument("clip")
+    parser.add_argument("--url", default=DEFAULT_URL)
+    parser.add_argument("--top-k", type=int, default=1)
+    parser.add_argument("--out", help="Only write the payload to this file, don't upload it")
+    args = parser.parse_args()
+
+    if args.out:
+        payload = encode_clip(args.clip, fetch_profile(args.url))
+        with open(args.out, "wb") as f:
+            f.write(payload)
+        print(f"Wrote {len(payload)} bytes to {args.out}")
+        return
+
+    try:
+        result = find_remote(args.clip, args.url, args.top_k)
+    except (requests.RequestException, RuntimeError) as e:
+        print(f"Error: {e}")
+        sys.exit(1)
+
+    print(f"Uploaded {result['payload_bytes']} bytes of hashes")
+    for m in result["matches"] or [result["prediction"]]:
+        print(f"{m['title']} by {m['artist']}  (score={m['score']}, confidence={m['confidence']}, offset={m['offset_seconds']}s)")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,447 @@
+# load_test.py
+#
+# HTTP API load test:
+#     python load_test.py [--duration 30] [--concurrency 8] [--mix find=8,save=1,download=1]
+#
+# Seeds a throwaway catalog with generated songs, starts the FastAPI app
+# in-process (Spotify/YouTube/ffmpeg replaced by offline stubs), fires
+# concurrent /api/find, /api/save and /api/download requests and reports
+# throughput, latency percentiles, error rates and event-loop blocking.
+#
+# --url targets an already running server instead (e.g. `main.py serve
+# --workers 4`); event-loop stats and the download stubs are then unavailable.
+
+import argparse
+import asyncio
+import io
+import json
+import os
+import random
+import socket
+import statistics
+import sys
+import tempfile
+import threading
+import time
+from collections import defaultdict
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+
+SAMPLE_RATE = 22050
+
+
+# -----------------------------
+# GENERATED AUDIO
+# -----------------------------
+
+def synth_song(seed: int, seconds: float):
+    """Random tone bursts over light noise: distinct, peak-rich test audio."""
+    import numpy as np
+
+    rng = np.random.default_rng(seed)
+    t = np.arange(int(SAMPLE_RATE * seconds)) / SAMPLE_RATE
+    y = 0.01 * rng.standard_normal(len(t))
+    for _ in range(int(seconds * 6)):
+        freq = rng.uniform(200, 4000)
+        start = rng.uniform(0, seconds - 0.3)
+        length = rng.uniform(0.3, 2.0)
+        y += np.sin(2 * np.pi * freq * t) * ((t >= start) & (t < start + length))
+    return (0.8 * y / np.abs(y).max()).astype(np.float32)
+
+
+def wav_bytes(samples) -> bytes:
+    import soundfile as sf
+
+    buf = io.BytesIO()
+    sf.write(buf, samples, SAMPLE_RATE, format="WAV")
+    return buf.getvalue()
+
+
+def make_clip(song, seconds: float, rng: random.Random) -> bytes:
+    """Random excerpt of a song with extra noise, like a phone recording."""
+    import numpy as np
+
+    n = int(SAMPLE_RATE * seconds)
+    start = rng.randrange(0, max(1, len(song) - n))
+    clip = song[start:start + n] + 0.01 * np.random.default_rng(rng.getrandbits(32)).standard_normal(n)
+    return wav_bytes(clip.astype(np.float32))
+
+
+# -----------------------------
+# DOWNLOAD STUBS
+# -----------------------------
+
+def install_download_stubs(latency: float):
+    """
+    Replace the network/ffmpeg steps of downloader.service so /api/download
+    runs offline: Spotify metadata comes from the URL, the "YouTube download"
+    writes a generated WAV after `latency` seconds, and conversion is a copy.
+    Fingerprinting and the DB insert stay real.
+    """
+    import shutil
+
+    import soundfile as sf
+
+    import downloader.service as service
+    from utils import create_folder
+
+    class StubSpotifyClient:
+        def get_track_info(self, spotify_url: str) -> dict:
+            track_id = spotify_url.rstrip("/").rsplit("/", 1)[-1]
+            return {"title": f"Stub {track_id}", "artist": "Load Test"}
+
+    async def stub_youtube_download(query: str, tmp_audio_base: Path):
+        await asyncio.sleep(latency)
+        create_folder(tmp_audio_base.parent)
+        path = tmp_audio_base.with_suffix(".wav")
+        audio = await asyncio.to_thread(synth_song, abs(hash(query)) % (1 << 31), 20)
+        await asyncio.to_thread(sf.write, path, audio, SAMPLE_RATE)
+        vid = f"stub{abs(hash(query)) % 10**8}"
+        return path, {"id": vid, "webpage_url": f"https://www.youtube.com/watch?v={vid}"}
+
+    async def stub_convert_to_wav(input_path: str, output_path: str, **_kwargs):
+        shutil.copyfile(input_path, output_path)
+        return output_path
+
+    service.SpotifyClient = StubSpotifyClient
+    service._youtube_download_by_search_async = stub_youtube_download
+    service.convert_to_wav_async = stub_convert_to_wav
+
+
+# -----------------------------
+# IN-PROCESS SERVER
+# -----------------------------
+
+class LoopMonitor:
+    """
+    Ticks every `interval` on the server's event loop; any extra delay
+    before a tick runs is time the loop was blocked by synchronous work.
+    """
+
+    def __init__(self, interval: float = 0.01, threshold: float = 0.005):
+        self.interval = interval
+        self.threshold = threshold
+        self.lags = []
+        self.started = None
+        self.stopped = None
+
+    async def run(self):
+        loop = asyncio.get_running_loop()
+        self.started = loop.time()
+        try:
+            while True:
+                expected = loop.time() + self.interval
+                await asyncio.sleep(self.interval)
+                lag = loop.time() - expected
+                if lag > self.threshold:
+                    self.lags.append(lag)
+        finally:
+            self.stopped = loop.time()
+
+    def summary(self) -> dict:
+        wall = (self.stopped or self.started) - self.started
+        blocked = sum(self.lags)
+        return {
+            "blocked_seconds": round(blocked, 3),
+            "blocked_pct": round(100 * blocked / wall, 1) if wall else 0.0,
+            "max_lag_ms": round(1000 * max(self.lags, default=0.0), 1),
+            "stalls_over_100ms": sum(1 for lag in self.lags if lag > 0.1),
+        }
+
+
+def free_port() -> int:
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+
+class LocalServer:
+    """uvicorn on a background thread, with a LoopMonitor on its loop."""
+
+    def __init__(self, port: int):
+        import uvicorn
+
+        from api.server import app
+
+        self.port = port
+        self.monitor = LoopMonitor()
+        self.server = uvicorn.Server(
+            uvicorn.Config(app, host="127.0.0.1", port=port, log_level="warning")
+        )
+        self.thread = threading.Thread(target=lambda: asyncio.run(self._serve()), daemon=True)
+
+    async def _serve(self):
+        watcher = asyncio.create_task(self.monitor.run())
+        try:
+            await self.server.serve()
+        finally:
+            watcher.cancel()
+            await asyncio.gather(watcher, return_exceptions=True)
+
+    def start(self, timeout: float = 30):
+        self.thread.start()
+        deadline = time.monotonic() + timeout
+        while not self.server.started:
+            if time.monotonic() > deadline or not self.thread.is_alive():
+                raise RuntimeError("Local server failed to start")
+            time.sleep(0.05)
+
+    def stop(self):
+        self.server.should_exit = True
+        self.thread.join(timeout=30)
+
+
+# -----------------------------
+# LOAD GENERATION
+# -----------------------------
+
+def parse_mix(raw: str) -> dict:
+    mix = {}
+    for part in raw.split(","):
+        name, _, weight = part.partition("=")
+        name = name.strip()
+        if name not in ("find", "save", "download"):
+            raise argparse.ArgumentTypeError(f"unknown operation '{name}' in --mix")
+        mix[name] = float(weight or 1)
+    return mix
+
+
+def percentile(values: list, q: float) -> float:
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(round(q / 100 * (len(ordered) - 1))))]
+
+
+class LoadRunner:
+    def __init__(self, base_url: str, args, clips: list, songs: list):
+        self.base_url = base_url
+        self.args = args
+        self.clips = clips        # [(wav bytes, expected title)]
+        self.songs = songs        # [wav bytes] uploaded by save
+        self.results = []         # (op, ok, latency, correct)
+        self.lock = threading.Lock()
+        self.counter = 0
+
+        ops = list(args.mix)
+        weights = [args.mix[op] for op in ops]
+        self.pick = lambda rng: rng.choices(ops, weights)[0]
+
+    def _next_id(self) -> int:
+        with self.lock:
+            self.counter += 1
+            return self.counter
+
+    def one(self, session, rng: random.Random):
+        op = self.pick(rng)
+        n = self._next_id()
+        correct = None
+        start = time.perf_counter()
+        try:
+            if op == "find":
+                clip, expected = rng.choice(self.clips)
+                r = session.post(
+                    f"{self.base_url}/api/find",
+                    files={"file": (f"clip{n}.wav", clip, "audio/wav")},
+                    timeout=self.args.timeout,
+                )
+                if r.ok:
+                    correct = r.json().get("prediction", {}).get("title") == expected
+            elif op == "save":
+                r = session.post(
+                    f"{self.base_url}/api/save",
+                    files={"file": (f"load_{n}.wav", rng.choice(self.songs), "audio/wav")},
+                    timeout=self.args.timeout,
+                )
+            else:
+                r = session.post(
+                    f"{self.base_url}/api/download",
+                    json={"spotify_url": f"https://open.spotify.com/track/load{n}"},
+                    timeout=self.args.timeout,
+                )
+            ok = r.ok
+        except Exception:
+            ok = False
+        latency = time.perf_counter() - start
+
+        with self.lock:
+            self.results.append((op, ok, latency, correct))
+
+    def worker(self, index: int, stop_at: float, quota: int | None):
+        import requests
+
+        rng = random.Random(self.args.seed * 1000 + index)
+        with requests.Session() as session:
+            while time.monotonic() < stop_at:
+                if quota is not None:
+                    with self.lock:
+                        if self.counter >= quota:
+                            return
+                self.one(session, rng)
+
+    def run(self) -> float:
+        args = self.args
+        stop_at = time.monotonic() + (args.duration if args.requests is None else float("inf"))
+        start = time.perf_counter()
+        with ThreadPoolExecutor(args.concurrency) as pool:
+            for i in range(args.concurrency):
+                pool.submit(self.worker, i, stop_at, args.requests)
+        return time.perf_counter() - start
+
+    def report(self, elapsed: float) -> dict:
+        by_op = defaultdict(list)
+        for result in self.results:
+            by_op[result[0]].append(result)
+
+        ops = {}
+        for op, rows in sorted(by_op.items()):
+            latencies = [latency for _op, _ok, latency, _c in rows]
+            errors = sum(1 for _op, ok, _l, _c in rows if not ok)
+            checked = [c for _op, _ok, _l, c in rows if c is not None]
+            ops[op] = {
+                "requests": len(rows),
+                "errors": errors,
+                "error_rate": round(errors / len(rows), 4),
+                "rps": round(len(rows) / elapsed, 2),
+                "p50_ms": round(1000 * percentile(latencies, 50), 1),
+                "p90_ms": round(1000 * percentile(latencies, 90), 1),
+                "p99_ms": round(1000 * percentile(latencies, 99), 1),
+                "max_ms": round(1000 * max(latencies), 1),
+                "mean_ms": round(1000 * statistics.fmean(latencies), 1),
+            }
+            if checked:
+                ops[op]["accuracy"] = round(sum(checked) / len(checked), 4)
+
+        total = len(self.results)
+        return {
+            "elapsed_seconds": round(elapsed, 2),
+            "concurrency": self.args.concurrency,
+            "requests": total,
+            "rps": round(total / elapsed, 2) if elapsed else 0.0,
+            "error_rate": round(sum(1 for r in self.results if not r[1]) / total, 4) if total else 0.0,
+            "ops": ops,
+        }
+
+
+def print_report(report: dict):
+    print(
+        f"\n{report['requests']} requests in {report['elapsed_seconds']}s "
+        f"@ concurrency {report['concurrency']}: {report['rps']} req/s, "
+        f"error rate {100 * report['error_rate']:.2f}%\n"
+    )
+    header = f"{'op':<10}{'reqs':>7}{'err%':>7}{'req/s':>8}{'p50':>9}{'p90':>9}{'p99':>9}{'max':>9}{'acc':>7}"
+    print(header)
+    print("-" * len(header))
+    for op, s in report["ops"].items():
+        acc = f"{100 * s['accuracy']:.0f}%" if "accuracy" in s else "-"
+        print(
+            f"{op:<10}{s['requests']:>7}{100 * s['error_rate']:>7.1f}{s['rps']:>8.2f}"
+            f"{s['p50_ms']:>7.0f}ms{s['p90_ms']:>7.0f}ms{s['p99_ms']:>7.0f}ms{s['max_ms']:>7.0f}ms{acc:>7}"
+        )
+
+    loop = report.get("event_loop")
+    if loop:
+        print(
+            f"\nEvent loop blocked {loop['blocked_seconds']}s ({loop['blocked_pct']}% of wall time), "
+            f"max stall {loop['max_lag_ms']}ms, {loop['stalls_over_100ms']} stalls > 100ms"
+        )
+
+
+# -----------------------------
+# MAIN
+# -----------------------------
+
+def main():
+    parser = argparse.ArgumentParser(prog="python load_test.py")
+    parser.add_argument("--duration", default=30, type=float, help="Seconds of load (ignored with --requests)")
+    parser.add_argument("--requests", default=None, type=int, help="Stop after this many requests")
+    parser.add_argument("--concurrency", default=8, type=int, help="Concurrent client connections")
+    parser.add_argument("--mix", default="find=8,save=1,download=1", type=parse_mix,
+                        help="Weighted operation mix, e.g. find=8,save=1,download=1")
+    parser.add_argument("--songs", default=10, type=int, help="Generated songs seeded into the catalog")
+    parser.add_argument("--song-seconds", default=30, type=float, help="Length of generated songs")
+    parser.add_argument("--clip-seconds", default=5, type=float, help="Length of /api/find clips")
+    parser.add_argument("--download-latency", default=0.5, type=float,
+                        help="Simulated YouTube download time of the stub (seconds)")
+    parser.add_argument("--timeout", default=120, type=float, help="Per-request timeout (seconds)")
+    parser.add_argument("--url", default=None, help="Load an already running server instead")
+    parser.add_argument("--data-dir", default=None,
+                        help="Catalog/DB directory for the local server (default: a temp dir)")
+    parser.add_argument("--seed", default=0, type=int)
+    parser.add_argument("--json", action="store_true", help="Print the report as JSON")
+    parser.add_argument("-v", "--verbose", action="store_true", help="Keep server INFO logs")
+    args = parser.parse_args()
+
+    # Must be set before config is imported
+    tmp = None
+    if args.url is None:
+        if args.data_dir is None:
+            tmp = tempfile.TemporaryDirectory(prefix="seektune_load_")
+            args.data_dir = tmp.name
+        os.environ["DATA_DIR"] = str(Path(args.data_dir).resolve())
+
+    if not args.verbose:
+        import logging
+
+        logging.disable(logging.INFO)
+
+    rng = random.Random(args.seed)
+
+    print(f"[load] Generating {args.songs} songs ({args.song_seconds:.0f}s each)...", file=sys.stderr)
+    seeded = [(f"load_seed_{i}", synth_song(args.seed * 10_000 + i, args.song_seconds)) for i in range(args.songs)]
+    clips = [
+        (make_clip(samples, args.clip_seconds, rng), title)
+        for title, samples in seeded
+        for _ in range(3)
+    ]
+    uploads = [wav_bytes(synth_song(args.seed * 10_000 + 5_000 + i, args.song_seconds)) for i in range(4)]
+
+    server = None
+    try:
+        if args.url is None:
+            import soundfile as sf
+
+            from config import SONGS_DIR
+            from db import init_db
+            from fingerprint import generate_fingerprint
+            from utils import create_folder
+
+            init_db()
+            create_folder(SONGS_DIR)
+            print(f"[load] Seeding catalog in {args.data_dir}...", file=sys.stderr)
+            for title, samples in seeded:
+                path = SONGS_DIR / f"{title}.wav"
+                sf.write(path, samples, SAMPLE_RATE)
+                generate_fingerprint(str(path), title=title, artist="Load Test")
+
+            install_download_stubs(args.download_latency)
+            server = LocalServer(free_port())
+            server.start()
+            base_url = f"http://127.0.0.1:{server.port}"
+        else:
+            base_url = args.url.rstrip("/")
+            if "download" in args.mix:
+                print("[load] Warning: /api/download hits the real Spotify/YouTube path with --url", file=sys.stderr)
+
+        print(f"[load] Running against {base_url} (concurrency={args.concurrency})...", file=sys.stderr)
+        runner = LoadRunner(base_url, args, clips, uploads)
+        elapsed = runner.run()
+        report = runner.report(elapsed)
+    finally:
+        if server is not None:
+            server.stop()
+
+    if server is not None:
+        report["event_loop"] = server.monitor.summary()
+
+    if args.json:
+        print(json.dumps(report, indent=2))
+    else:
+        print_report(report)
+
+    if tmp is not None:
+        tmp.cleanup()
+
+
+if __name__ == "__main__":
+    main()
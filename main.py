@@ -1,6 +1,7 @@
 # main.py
 
 import sys
+import contextlib
 import argparse
 from pathlib import Path
 import shutil
@@ -14,10 +15,10 @@ from config import (
     DEFAULT_PORT,
 )
 from utils import create_folder, get_logger
-from fingerprint import generate_fingerprint
-from matcher import match_song
-from db import delete_db
-from downloader.service import download_and_fingerprint_from_spotify
+
+# Subcommands import what they need (db -> SQLAlchemy, fingerprint -> numpy/
+# scipy/librosa, downloader -> yt-dlp) inside their cmd_* function, so
+# short invocations and usage errors don't pay for the whole stack.
 
 logger = get_logger("seek_tune_cli")
 
@@ -26,30 +27,86 @@ logger = get_logger("seek_tune_cli")
 # COMMAND IMPLEMENTATIONS
 # -------------------------------------------------
 
-def cmd_find(path: str):
+def open_db():
+    """Create tables once per process, not per fingerprint / match."""
+    from db import init_db
+
+    init_db()
+
+
+def profiled(label: str, out_dir: str | None):
+    """
+    Context for --cprofile: cProfile + tracemalloc around the command,
+    summary printed at the end, .prof/.json written to out_dir if given.
+    out_dir=None means profiling is off.
+    """
+    if out_dir is None:
+        return contextlib.nullcontext()
+
+    from utils.profiling import profile_run, format_summary
+
+    @contextlib.contextmanager
+    def run():
+        with profile_run(label, Path(out_dir) if out_dir else None) as session:
+            yield session
+        print()
+        print(format_summary(session.summary()))
+
+    return run()
+
+
+def _cprofile_arg(args) -> str | None:
+    """--cprofile/--cprofile-dir -> profiled()'s out_dir (None = off, "" = summary only)."""
+    if not args.cprofile:
+        return None
+    return args.cprofile_dir or ""
+
+
+def cmd_find(path: str, top_k: int = 1, robust: bool = False, cprofile: str | None = None):
     p = Path(path)
     if not p.exists():
         logger.error(f"[find] File does not exist: {path}")
         return
 
+    from matcher import match_song
+
+    open_db()
+
     logger.info(f"[find] Matching clip: {path}")
-    result = match_song(str(p))
+    with profiled(f"find {p.name}", cprofile):
+        result = match_song(str(p), top_k=top_k, robust=robust)
 
     if result["song_id"] is None or result["score"] == 0:
         print("No match found.")
-    else:
+        return
+
+    print(
+        f"Prediction: '{result['title']}' by '{result['artist']}' "
+        f"(score={result['score']}, confidence={result['confidence']:.2f}, "
+        f"at {result['offset_seconds']:.1f}s, speed x{result['speed']:.2f})"
+    )
+
+    for rank, m in enumerate(result["matches"][1:], start=2):
         print(
-            f"Prediction: '{result['title']}' by '{result['artist']}' "
-            f"(score={result['score']})"
+            f"  #{rank}: '{m['title']}' by '{m['artist']}' "
+            f"(score={m['score']}, confidence={m['confidence']:.2f}, "
+            f"at {m['offset_seconds']:.1f}s, speed x{m['speed']:.2f})"
         )
 
 
 def cmd_download(url: str):
+    from downloader.service import download_and_fingerprint_from_spotify
+
+    open_db()
+
     logger.info(f"[download] Spotify URL: {url}")
 
     try:
         result = download_and_fingerprint_from_spotify(url)
 
+        if result["existing"]:
+            print(f"Already in catalog: '{result['title']}' by '{result['artist']}' (song_id={result['song_id']})")
+            return
         print(
             f"Downloaded and saved: '{result['title']}' by '{result['artist']}' "
             f"(song_id={result['song_id']}, hashes={result['hashes']})"
@@ -61,12 +118,24 @@ def cmd_download(url: str):
 
 
 
-def cmd_save(path: str, force: bool):
+def cmd_save(path: str, force: bool, profile: str | None = None, cprofile: str | None = None):
     p = Path(path)
     if not p.exists():
         logger.error(f"[save] Path does not exist: {path}")
         return
 
+    from fingerprint import generate_fingerprint
+    from fingerprint.profile import get_profile
+
+    if profile is not None:
+        try:
+            get_profile(profile)
+        except ValueError as e:
+            logger.error(f"[save] {e}")
+            return
+
+    open_db()
+
     logger.info(f"[save] Saving from path: {path}")
     logger.info(f"[save] Force mode: {force}")
 
@@ -82,7 +151,7 @@ def cmd_save(path: str, force: bool):
 
         logger.info(f"[save] Fingerprinting file: {file_path}")
         try:
-            song_id, num_hashes = generate_fingerprint(str(file_path))
+            song_id, num_hashes = generate_fingerprint(str(file_path), profile=profile)
             logger.info(
                 f"[save] OK: song_id={song_id}, hashes={num_hashes} "
                 f"({file_path.name})"
@@ -93,16 +162,19 @@ def cmd_save(path: str, force: bool):
         except Exception as e:
             logger.error(f"[save] Error processing {file_path}: {e}")
 
-    if p.is_dir():
-        # Walk directory and process all audio files
-        for file_path in p.rglob("*"):
-            if file_path.is_file():
-                process_file(file_path)
-    else:
-        process_file(p)
+    with profiled(f"save {p.name}", cprofile):
+        if p.is_dir():
+            # Walk directory and process all audio files
+            for file_path in p.rglob("*"):
+                if file_path.is_file():
+                    process_file(file_path)
+        else:
+            process_file(p)
 
 
 def cmd_erase(db_only: bool, all_: bool):
+    from db import delete_db
+
     if all_:
         logger.info("[erase] Deleting database + songs + recordings")
 
@@ -123,14 +195,143 @@ def cmd_erase(db_only: bool, all_: bool):
         print("Database erased.")
 
 
-def cmd_serve(proto: str, port: int):
-    logger.info(f"[serve] Starting server on {proto}://0.0.0.0:{port}")
+def cmd_delete(song_ids: list[int], path: str | None, artist: str | None):
+    from db import delete_songs, get_song_ids
+
+    open_db()
+
+    ids = list(song_ids)
+    if path is not None:
+        ids += get_song_ids(path=str(path))
+    if artist is not None:
+        ids += get_song_ids(artist=artist)
+
+    if not ids:
+        print("No matching songs found.")
+        return
+
+    logger.info(f"[delete] Deleting song ids: {ids}")
+    deleted = delete_songs(ids)
+    print(f"Deleted {deleted} song(s).")
+
+
+def cmd_export(path: str):
+    from db.snapshot import export_snapshot
+
+    open_db()
+
+    stats = export_snapshot(path)
+    print(
+        f"Exported {stats['songs']} songs and {stats['fingerprints']} fingerprints "
+        f"to {path} ({stats['bytes'] / (1 << 20):.1f} MiB, {stats['seconds']}s)"
+    )
+
+
+def cmd_import(path: str, replace: bool):
+    if not Path(path).exists():
+        logger.error(f"[import] File does not exist: {path}")
+        return
+
+    from db.snapshot import import_snapshot
+
+    open_db()
+
+    try:
+        stats = import_snapshot(path, replace=replace)
+    except ValueError as e:
+        print(f"Import failed: {e}")
+        sys.exit(1)
+
+    print(
+        f"Imported {stats['songs']} songs and {stats['fingerprints']} fingerprints "
+        f"from {path} ({stats['seconds']}s)"
+    )
+
+
+def cmd_maintain(task: str):
+    from db import analyze_db, reindex_db, vacuum_db, migrate_db
+
+    open_db()
+
+    tasks = {
+        "analyze": analyze_db,
+        "reindex": reindex_db,
+        "vacuum": vacuum_db,
+        "migrate": migrate_db,
+    }
+
+    # "all" is routine upkeep; schema migration is run explicitly
+    selected = ["analyze", "reindex", "vacuum"] if task == "all" else [task]
+    for name in selected:
+        logger.info(f"[maintain] Running {name}")
+        tasks[name]()
+
+    print(f"Maintenance done: {', '.join(selected)}")
+
+
+def cmd_stats(top_n: int, rebuild: bool):
+    from db import get_hash_stats, rebuild_hash_counts
+
+    open_db()
+
+    if rebuild:
+        rebuild_hash_counts()
+
+    stats = get_hash_stats(top_n)
+
+    cap = stats["max_postings"]
+    print(f"Distinct hashes: {stats['distinct_hashes']}")
+    print(f"Postings:        {stats['postings']}")
+    print(f"Stop-list cap:   {cap if cap > 0 else 'disabled'}")
+    print(f"Stopped hashes:  {stats['stopped_hashes']}")
+
+    bloom = stats["filter"]
+    if bloom.get("current"):
+        print(
+            f"Hash filter:     {bloom['bytes'] / (1 << 20):.1f} MiB, ~{bloom['estimated_hashes']} hashes, "
+            f"false positives {bloom['false_positive_rate']:.2%}"
+        )
+    else:
+        print(f"Hash filter:     {'not built' if bloom['enabled'] else 'disabled'}")
+
+    if stats["top"]:
+        print(f"\nTop {len(stats['top'])} hashes by postings:")
+        for hash_value, count in stats["top"]:
+            print(f"  {hash_value}  {count}")
+
+
+def cmd_dedupe(threshold: float, min_votes: int, merge: bool):
+    from db import get_song_by_id
+    from matcher.duplicates import find_duplicates, merge_duplicates
+
+    open_db()
+
+    pairs = find_duplicates(threshold=threshold, min_votes=min_votes)
+    if not pairs:
+        print("No duplicates found.")
+        return
+
+    for pair in pairs:
+        a = get_song_by_id(pair["song_id"])
+        b = get_song_by_id(pair["duplicate_id"])
+        print(
+            f"{pair['song_id']} '{getattr(a, 'title', '?')}' ~ "
+            f"{pair['duplicate_id']} '{getattr(b, 'title', '?')}' "
+            f"(overlap={pair['overlap']:.2f}, votes={pair['votes']}, delta={pair['delta']})"
+        )
+
+    if merge:
+        for result in merge_duplicates(pairs):
+            print(f"Kept song_id={result['kept']}, removed {result['removed']}")
+
 
-    import uvicorn
-    from api import app
+def cmd_serve(proto: str, port: int, workers: int = 1):
+    logger.info(f"[serve] Starting server on {proto}://0.0.0.0:{port} (workers={workers})")
+
+    from api.prefork import serve
 
     # For now we ignore HTTPS; proto is kept for similarity with Go
-    uvicorn.run(app, host="0.0.0.0", port=port)
+    serve("0.0.0.0", port, workers=workers)
 
 
 
@@ -146,13 +347,19 @@ def main():
     create_folder(DB_DIR)
 
     if len(sys.argv) < 2:
-        print("Expected 'find', 'download', 'erase', 'save', or 'serve' subcommands\n")
+        print("Expected 'find', 'download', 'erase', 'save', 'delete', 'maintain', 'stats', 'dedupe', 'export', 'import', or 'serve' subcommands\n")
         print("Usage examples:")
-        print("  python main.py find <path_to_wav_file>")
+        print("  python main.py find <path_to_wav_file> [--top-k <n>] [--robust] [--cprofile [--cprofile-dir <dir>]]")
         print("  python main.py download <spotify_url>")
         print("  python main.py erase [db | all]  (default: db)")
-        print("  python main.py save [-f|--force] <path_to_file_or_dir>")
-        print("  python main.py serve [--proto <http|https>] [--port <port>]")
+        print("  python main.py save [-f|--force] [--profile <name>] [--cprofile [--cprofile-dir <dir>]] <path_to_file_or_dir>")
+        print("  python main.py delete [--id <song_id> ...] [--path <path>] [--artist <artist>]")
+        print("  python main.py maintain [vacuum | analyze | reindex | migrate | all]  (default: all)")
+        print("  python main.py stats [--top <n>] [--rebuild]")
+        print("  python main.py dedupe [--threshold <0-1>] [--min-votes <n>] [--merge]")
+        print("  python main.py export <snapshot.npz>")
+        print("  python main.py import [--replace] <snapshot.npz>")
+        print("  python main.py serve [--proto <http|https>] [--port <port>] [--workers <n>]")
         sys.exit(1)
 
     cmd = sys.argv[1]
@@ -160,11 +367,34 @@ def main():
     # ---------------- FIND ----------------
     if cmd == "find":
         if len(sys.argv) < 3:
-            print("Usage: python main.py find <path_to_wav_file>")
+            print("Usage: python main.py find <path_to_wav_file> [--top-k <n>] [--robust] [--cprofile [--cprofile-dir <dir>]]")
             sys.exit(1)
 
-        file_path = sys.argv[2]
-        cmd_find(file_path)
+        parser = argparse.ArgumentParser(prog="python main.py find")
+        parser.add_argument("path", help="Clip to identify (.wav)")
+        parser.add_argument(
+            "--top-k",
+            default=1,
+            type=int,
+            help="Number of ranked candidates to show"
+        )
+        parser.add_argument(
+            "--robust",
+            action="store_true",
+            help="Also match sped-up/slowed-down clips (slower)"
+        )
+        parser.add_argument(
+            "--cprofile",
+            action="store_true",
+            help="Profile the run (cProfile + memory per stage) and print a summary"
+        )
+        parser.add_argument(
+            "--cprofile-dir",
+            metavar="DIR",
+            help="With --cprofile, also write .prof/.json files to DIR"
+        )
+        args = parser.parse_args(sys.argv[2:])
+        cmd_find(args.path, max(1, args.top_k), args.robust, _cprofile_arg(args))
 
     # ---------------- DOWNLOAD ----------------
     elif cmd == "download":
@@ -183,13 +413,29 @@ def main():
             action="store_true",
             help="Save even if metadata or YouTube ID is missing"
         )
+        parser.add_argument(
+            "--profile",
+            metavar="NAME",
+            help="Fingerprint profile preset for a new catalog: default, fast, accurate, "
+                 "low-memory or legacy (default: FINGERPRINT_PROFILE)"
+        )
+        parser.add_argument(
+            "--cprofile",
+            action="store_true",
+            help="Profile the run (cProfile + memory per stage) and print a summary"
+        )
+        parser.add_argument(
+            "--cprofile-dir",
+            metavar="DIR",
+            help="With --cprofile, also write .prof/.json files to DIR"
+        )
         parser.add_argument(
             "path",
             help="Path to a song file or directory of songs"
         )
         args = parser.parse_args(sys.argv[2:])
 
-        cmd_save(args.path, args.force)
+        cmd_save(args.path, args.force, args.profile, _cprofile_arg(args))
 
     # ---------------- ERASE ----------------
     elif cmd == "erase":
@@ -210,6 +456,109 @@ def main():
 
         cmd_erase(db_only, all_)
 
+    # ---------------- DELETE ----------------
+    elif cmd == "delete":
+        parser = argparse.ArgumentParser(prog="python main.py delete")
+        parser.add_argument(
+            "--id",
+            dest="song_ids",
+            type=int,
+            action="append",
+            default=[],
+            help="Song id to delete (repeatable)"
+        )
+        parser.add_argument(
+            "--path",
+            help="Delete the song stored with this file path"
+        )
+        parser.add_argument(
+            "--artist",
+            help="Delete every song by this artist"
+        )
+        args = parser.parse_args(sys.argv[2:])
+
+        if not args.song_ids and args.path is None and args.artist is None:
+            parser.error("one of --id, --path or --artist is required")
+
+        cmd_delete(args.song_ids, args.path, args.artist)
+
+    # ---------------- MAINTAIN ----------------
+    elif cmd == "maintain":
+        task = sys.argv[2].lower() if len(sys.argv) > 2 else "all"
+        if task not in ("vacuum", "analyze", "reindex", "migrate", "all"):
+            print("Usage: python main.py maintain [vacuum | analyze | reindex | migrate | all]")
+            sys.exit(1)
+
+        cmd_maintain(task)
+
+    # ---------------- STATS ----------------
+    elif cmd == "stats":
+        parser = argparse.ArgumentParser(prog="python main.py stats")
+        parser.add_argument(
+            "--top",
+            default=20,
+            type=int,
+            help="Number of most common hashes to list"
+        )
+        parser.add_argument(
+            "--rebuild",
+            action="store_true",
+            help="Recompute hash posting counts from the fingerprints table first"
+        )
+        args = parser.parse_args(sys.argv[2:])
+
+        cmd_stats(args.top, args.rebuild)
+
+    # ---------------- DEDUPE ----------------
+    elif cmd == "dedupe":
+        from matcher.duplicates import DEFAULT_THRESHOLD, DEFAULT_MIN_VOTES
+
+        parser = argparse.ArgumentParser(prog="python main.py dedupe")
+        parser.add_argument(
+            "--threshold",
+            default=DEFAULT_THRESHOLD,
+            type=float,
+            help="Aligned hash overlap (0-1) needed to report a pair"
+        )
+        parser.add_argument(
+            "--min-votes",
+            default=DEFAULT_MIN_VOTES,
+            type=int,
+            help="Minimum aligned votes for a pair"
+        )
+        parser.add_argument(
+            "--merge",
+            action="store_true",
+            help="Keep one song per duplicate group and delete the others"
+        )
+        args = parser.parse_args(sys.argv[2:])
+
+        cmd_dedupe(args.threshold, args.min_votes, args.merge)
+
+    # ---------------- EXPORT ----------------
+    elif cmd == "export":
+        if len(sys.argv) < 3:
+            print("Usage: python main.py export <snapshot.npz>")
+            sys.exit(1)
+
+        cmd_export(sys.argv[2])
+
+    # ---------------- IMPORT ----------------
+    elif cmd == "import":
+        parser = argparse.ArgumentParser(prog="python main.py import")
+        parser.add_argument(
+            "--replace",
+            action="store_true",
+            help="Erase the current catalog first (otherwise it must be empty)"
+        )
+        parser.add_argument(
+            "path",
+            help="Snapshot written by `main.py export`"
+        )
+        args = parser.parse_args(sys.argv[2:])
+
+        cmd_import(args.path, args.replace)
+
     # ---------------- SERVE ----------------
     elif cmd == "serve":
         parser = argparse.ArgumentParser(prog="python main.py serve")
@@ -225,18 +574,30 @@ def main():
             type=int,
             help="Port number"
         )
+        parser.add_argument(
+            "--workers", "-w",
+            default=1,
+            type=int,
+            help="Worker processes, forked after warmup so they share the loaded index"
+        )
         args = parser.parse_args(sys.argv[2:])
 
-        cmd_serve(args.proto, args.port)
+        cmd_serve(args.proto, args.port, args.workers)
 
     else:
-        print("Expected 'find', 'download', 'erase', 'save', or 'serve' subcommands\n")
+        print("Expected 'find', 'download', 'erase', 'save', 'delete', 'maintain', 'stats', 'dedupe', 'export', 'import', or 'serve' subcommands\n")
         print("Usage examples:")
-        print("  python main.py find <path_to_wav_file>")
+        print("  python main.py find <path_to_wav_file> [--top-k <n>] [--robust] [--cprofile [--cprofile-dir <dir>]]")
         print("  python main.py download <spotify_url>")
         print("  python main.py erase [db | all]  (default: db)")
-        print("  python main.py save [-f|--force] <path_to_file_or_dir>")
-        print("  python main.py serve [--proto <http|https>] [--port <port>]")
+        print("  python main.py save [-f|--force] [--profile <name>] [--cprofile [--cprofile-dir <dir>]] <path_to_file_or_dir>")
+        print("  python main.py delete [--id <song_id> ...] [--path <path>] [--artist <artist>]")
+        print("  python main.py maintain [vacuum | analyze | reindex | migrate | all]  (default: all)")
+        print("  python main.py stats [--top <n>] [--rebuild]")
+        print("  python main.py dedupe [--threshold <0-1>] [--min-votes <n>] [--merge]")
+        print("  python main.py export <snapshot.npz>")
+        print("  python main.py import [--replace] <snapshot.npz>")
+        print("  python main.py serve [--proto <http|https>] [--port <port>] [--workers <n>]")
         sys.exit(1)
 
 
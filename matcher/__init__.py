@@ -1,3 +1,3 @@
 # matcher/__init__.py
 
-from matcher.matcher import match_song
+from matcher.matcher import match_song, match_hashes, match_peaks_robust
@@ -0,0 +1,126 @@
+# matcher/duplicates.py
+
+from collections import Counter, defaultdict
+
+from db import (
+    get_fingerprints_by_hashes,
+    get_fingerprints_by_song,
+    get_song_fingerprint_counts,
+    delete_songs,
+    connection_scope,
+)
+from utils import get_logger
+
+logger = get_logger("duplicates")
+
+# Aligned votes / fingerprints of the shorter song needed to call a pair duplicates
+DEFAULT_THRESHOLD = 0.3
+
+# Ignore pairs with fewer aligned votes than this, whatever the ratio
+DEFAULT_MIN_VOTES = 20
+
+
+def find_duplicates(threshold: float = DEFAULT_THRESHOLD, min_votes: int = DEFAULT_MIN_VOTES):
+    """
+    Catalog self-join through the inverted index.
+
+    Each song's own fingerprints are looked up in one batched query and voted
+    by (other_song, delta) exactly like match_song, counting only partners
+    with a higher id so every pair is scored once. Stop-listed hashes are
+    skipped by the lookup, which bounds the work per song.
+
+    Returns:
+        [
+          {
+            "song_id": int, "duplicate_id": int,
+            "votes": int,          # best aligned vote count
+            "delta": int,          # offset of duplicate_id relative to song_id (frames)
+            "overlap": float,      # votes / fingerprints of the shorter song
+          },
+          ...
+        ]  strongest overlap first
+    """
+    counts = get_song_fingerprint_counts()
+    logger.info(f"[dedupe] Scanning {len(counts)} songs...")
+
+    pairs = []
+    for song_id in sorted(counts):
+        offsets = defaultdict(list)
+        for hash_value, offset in get_fingerprints_by_song(song_id):
+            offsets[hash_value].append(offset)
+
+        with connection_scope():
+            matches_by_hash = get_fingerprints_by_hashes(offsets.keys())
+
+        votes = Counter()
+        for hash_value, matches in matches_by_hash.items():
+            for fp in matches:
+                if fp.song_id <= song_id:
+                    continue
+                for offset in offsets[hash_value]:
+                    votes[(fp.song_id, int(fp.offset) - int(offset))] += 1
+
+        # Best-aligned delta per partner song
+        best = {}
+        for (other_id, delta), n in votes.items():
+            if n > best.get(other_id, (0, 0))[0]:
+                best[other_id] = (n, delta)
+
+        for other_id, (n, delta) in best.items():
+            overlap = n / min(counts[song_id], counts[other_id])
+            if n >= min_votes and overlap >= threshold:
+                pairs.append({
+                    "song_id": song_id,
+                    "duplicate_id": other_id,
+                    "votes": n,
+                    "delta": delta,
+                    "overlap": round(overlap, 3),
+                })
+
+    pairs.sort(key=lambda p: p["overlap"], reverse=True)
+    logger.info(f"[dedupe] Found {len(pairs)} duplicate pair(s).")
+    return pairs
+
+
+def group_duplicates(pairs: list) -> list[list[int]]:
+    """Union pairs into clusters of song ids (each sorted, clusters by first id)."""
+    parent = {}
+
+    def find(x):
+        parent.setdefault(x, x)
+        while parent[x] != x:
+            parent[x] = parent[parent[x]]
+            x = parent[x]
+        return x
+
+    for pair in pairs:
+        a, b = find(pair["song_id"]), find(pair["duplicate_id"])
+        if a != b:
+            parent[max(a, b)] = min(a, b)
+
+    clusters = defaultdict(list)
+    for song_id in parent:
+        clusters[find(song_id)].append(song_id)
+
+    return sorted(sorted(c) for c in clusters.values())
+
+
+def merge_duplicates(pairs: list) -> list[dict]:
+    """
+    Keep one song per cluster (most fingerprints, then lowest id) and delete
+    the rest with their fingerprints.
+
+    Returns:
+        [{"kept": int, "removed": [int, ...]}, ...]
+    """
+    counts = get_song_fingerprint_counts()
+    merged = []
+
+    for cluster in group_duplicates(pairs):
+        keep = max(cluster, key=lambda song_id: (counts.get(song_id, 0), -song_id))
+        removed = [song_id for song_id in cluster if song_id != keep]
+        delete_songs(removed)
+        merged.append({"kept": keep, "removed": removed})
+        logger.info(f"[dedupe] Kept song_id={keep}, removed {removed}")
+
+    return merged
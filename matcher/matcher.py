@@ -1,113 +1,333 @@
 # matcher/matcher.py
 
-from collections import Counter
+import heapq
+from collections import Counter, defaultdict
 from pathlib import Path
 
-from fingerprint.spectrogram import generate_spectrogram
-from fingerprint.peak_picker import find_peaks
-from fingerprint.hasher import generate_hashes
-from db import init_db, get_fingerprints_by_hash, get_song_by_id
+from config import (
+    MATCH_MIN_CONFIDENCE,
+    MATCH_ROBUST_SPEEDS,
+    MATCH_HASH_BUDGET,
+    MATCH_HASH_BUDGET_MAX,
+)
+from fingerprint import compute_peaks, hash_peaks
+from fingerprint.profile import FingerprintProfile, resolve_profile
+from matcher.planner import plan_rounds, is_decisive
+from db import get_fingerprints_by_hashes, get_song_by_id, connection_scope, filter_hashes
 from utils import get_logger
+from utils.profiling import stage
 
 logger = get_logger("matcher")
 
 
-def match_song(file_path: str):
+def _no_match() -> dict:
+    return {
+        "song_id": None,
+        "title": "No match",
+        "artist": "",
+        "score": 0,
+        "confidence": 0.0,
+        "offset_seconds": None,
+        "speed": None,
+        "matches": [],
+    }
+
+
+def lookup(hash_values, filtered: bool = False) -> dict:
     """
-    Full matching pipeline:
-        clip.wav -> spectrogram -> peaks -> hashes
-        hashes -> DB lookup -> time-offset voting -> best song
+    Batched index lookup: {hash_value: [FingerprintRow, ...]}.
+    filtered: hash_values already went through filter_hashes (planner rounds).
+    """
+    # Hashes the catalog's Bloom filter rules out are never probed
+    if not filtered:
+        with stage("filter"):
+            hash_values = filter_hashes(hash_values)
+
+    # One pooled connection, batched IN/$in lookups for the whole clip
+    # (scattered across fingerprint shards and gathered when DB_SHARDS > 1)
+    with stage("lookup"), connection_scope():
+        return get_fingerprints_by_hashes(hash_values)
+
+
+def vote(query_hashes: list, matches_by_hash: dict | None = None, filtered: bool = False) -> Counter:
+    """
+    Time-offset voting for (hash_value, offset_time_bin[, strength]) tuples.
+    matches_by_hash: result of lookup() to reuse; looked up when None.
+    filtered: passed to lookup().
 
     Returns:
-        {
-          "song_id": int | None,
-          "title": str,
-          "artist": str,
-          "score": int,
-        }
+        Counter {(song_id, delta): votes}
     """
+    votes = Counter()
 
-    p = Path(file_path)
-    if not p.exists():
-        raise FileNotFoundError(f"Clip file does not exist: {file_path}")
+    # The same hash can occur at several clip offsets
+    clip_offsets = defaultdict(list)
+    for hash_value, offset_clip, *_strength in query_hashes:
+        clip_offsets[hash_value].append(offset_clip)
 
-    logger.info(f"[matcher] Matching clip: {file_path}")
+    if matches_by_hash is None:
+        matches_by_hash = lookup(clip_offsets.keys(), filtered)
+
+    with stage("vote"):
+        for hash_value, offsets in clip_offsets.items():
+            for fp in matches_by_hash.get(hash_value, ()):
+                for offset_clip in offsets:
+                    # fp.offset is the song's time bin, offset_clip is the clip's time bin
+                    # (int: unmigrated MongoDB documents store offsets as doubles)
+                    delta = int(fp.offset) - offset_clip
+                    votes[(fp.song_id, delta)] += 1
+
+    return votes
+
+
+def best_alignments(votes: Counter) -> dict:
+    """Best-aligned delta per song, one pass over all bins: {song_id: (votes, delta)}."""
+    aligned = {}
+    for (song_id, delta), n in votes.items():
+        best = aligned.get(song_id)
+        if best is None or n > best[0]:
+            aligned[song_id] = (n, delta)
+    return aligned
+
+
+def _median(values: list) -> float:
+    """Median by selection (np.partition, O(n)) rather than sorting; 0 when empty."""
+    import numpy as np
+
+    n = len(values)
+    if not n:
+        return 0
+    middle = np.partition(np.fromiter(values, dtype=np.int64, count=n), [(n - 1) // 2, n // 2])
+    return (int(middle[(n - 1) // 2]) + int(middle[n // 2])) / 2
+
+
+def rank_candidates(
+    aligned: dict,
+    num_query_hashes: int,
+    profile: FingerprintProfile,
+    top_k: int = 1,
+    min_confidence: float = MATCH_MIN_CONFIDENCE,
+) -> list[dict]:
+    """
+    Turn per-song alignments {song_id: (votes, delta, speed)} into the
+    top-K songs with normalized confidence.
+
+    score:          aligned votes (votes in the song's best delta bin)
+    background:     median aligned votes of every candidate except the best,
+                    i.e. what a wrong song typically collects
+    confidence:     (score - background) / (num_query_hashes - background), in [0, 1]
+    offset_seconds: where the clip starts in the song (best delta in seconds)
+
+    Only the top K are selected (heapq, O(n log K)) and the background
+    median by partial selection (O(n)); candidates below min_confidence
+    are dropped.
+    """
+    if not aligned:
+        return []
+
+    top = heapq.nlargest(top_k + 1, aligned.items(), key=lambda item: item[1][0])
+
+    # Background from all candidates except the strongest one
+    others = [a[0] for song_id, a in aligned.items() if song_id != top[0][0]]
+    background = _median(others)
+    span = max(num_query_hashes - background, 1)
+
+    frame_seconds = profile.hop_length / profile.sample_rate
+
+    ranked = []
+    for song_id, (n, delta, speed) in top[:top_k]:
+        confidence = min(max((n - background) / span, 0.0), 1.0)
+        if confidence < min_confidence:
+            continue
+        ranked.append({
+            "song_id": song_id,
+            "score": n,
+            "confidence": round(confidence, 4),
+            "offset_seconds": round(delta * frame_seconds, 3),
+            "speed": speed,
+        })
+
+    return ranked
+
+
+def _finish(
+    aligned: dict,
+    num_query_hashes: int,
+    profile: FingerprintProfile,
+    top_k: int,
+    min_confidence: float,
+) -> dict:
+    if not aligned:
+        logger.warning("[matcher] No matching hashes found in DB.")
+        return _no_match()
 
-    # Make sure DB exists
-    init_db()
+    # 5) Top-K songs by aligned votes
+    with stage("rank"):
+        ranked = rank_candidates(aligned, num_query_hashes, profile, top_k, min_confidence)
 
-    # 1) Spectrogram of the CLIP
-    spec = generate_spectrogram(file_path)
+    if not ranked:
+        logger.info(f"[matcher] No candidate above confidence {min_confidence}.")
+        return _no_match()
 
-    # 2) Peaks in the clip
-    peaks = find_peaks(spec)
+    for candidate in ranked:
+        song = get_song_by_id(candidate["song_id"])
+        if song is None:
+            logger.error(f"[matcher] Song with id={candidate['song_id']} not found in DB.")
+        candidate["title"] = song.title if song else "Unknown Song"
+        candidate["artist"] = song.artist if song else ""
 
-    # 3) Hashes for the clip (hash_value, offset_time_bin)
-    query_hashes = generate_hashes(peaks)
+    best = ranked[0]
+    logger.info(
+        f"[matcher] Final prediction: '{best['title']}' by '{best['artist']}' "
+        f"(score={best['score']}, confidence={best['confidence']}, "
+        f"offset={best['offset_seconds']}s, speed={best['speed']})"
+    )
+
+    return {**best, "matches": ranked}
+
+
+def match_hashes(
+    query_hashes: list,
+    profile: FingerprintProfile,
+    top_k: int = 1,
+    min_confidence: float = MATCH_MIN_CONFIDENCE,
+    budget: int = MATCH_HASH_BUDGET,
+    max_hashes: int = MATCH_HASH_BUDGET_MAX,
+) -> dict:
+    """
+    hashes -> DB lookup -> time-offset voting -> top-K songs.
+    The best match is also returned at the top level.
 
+    query_hashes: (hash_value, offset) pairs, or (hash_value, offset,
+    anchor_strength) triples as produced with peak strengths.
+    Clips with more than `budget` hashes go through the query planner
+    (matcher/planner.py): the most discriminative hashes are looked up
+    first, in growing rounds, until the best song is decisive.
+    budget=0 looks up every hash in one go.
+    """
     if not query_hashes:
         logger.warning("[matcher] No hashes generated from clip.")
-        return {
-            "song_id": None,
-            "title": "No match",
-            "artist": "",
-            "score": 0,
-        }
+        return _no_match()
 
     logger.info(f"[matcher] Generated {len(query_hashes)} hashes for clip")
 
     # 4) Time-offset voting
-    votes = Counter()
+    if budget <= 0 or len(query_hashes) <= budget:
+        votes = vote(query_hashes)
+        num_query_hashes = len(query_hashes)
+    else:
+        votes = Counter()
+        rounds = looked_up = 0
+        for round_hashes, num_query_hashes in plan_rounds(query_hashes, budget, max_hashes):
+            # plan_rounds() already dropped what the Bloom filter rules out
+            votes.update(vote(round_hashes, filtered=True))
+            rounds += 1
+            looked_up += len(round_hashes)
+            if is_decisive(best_alignments(votes)):
+                break
+        logger.info(
+            f"[matcher] Planner: looked up {looked_up} of {len(query_hashes)} clip hashes "
+            f"in {rounds} round(s)"
+        )
+        if not rounds:
+            num_query_hashes = len(query_hashes)
 
-    for hash_value, offset_clip in query_hashes:
-        # All fingerprints in DB that share this hash
-        matches = get_fingerprints_by_hash(hash_value)
+    aligned = {
+        song_id: (n, delta, 1.0)
+        for song_id, (n, delta) in best_alignments(votes).items()
+    }
 
-        for fp in matches:
-            # fp.offset is the song's time bin, offset_clip is the clip's time bin
-            delta = int(round(fp.offset - offset_clip))
-            votes[(fp.song_id, delta)] += 1
+    return _finish(aligned, num_query_hashes, profile, top_k, min_confidence)
 
-    if not votes:
-        logger.warning("[matcher] No matching hashes found in DB.")
-        return {
-            "song_id": None,
-            "title": "No match",
-            "artist": "",
-            "score": 0,
-        }
 
-    # 5) Find the (song_id, delta) pair with the highest vote count
-    (best_song_id, best_delta), best_votes = votes.most_common(1)[0]
+def match_peaks_robust(
+    peaks,
+    profile: FingerprintProfile,
+    speeds: list[float] = MATCH_ROBUST_SPEEDS,
+    top_k: int = 1,
+    min_confidence: float = MATCH_MIN_CONFIDENCE,
+) -> dict:
+    """
+    Speed-robust matching for clips played faster/slower than the original
+    (radio, DJ sets), where both pitch and timing are scaled.
+
+    For every candidate speed s the clip's peaks are mapped back to the
+    original's grid (freq / s, time * s) and re-hashed; no extra STFT.
+    All variants share one batched lookup and vote separately; each song
+    keeps its best-aligned variant, reported as "speed".
+    """
+    import numpy as np
+
+    peaks = np.asarray(peaks)
+    if peaks.shape[0] == 0:
+        logger.warning("[matcher] No hashes generated from clip.")
+        return _no_match()
+
+    variants = []
+    for speed in speeds:
+        scaled = np.rint(peaks * np.array([1.0 / speed, speed])).astype(np.int64)
+        variants.append((speed, hash_peaks(scaled, profile)))
+
+    union = {h for _speed, hashes in variants for h, _offset in hashes}
     logger.info(
-        f"[matcher] Best alignment: song_id={best_song_id}, delta={best_delta}, votes={best_votes}"
+        f"[matcher] Robust mode: {len(variants)} speed variants, "
+        f"{len(union)} distinct hashes in one lookup"
     )
 
-    # Aggregate total votes per song (sum over deltas)
-    per_song_votes = Counter()
-    for (song_id, _delta), count in votes.items():
-        per_song_votes[song_id] += count
+    # 4) One batched lookup, time-offset voting per variant
+    matches_by_hash = lookup(union)
 
-    final_song_id, final_score = per_song_votes.most_common(1)[0]
+    aligned = {}
+    for speed, hashes in variants:
+        for song_id, (n, delta) in best_alignments(vote(hashes, matches_by_hash)).items():
+            if n > aligned.get(song_id, (0,))[0]:
+                aligned[song_id] = (n, delta, speed)
 
-    song = get_song_by_id(final_song_id)
+    num_query_hashes = max(len(hashes) for _speed, hashes in variants)
+    return _finish(aligned, num_query_hashes, profile, top_k, min_confidence)
 
-    if song is None:
-        logger.error(f"[matcher] Song with id={final_song_id} not found in DB.")
-        return {
-            "song_id": final_song_id,
-            "title": "Unknown Song",
-            "artist": "",
-            "score": final_score,
+
+def match_song(
+    file_path: str,
+    profile: FingerprintProfile | str | None = None,
+    top_k: int = 1,
+    min_confidence: float = MATCH_MIN_CONFIDENCE,
+    robust: bool = False,
+):
+    """
+    Full matching pipeline:
+        clip.wav -> spectrogram -> peaks -> hashes
+        hashes -> DB lookup -> time-offset voting -> top-K songs
+
+    The clip is always analysed with the catalog's recorded profile;
+    passing a different `profile` raises ValueError.
+    robust=True also tries MATCH_ROBUST_SPEEDS (see match_peaks_robust).
+
+    Returns:
+        {
+          "song_id": int | None,       # best match (None below min_confidence)
+          "title": str,
+          "artist": str,
+          "score": int,                # aligned votes
+          "confidence": float,         # 0..1
+          "offset_seconds": float | None,
+          "speed": float | None,       # clip playback speed vs the original
+          "matches": [ {song_id, title, artist, score, confidence, offset_seconds, speed}, ... ]
         }
+    """
 
-    logger.info(
-        f"[matcher] Final prediction: '{song.title}' by '{song.artist}' (score={final_score})"
-    )
+    p = Path(file_path)
+    if not p.exists():
+        raise FileNotFoundError(f"Clip file does not exist: {file_path}")
 
-    return {
-        "song_id": final_song_id,
-        "title": song.title,
-        "artist": song.artist,
-        "score": final_score,
-    }
+    logger.info(f"[matcher] Matching clip: {file_path}")
+
+    # 1-3) Spectrogram -> peaks -> hashes for the CLIP (hash_value, offset_time_bin)
+    profile = resolve_profile(profile)
+    peaks, strengths = compute_peaks(file_path, profile, with_strengths=True)
+
+    if robust:
+        return match_peaks_robust(peaks, profile, MATCH_ROBUST_SPEEDS, top_k, min_confidence)
+
+    # Anchor strengths let the query planner look up the strongest hashes first
+    return match_hashes(hash_peaks(peaks, profile, strengths), profile, top_k, min_confidence)
@@ -0,0 +1,99 @@
+# matcher/planner.py
+
+import math
+from collections import defaultdict
+
+from config import (
+    MATCH_HASH_BUDGET,
+    MATCH_HASH_BUDGET_MAX,
+    MATCH_DECISIVE_VOTES,
+    MATCH_DECISIVE_RATIO,
+)
+from db import get_hash_counts, filter_hashes
+from utils.profiling import stage
+
+# Hashes whose posting counts are fetched per pool, as a multiple of the round size
+POOL_FACTOR = 4
+
+
+def plan_rounds(
+    query_hashes: list,
+    budget: int = MATCH_HASH_BUDGET,
+    max_hashes: int = MATCH_HASH_BUDGET_MAX,
+):
+    """
+    Order clip hashes by how useful looking them up is and release them in
+    rounds of budget, 2*budget, 4*budget, ... distinct hashes.
+
+    query_hashes: (hash_value, offset) or (hash_value, offset, anchor_strength)
+
+    Hashes are taken strongest anchor first. For each pool of candidates
+    the catalog's posting counts are fetched (one cheap keyed read per hash,
+    after the catalog's Bloom filter has dropped hashes it certainly lacks):
+    hashes the catalog doesn't contain are skipped, the rest are ranked by
+    strength / sqrt(postings), so rare hashes go before common ones.
+    Without strengths the clip order is kept; without counts (hash_counts
+    not built) only strength is used.
+
+    Yields:
+        (round_pairs, considered): the round's (hash_value, offset) pairs,
+        and how many clip hashes have been decided so far (looked up, or
+        skipped as absent), for confidence normalization.
+    """
+    offsets = defaultdict(list)
+    strength = {}
+    for hash_value, offset, *rest in query_hashes:
+        offsets[hash_value].append(offset)
+        strength[hash_value] = max(strength.get(hash_value, 0.0), rest[0] if rest else 1.0)
+
+    # Stable sort: equal strengths keep clip order
+    by_strength = sorted(offsets, key=strength.get, reverse=True)
+    limit = len(by_strength) if max_hashes <= 0 else min(max_hashes, len(by_strength))
+
+    size = max(budget, 1)
+    pos = 0
+    queue = []
+    considered = 0
+
+    while queue or pos < limit:
+        if not queue:
+            pool = by_strength[pos:min(pos + POOL_FACTOR * size, limit)]
+            pos += len(pool)
+
+            # Hashes the Bloom filter rules out need no count lookup either
+            with stage("filter"):
+                present = filter_hashes(pool)
+            if len(present) != len(pool):
+                kept = set(present)
+                considered += sum(len(offsets[h]) for h in pool if h not in kept)
+                pool = present
+
+            with stage("plan"):
+                counts = get_hash_counts(pool)
+            if counts is not None:
+                considered += sum(len(offsets[h]) for h in pool if h not in counts)
+                pool = [h for h in pool if h in counts]
+                pool.sort(key=lambda h: strength[h] / math.sqrt(counts[h]), reverse=True)
+            queue = pool
+            if not queue:
+                continue
+
+        batch, queue = queue[:size], queue[size:]
+        considered += sum(len(offsets[h]) for h in batch)
+        yield [(h, offset) for h in batch for offset in offsets[h]], considered
+        size *= 2
+
+
+def is_decisive(
+    aligned: dict,
+    min_votes: int = MATCH_DECISIVE_VOTES,
+    ratio: float = MATCH_DECISIVE_RATIO,
+) -> bool:
+    """Whether {song_id: (votes, delta)} has a clear winner, so escalating can stop."""
+    best = second = 0
+    for n, _delta in aligned.values():
+        if n > best:
+            best, second = n, best
+        elif n > second:
+            second = n
+    return best >= min_votes and best >= ratio * second
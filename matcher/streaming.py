@@ -0,0 +1,238 @@
+# matcher/streaming.py
+
+import time
+from collections import Counter
+
+import numpy as np
+
+from config import (
+    MATCH_MIN_CONFIDENCE,
+    STREAM_STEP_SECONDS,
+    STREAM_DECISIVE_VOTES,
+    STREAM_DECISIVE_RATIO,
+    STREAM_MAX_SECONDS,
+)
+from fingerprint.gating import _ENERGY_FLOOR
+from fingerprint.hasher import pair_hash
+from fingerprint.profile import FingerprintProfile
+from matcher.matcher import vote, best_alignments, _finish
+from matcher.planner import is_decisive
+from utils import get_logger
+
+logger = get_logger("streaming")
+
+
+class StreamingMatcher:
+    """
+    Progressive identification of audio that arrives in chunks (a live
+    recording). Every STREAM_STEP_SECONDS of new audio the spectrogram,
+    peaks and hashes are extended by the new frames only, the new hashes
+    are looked up, and their votes are added to the running tally.
+
+    Mirrors the batch pipeline: frames match librosa.stft(center=True);
+    a frame's peaks are decided once the peak neighbourhood after it has
+    arrived; hash pairs are formed as later peaks arrive. The energy gate
+    and percentile threshold use the audio heard so far (the last
+    threshold_window frames).
+
+        sm = StreamingMatcher(profile, input_rate=44100)
+        status = sm.feed(samples)     # float32 mono; status["done"] once decisive
+        result = sm.finish()          # end of stream: best answer so far
+    """
+
+    def __init__(
+        self,
+        profile: FingerprintProfile,
+        input_rate: int | None = None,
+        top_k: int = 1,
+        min_confidence: float = MATCH_MIN_CONFIDENCE,
+        step_seconds: float = STREAM_STEP_SECONDS,
+        max_seconds: float = STREAM_MAX_SECONDS,
+    ):
+        self.profile = profile
+        self.top_k = top_k
+        self.min_confidence = min_confidence
+        self.max_seconds = max_seconds
+
+        self.sr = profile.sample_rate
+        self.n_fft = profile.n_fft
+        self.hop = profile.hop_length
+        self.step_samples = max(int(step_seconds * self.sr), self.hop)
+        # Frames after a peak that must exist before it is final
+        self.lookahead = profile.neighborhood[1]
+
+        self._resampler = None
+        if input_rate and input_rate != self.sr:
+            import soxr
+
+            self._resampler = soxr.ResampleStream(input_rate, self.sr, 1, dtype="float32")
+
+        # Audio with librosa's centre padding (n_fft // 2 zeros) in front
+        self._audio = np.zeros(self.n_fft // 2, dtype=np.float32)
+        self._pending = 0          # samples received since the last step
+        self._spec = np.zeros((self.n_fft // 2 + 1, 0), dtype=np.float32)
+        self._energy = np.zeros(0)
+        self._frames_done = 0      # peaks decided for frames [0, _frames_done)
+
+        self._peaks = np.zeros((0, 2), dtype=np.int64)   # time-sorted [freq, time]
+        self._paired = 0           # peaks already used as pair targets
+        self.num_hashes = 0
+        self.votes = Counter()
+
+        self.started = None
+        self.result = None
+
+    @property
+    def seconds(self) -> float:
+        return (len(self._audio) - self.n_fft // 2) / self.sr
+
+    # -----------------------------
+    # INPUT
+    # -----------------------------
+
+    def feed(self, samples: np.ndarray) -> dict:
+        """
+        Add mono audio (float32 in [-1, 1], at input_rate). Runs a matching
+        step per STREAM_STEP_SECONDS received. Returns status() — with
+        "done" set once a result was reached (then stop feeding).
+        """
+        if self.result is not None:
+            return self.status()
+        if self.started is None:
+            self.started = time.perf_counter()
+
+        samples = np.asarray(samples, dtype=np.float32).ravel()
+        if self._resampler is not None:
+            samples = self._resampler.resample_chunk(samples)
+
+        self._audio = np.concatenate([self._audio, samples])
+        self._pending += len(samples)
+
+        if self._pending >= self.step_samples:
+            self._pending = 0
+            self._step(final=False)
+            self._check()
+
+        if self.result is None and self.seconds >= self.max_seconds:
+            return self.finish()
+        return self.status()
+
+    def finish(self) -> dict:
+        """End of stream: analyse the remaining audio and settle on the best answer."""
+        if self.result is None:
+            if self._resampler is not None:
+                self._audio = np.concatenate([self._audio, self._resampler.resample_chunk(np.zeros(0, np.float32), last=True)])
+            # librosa's centre padding at the end
+            self._audio = np.concatenate([self._audio, np.zeros(self.n_fft // 2, dtype=np.float32)])
+            self._step(final=True)
+            self.result = self._answer(final=True)
+        return self.status()
+
+    def status(self) -> dict:
+        aligned = best_alignments(self.votes)
+        best = max(aligned.values(), default=(0, 0))[0]
+        status = {
+            "done": self.result is not None,
+            "seconds": round(max(self.seconds, 0.0), 2),
+            "hashes": self.num_hashes,
+            "candidates": len(aligned),
+            "best_score": best,
+        }
+        if self.result is not None:
+            status["result"] = self.result
+        return status
+
+    # -----------------------------
+    # INCREMENTAL PIPELINE
+    # -----------------------------
+
+    def _step(self, final: bool):
+        import librosa
+        from scipy.ndimage import maximum_filter
+
+        # 1) New spectrogram frames: frame t covers audio[t*hop : t*hop + n_fft]
+        total = (len(self._audio) - self.n_fft) // self.hop + 1 if len(self._audio) >= self.n_fft else 0
+        have = self._spec.shape[1]
+        if total > have:
+            segment = self._audio[have * self.hop:(total - 1) * self.hop + self.n_fft]
+            new = np.abs(librosa.stft(segment, n_fft=self.n_fft, hop_length=self.hop, center=False))
+            self._spec = np.concatenate([self._spec, new], axis=1)
+            self._energy = np.concatenate([self._energy, np.einsum("ft,ft->t", new, new)])
+
+        # 2) Frames whose peaks can be decided now
+        start = self._frames_done
+        end = total if final else total - self.lookahead
+        if end <= start:
+            return
+        self._frames_done = end
+
+        # Energy gate against the loudest frame heard so far
+        active = np.ones(total, dtype=bool)
+        if self.profile.silence_db is not None:
+            floor = max(self._energy.max() * 10.0 ** (self.profile.silence_db / 10.0), _ENERGY_FLOOR)
+            active = self._energy >= floor
+
+        # Percentile threshold over the last threshold_window active frames
+        window = self.profile.threshold_window or total
+        recent = self._spec[:, max(0, total - window):total][:, active[max(0, total - window):total]]
+        if recent.size == 0:
+            return
+        threshold = np.percentile(recent, self.profile.threshold_percentile)
+
+        # 3) Local maxima with full neighbourhood context on both sides
+        lo = max(0, start - self.lookahead)
+        part = self._spec[:, lo:total]
+        local_max = maximum_filter(part, size=tuple(self.profile.neighborhood)) == part
+        detected = local_max & (part >= threshold) & active[lo:total]
+        detected[:, :start - lo] = False
+        detected[:, end - lo:] = False
+
+        found = np.argwhere(detected)
+        found[:, 1] += lo
+        found = found[np.lexsort((found[:, 0], found[:, 1]))]   # by time, then freq
+
+        # 4) New hash pairs: every pair whose target is a new peak
+        self._peaks = np.concatenate([self._peaks, found])
+        new_hashes = _pairs_with_new_targets(self._peaks, self._paired, self.profile)
+        self._paired = len(self._peaks)
+
+        # 5) Look up and add to the running vote
+        if new_hashes:
+            self.num_hashes += len(new_hashes)
+            self.votes.update(vote(new_hashes))
+
+    def _check(self):
+        aligned = best_alignments(self.votes)
+        if is_decisive(aligned, STREAM_DECISIVE_VOTES, STREAM_DECISIVE_RATIO):
+            answer = self._answer(final=False)
+            if answer["song_id"] is not None:
+                self.result = answer
+
+    def _answer(self, final: bool) -> dict:
+        aligned = {song_id: (n, delta, 1.0) for song_id, (n, delta) in best_alignments(self.votes).items()}
+        result = _finish(aligned, self.num_hashes, self.profile, self.top_k, self.min_confidence)
+        result["seconds_heard"] = round(max(self.seconds, 0.0), 2)
+        result["time_to_answer"] = round(time.perf_counter() - self.started, 3) if self.started else 0.0
+        result["early"] = not final
+        logger.info(
+            f"[stream] {'Early' if not final else 'Final'} answer after {result['seconds_heard']}s of audio "
+            f"({result['time_to_answer']}s): {result['title']}"
+        )
+        return result
+
+
+def _pairs_with_new_targets(peaks: np.ndarray, first_new: int, profile: FingerprintProfile) -> list:
+    """
+    Hash pairs (anchor i, target j) of time-sorted peaks, as generate_hashes()
+    forms them (j among the fan_value peaks after i, time delta in range),
+    for the targets j >= first_new only: older targets were hashed already.
+    """
+    hashes = []
+    for j in range(first_new, len(peaks)):
+        f2, t2 = peaks[j]
+        for i in range(max(0, j - profile.fan_value), j):
+            f1, t1 = peaks[i]
+            dt = t2 - t1
+            if profile.min_time_delta <= dt <= profile.max_time_delta:
+                hashes.append((pair_hash(f1, f2, dt), int(t1)))
+    return hashes
@@ -4,7 +4,7 @@ import base64
 import requests
 from urllib.parse import urlparse
 from utils import get_logger
-from config import SPOTIFY_CLIENT_ID, SPOTIFY_CLIENT_SECRET
+from config import SPOTIFY_CLIENT_ID, SPOTIFY_CLIENT_SECRET, SPOTIFY_TIMEOUT
 
 logger = get_logger("spotify")
 
@@ -41,7 +41,7 @@ class SpotifyClient:
             "grant_type": "client_credentials"
         }
 
-        resp = requests.post(self.TOKEN_URL, headers=headers, data=data)
+        resp = requests.post(self.TOKEN_URL, headers=headers, data=data, timeout=SPOTIFY_TIMEOUT)
 
         if resp.status_code != 200:
             raise RuntimeError(
@@ -89,7 +89,7 @@ class SpotifyClient:
         url = self.TRACK_URL_TEMPLATE.format(track_id=track_id)
 
         logger.info(f"[spotify] Fetching track info for track_id={track_id}")
-        resp = requests.get(url, headers=headers)
+        resp = requests.get(url, headers=headers, timeout=SPOTIFY_TIMEOUT)
 
         if resp.status_code != 200:
             raise RuntimeError(
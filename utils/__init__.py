@@ -1,6 +1,8 @@
 # utils/__init__.py
 
 import logging
+import threading
+from collections import OrderedDict
 from pathlib import Path
 
 # -----------------------------
@@ -34,3 +36,47 @@ def create_folder(path: Path):
     Mirrors Go's utils.CreateFolder.
     """
     path.mkdir(parents=True, exist_ok=True)
+
+
+# -----------------------------
+# CACHING UTILITIES
+# -----------------------------
+
+class LRUCache:
+    """
+    Small thread-safe LRU mapping.
+    Unlike functools.lru_cache, misses are not cached and entries
+    can be invalidated individually.
+    """
+
+    def __init__(self, maxsize: int = 1024):
+        self.maxsize = maxsize
+        self._data = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key, default=None):
+        with self._lock:
+            if key not in self._data:
+                return default
+            self._data.move_to_end(key)
+            return self._data[key]
+
+    def put(self, key, value):
+        if self.maxsize <= 0:
+            return
+        with self._lock:
+            self._data[key] = value
+            self._data.move_to_end(key)
+            while len(self._data) > self.maxsize:
+                self._data.popitem(last=False)
+
+    def pop(self, key, default=None):
+        with self._lock:
+            return self._data.pop(key, default)
+
+    def clear(self):
+        with self._lock:
+            self._data.clear()
+
+    def __len__(self):
+        return len(self._data)
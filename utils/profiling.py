@@ -0,0 +1,157 @@
+# utils/profiling.py
+
+import contextvars
+import cProfile
+import json
+import pstats
+import threading
+import time
+import tracemalloc
+from contextlib import contextmanager
+from pathlib import Path
+
+from utils import create_folder, get_logger
+
+logger = get_logger("profiling")
+
+# Session of the request/command being profiled, None when profiling is off
+_session = contextvars.ContextVar("profile_session", default=None)
+
+# cProfile and tracemalloc are process-wide: one profiled run at a time
+_lock = threading.Lock()
+
+_MB = 1024 * 1024
+
+
+class ProfileSession:
+    """cProfile + tracemalloc for one run, with per-stage timings and memory peaks."""
+
+    def __init__(self, label: str):
+        self.label = label
+        self.profiler = cProfile.Profile()
+        self.stages = []      # finished: {"name", "seconds", "peak_mb"}
+        self._open = []       # running: [name, start, base_bytes, peak_bytes]
+        self.peak = 0
+        self.seconds = 0.0
+
+    def _fold_peak(self):
+        """Credit the tracemalloc peak since the last reset to every open stage."""
+        _current, peak = tracemalloc.get_traced_memory()
+        self.peak = max(self.peak, peak)
+        for running in self._open:
+            running[3] = max(running[3], peak)
+        tracemalloc.reset_peak()
+
+    def begin(self, name: str):
+        self._fold_peak()
+        current, _peak = tracemalloc.get_traced_memory()
+        self._open.append([name, time.perf_counter(), current, current])
+
+    def end(self):
+        self._fold_peak()
+        name, start, base, peak = self._open.pop()
+        self.stages.append({
+            "name": name,
+            "seconds": round(time.perf_counter() - start, 4),
+            "peak_mb": round((peak - base) / _MB, 2),
+        })
+
+    def summary(self, top: int = 15) -> dict:
+        """JSON-friendly result: stages plus the top functions by cumulative time."""
+        stats = pstats.Stats(self.profiler)
+        rows = []
+        for (filename, line, func), (_cc, calls, tottime, cumtime, _callers) in stats.stats.items():
+            rows.append({
+                "function": f"{Path(filename).name}:{line}({func})",
+                "calls": calls,
+                "tottime": round(tottime, 4),
+                "cumtime": round(cumtime, 4),
+            })
+        rows.sort(key=lambda r: r["cumtime"], reverse=True)
+
+        return {
+            "label": self.label,
+            "seconds": round(self.seconds, 4),
+            "peak_mb": round(self.peak / _MB, 2),
+            "stages": self.stages,
+            "top_functions": rows[:top],
+        }
+
+    def dump(self, out_dir: Path) -> Path:
+        """Write <label>_<timestamp>.prof (pstats/snakeviz) and .json; returns the .prof path."""
+        create_folder(out_dir)
+        safe = "".join(c if c.isalnum() or c in "-_." else "_" for c in self.label)
+        base = f"{safe}_{time.strftime('%Y%m%d-%H%M%S')}_{time.time_ns() % 10**6:06d}"
+        prof_path = out_dir / f"{base}.prof"
+        self.profiler.dump_stats(prof_path)
+        (out_dir / f"{base}.json").write_text(json.dumps(self.summary(), indent=2))
+        logger.info(f"[profile] Wrote {prof_path}")
+        return prof_path
+
+
+@contextmanager
+def profile_run(label: str, out_dir: Path | None = None):
+    """
+    Profile everything run inside the block (in this thread):
+
+        with profile_run("find clip.wav") as session:
+            match_song(...)
+        session.summary()
+
+    Stages marked with stage() inside the block are timed individually.
+    Concurrent profile_run() blocks wait for each other.
+    """
+    with _lock:
+        session = ProfileSession(label)
+        token = _session.set(session)
+        started_tracing = not tracemalloc.is_tracing()
+        if started_tracing:
+            tracemalloc.start()
+        tracemalloc.reset_peak()
+
+        start = time.perf_counter()
+        session.profiler.enable()
+        try:
+            yield session
+        finally:
+            session.profiler.disable()
+            session.seconds = time.perf_counter() - start
+            session._fold_peak()
+            if started_tracing:
+                tracemalloc.stop()
+            _session.reset(token)
+
+            if out_dir is not None:
+                session.dump(out_dir)
+
+
+@contextmanager
+def stage(name: str):
+    """Mark a pipeline stage; a no-op unless a profile_run() is active."""
+    session = _session.get()
+    if session is None:
+        yield
+        return
+
+    session.begin(name)
+    try:
+        yield
+    finally:
+        session.end()
+
+
+def format_summary(summary: dict) -> str:
+    """Plain-text report for the CLI."""
+    lines = [
+        f"Profile: {summary['label']}  total={summary['seconds']:.3f}s  peak={summary['peak_mb']:.1f}MB",
+        "",
+        f"  {'stage':<22}{'seconds':>10}{'peak MB':>10}",
+    ]
+    for s in summary["stages"]:
+        lines.append(f"  {s['name']:<22}{s['seconds']:>10.3f}{s['peak_mb']:>10.1f}")
+
+    lines += ["", f"  {'cumtime':>9}{'tottime':>9}{'calls':>9}  function"]
+    for f in summary["top_functions"]:
+        lines.append(f"  {f['cumtime']:>9.3f}{f['tottime']:>9.3f}{f['calls']:>9}  {f['function']}")
+
+    return "\n".join(lines)